@@ -1,27 +1,113 @@
+import asyncio
+import hashlib
+from datetime import datetime
+from typing import Any, Dict, List, Optional, Tuple
+
+from backend.utils.concurrency import run_blocking
+from backend.utils.logging import get_logger
+
+
 class AppointmentExecutorAgent:
-    def __init__(self, calendar_api_client=None, email_client=None):
+    def __init__(self, calendar_api_client=None, email_client=None, outbox=None):
         self.calendar = calendar_api_client
         self.email = email_client
+        # Optional durable Outbox; when set, side effects run in its worker instead of the request
+        self.outbox = outbox
+        self.logger = get_logger(__name__)
+        if outbox is not None:
+            outbox.register("calendar.create_event", self._create_event)
+            outbox.register("email.send_email", self._send_email)
 
     def book_appointment(self, patient_name, patient_email, plan_result):
         # plan_result expected from planner fallback: {date, start_time, end_time}
+        doctor, time_slot, jobs = self._jobs(patient_name, patient_email, plan_result)
+        if self.outbox is not None:
+            self._enqueue(jobs, plan_result)
+        else:
+            for kind, payload in jobs:
+                self._run_logged(kind, payload)
+        return self._confirmation(patient_name, doctor, time_slot)
+
+    async def book_appointment_async(self, patient_name, patient_email, plan_result):
+        """Like ``book_appointment``, but the calendar and email calls run concurrently."""
+        doctor, time_slot, jobs = self._jobs(patient_name, patient_email, plan_result)
+        if self.outbox is not None:
+            await run_blocking(self._enqueue, jobs, plan_result)
+        elif jobs:
+            await asyncio.gather(*(run_blocking(self._run_logged, kind, payload) for kind, payload in jobs))
+        return self._confirmation(patient_name, doctor, time_slot)
+
+    def _jobs(self, patient_name, patient_email, plan_result) -> Tuple[str, str, List[Tuple[str, Dict[str, Any]]]]:
         doctor = plan_result.get("doctor", "Primary Care")
         time_slot = f"{plan_result.get('date')} {plan_result.get('start_time')} - {plan_result.get('end_time')}"
 
+        jobs: List[Tuple[str, Dict[str, Any]]] = []
+        if "error" in plan_result:
+            # No slot was found, so there is nothing to put in a calendar or an email
+            return doctor, time_slot, jobs
         if self.calendar:
-            try:
-                self.calendar.create_event(doctor, patient_name, time_slot)
-            except Exception:
-                pass
-
+            jobs.append(("calendar.create_event", {"doctor": doctor, "patient_name": patient_name, "time_slot": time_slot}))
         if self.email:
-            try:
-                self.email.send_email(
-                    to=patient_email,
-                    subject="Appointment Confirmation",
-                    body=f"Your appointment with {doctor} is scheduled for {time_slot}."
-                )
-            except Exception:
-                pass
+            jobs.append(("email.send_email", {
+                "to": patient_email,
+                "subject": "Appointment Confirmation",
+                "body": f"Your appointment with {doctor} is scheduled for {time_slot}.",
+            }))
+        return doctor, time_slot, jobs
+
+    def confirm_booking(self, hold_id: str) -> int:
+        """Let the side effects kept back for a now-confirmed hold run."""
+        return self.outbox.confirm_held(hold_id) if self.outbox is not None else 0
+
+    def cancel_booking(self, hold_id: str) -> int:
+        """Drop the side effects of a released hold before they run."""
+        return self.outbox.cancel_held(hold_id) if self.outbox is not None else 0
+
+    def _enqueue(self, jobs: List[Tuple[str, Dict[str, Any]]], plan_result: Dict[str, Any]) -> None:
+        hold = plan_result.get("hold")
+        if not jobs or not isinstance(hold, dict) or not hold.get("hold_id"):
+            return
+        hold_id = hold["hold_id"]
+        # Jobs of a provisional hold wait for confirm_booking and lapse with the hold
+        until = None if hold.get("confirmed") else _timestamp(hold.get("expires_at"))
+        for kind, payload in jobs:
+            self.outbox.enqueue(
+                kind, payload,
+                key=idempotency_key(kind, payload, hold_id),
+                hold=None if hold.get("confirmed") else hold_id,
+                hold_until=until,
+            )
 
+    def _run_logged(self, kind: str, payload: Dict[str, Any]) -> None:
+        try:
+            if kind == "calendar.create_event":
+                self._create_event(payload)
+            else:
+                self._send_email(payload)
+        except Exception as exc:
+            self.logger.warning(f"Booking side effect {kind} failed: {exc}")
+
+    def _create_event(self, payload: Dict[str, Any]) -> None:
+        self.calendar.create_event(payload["doctor"], payload["patient_name"], payload["time_slot"])
+
+    def _send_email(self, payload: Dict[str, Any]) -> None:
+        self.email.send_email(to=payload["to"], subject=payload["subject"], body=payload["body"])
+
+    @staticmethod
+    def _confirmation(patient_name, doctor, time_slot) -> str:
         return f"Appointment slot reserved for {patient_name} with {doctor} at {time_slot}"
+
+
+def idempotency_key(kind: str, payload: Dict[str, Any], booking_id: Optional[str] = None) -> str:
+    """Same side effect for the same booking -> same key, however often it is enqueued.
+
+    ``booking_id`` (the slot hold) tells a genuine rebooking of the same slot
+    apart from a replay of one booking; without it the key is content-only.
+    """
+    material = repr((booking_id, sorted(payload.items())))
+    digest = hashlib.sha256(material.encode("utf-8")).hexdigest()[:32]
+    return f"{kind}:{digest}"
+
+
+def _timestamp(iso: Optional[str]) -> Optional[float]:
+    return datetime.fromisoformat(iso).timestamp() if iso else None
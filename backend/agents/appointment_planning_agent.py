@@ -1,37 +1,54 @@
 import os
 import json
-import re
-from typing import List, Tuple
+from functools import lru_cache
+from typing import Dict, List, NamedTuple, Optional, Tuple
+from backend.utils.concurrency import run_blocking
+from backend.utils.llm import generate_json, generate_json_async, lazy_model
 from backend.utils.logging import get_logger
-from backend.utils.retry import retry
+from backend.utils.metrics import STAGE_SECONDS, timed
+from backend.utils.scheduling import FreeBusyIndex, SchedulingRules, format_slot, format_slot_key, localize, parse_slot
 
-try:
-    import google.generativeai as genai
-except Exception:
-    genai = None
+from datetime import date, datetime, timedelta, time as dtime, tzinfo
 
-from ics import Calendar
-from datetime import datetime, timedelta, time as dtime
-import pytz
 
-def clean_json(text: str) -> str:
-    # Remove ```json ... ``` or ``` ... ``` blocks
-    return re.sub(r"```(?:json)?\s*([\s\S]*?)\s*```", r"\1", text).strip()
+class AppointmentPlannerAgent:
+    model = lazy_model()
 
+    MODES = ("deterministic", "llm_first")
+    # Free slots offered to Gemini when refining by preferences
+    refinement_candidates = 20
 
-class AppointmentPlannerAgent:
-    def __init__(self, api_key: str, model_name="gemini-flash-latest"):
-        self.model = None
+    def __init__(
+        self,
+        api_key: str,
+        model_name="gemini-flash-latest",
+        horizon_days: int = 14,
+        include_weekends: bool = False,
+        work_hours: Tuple[str, str] = ("08:00", "17:00"),
+        padding_minutes: int = 15,
+        mode: str = "deterministic",
+    ):
+        if mode not in self.MODES:
+            raise ValueError(f"Unknown appointment planner mode {mode!r}; expected one of {self.MODES}")
+        # "deterministic": the local solver is authoritative and Gemini only re-ranks
+        # valid slots against free-text preferences. "llm_first": ask Gemini first.
+        self.mode = mode
+        # Gemini model comes from the shared registry the first time it is needed
+        self.api_key = api_key
+        self.model_name = model_name
         self.logger = get_logger(__name__)
-        if api_key and genai is not None:
-            try:
-                genai.configure(api_key=api_key, transport="rest")
-                self.model = genai.GenerativeModel(model_name)
-            except Exception:
-                self.logger.warning("Failed to initialize Gemini; using fallback")
-                self.model = None
-
-    def plan_slot(self, skeleton_calendar, time_length, user_timezone, lunch_time: list):
+        # Calendar argument -> resolved ICS path, so repeat calls stat one file
+        self._calendar_paths: Dict[str, str] = {}
+        # Lunch comes per request; everything else is fixed per agent
+        self.rules = SchedulingRules(
+            work_start=datetime.strptime(work_hours[0], "%H:%M").time(),
+            work_end=datetime.strptime(work_hours[1], "%H:%M").time(),
+            padding=timedelta(minutes=padding_minutes),
+            weekends=include_weekends,
+            horizon_days=horizon_days,
+        )
+
+    def _resolve_calendar_path(self, skeleton_calendar) -> str:
         # Open and read the ICS file (robust path resolution)
         BASE_DIR = os.path.dirname(__file__)
         PROJECT_DIR = os.path.dirname(BASE_DIR)  # backend directory
@@ -59,114 +76,236 @@ class AppointmentPlannerAgent:
             raise FileNotFoundError(
                 f"Could not locate ICS file. Tried: {candidates}"
             )
+        return ics_path
 
-        with open(ics_path, 'r', encoding='utf-8') as file:
-            calendar_data = file.read()
-
-        # Parse it into a Calendar object
-        calendar = Calendar(calendar_data)
-
-        events = calendar.events
-        calendar_text = ""
-        for event in events:
-            # event.begin and event.end are Arrow objects, so convert to datetime
-            start = event.begin.datetime.astimezone(pytz.timezone(user_timezone))
-            end = event.end.datetime.astimezone(pytz.timezone(user_timezone))
-            calendar_text += f"Event: {event.name}, Start: {start}, End: {end}\n"
-
+    def _load_calendar(self, skeleton_calendar, user_timezone) -> "ParsedCalendar":
+        """Parsed, localized calendar; re-parsed only when the ICS file changes."""
+        ics_path = self._calendar_paths.get(skeleton_calendar)
+        try:
+            if ics_path is None:
+                raise FileNotFoundError(skeleton_calendar)
+            st = os.stat(ics_path)
+        except OSError:
+            ics_path = self._resolve_calendar_path(skeleton_calendar)
+            self._calendar_paths[skeleton_calendar] = ics_path
+            st = os.stat(ics_path)
+        return _localized_calendar(ics_path, st.st_mtime_ns, st.st_size, user_timezone)
 
+    def _build_prompt(self, calendar: "ParsedCalendar", time_length, lunch_time: list, preferences=None) -> str:
         # Debug text prepared; not printed to avoid noise during API calls
         # Send safe prompt to LLM
-        prompt = f"""
+        return f"""
         You are a scheduling assistant. Convert the following into a calendar event:
         Use ONLY the skeleton schedule (no real info) to find the best time slot.
-        Calendar object: {calendar_text}
+        Calendar object: {calendar.text}
         The event trying to be scheduled takes {time_length} hours.
         Do not schedule an event before 8 AM or after 5 PM. 
         Do not schedule an event during lunch, which is from {lunch_time[0]} to {lunch_time[1]}.
         Leave at least 15 minutes between events.
         Find the earliest available time that does not break any of the previous rules. 
+        {f"Where the rules allow, respect these patient preferences: {preferences}" if preferences else ""}
         
         Respond in JSON with 'date', 'start_time', 'end_time'.
         Respond with ONLY valid JSON. No explanation or text outside the JSON.
         """
 
+    def _refinement_prompt(self, candidates: List[dict], time_length, preferences: str) -> str:
+        return f"""
+        You are a scheduling assistant.
+        These appointment slots of {time_length} hours are all available: {json.dumps(candidates)}
+        Patient preferences: {preferences}
+        Pick the single slot that best matches the preferences. If none match, pick the first one.
+
+        Respond in JSON with 'date', 'start_time', 'end_time' copied from the chosen slot.
+        Respond with ONLY valid JSON. No explanation or text outside the JSON.
+        """
+
+    @timed(STAGE_SECONDS.labels("appointment.plan"))
+    def plan_slot(self, skeleton_calendar, time_length, user_timezone, lunch_time: list, count: int = 1, after=None, preferences=None):
+        calendar = self._load_calendar(skeleton_calendar, user_timezone)
+        if self.mode == "deterministic":
+            plan = self._fallback_slot(calendar, time_length, user_timezone, lunch_time, count, after)
+            candidates = self._refinement_candidates(plan, calendar, time_length, user_timezone, lunch_time, after, preferences)
+            if not candidates:
+                return plan
+            suggestion = generate_json(self.model, self._refinement_prompt(candidates, time_length, preferences), self.logger)
+            return self._refine(plan, suggestion, candidates, calendar, time_length, user_timezone, lunch_time)
+
         if self.model is not None:
-            try:
-                response = retry(lambda: self.model.generate_content(prompt))
-                response_text = clean_json(response.text)
-                try:
-                    return json.loads(response_text)
-                except json.JSONDecodeError:
-                    self.logger.warning("Gemini returned non-JSON; using fallback")
-            except Exception as e:
-                self.logger.error(f"Gemini error: {e}; using fallback")
+            prompt = self._build_prompt(calendar, time_length, lunch_time, preferences)
+            plan = generate_json(self.model, prompt, self.logger)
+            if plan is not None:
+                if self._is_valid_slot(plan, calendar, time_length, user_timezone, lunch_time):
+                    return plan
+                self.logger.warning("Gemini suggested a slot that breaks scheduling rules; using fallback")
+        return self._fallback_slot(calendar, time_length, user_timezone, lunch_time, count, after)
 
-        # Fallback deterministic scheduler
-        tz = pytz.timezone(user_timezone)
-        events_local: List[Tuple[datetime, datetime]] = []
-        for event in events:
-            start = event.begin.datetime.astimezone(tz)
-            end = event.end.datetime.astimezone(tz)
-            events_local.append((start, end))
-        events_local.sort(key=lambda x: x[0])
+    @timed(STAGE_SECONDS.labels("appointment.plan"))
+    async def plan_slot_async(self, skeleton_calendar, time_length, user_timezone, lunch_time: list, count: int = 1, after=None, preferences=None):
+        calendar = await run_blocking(self._load_calendar, skeleton_calendar, user_timezone)
+        if self.mode == "deterministic":
+            plan = self._fallback_slot(calendar, time_length, user_timezone, lunch_time, count, after)
+            candidates = self._refinement_candidates(plan, calendar, time_length, user_timezone, lunch_time, after, preferences)
+            if not candidates:
+                return plan
+            suggestion = await generate_json_async(self.model, self._refinement_prompt(candidates, time_length, preferences), self.logger)
+            return self._refine(plan, suggestion, candidates, calendar, time_length, user_timezone, lunch_time)
+
+        if self.model is not None:
+            prompt = self._build_prompt(calendar, time_length, lunch_time, preferences)
+            plan = await generate_json_async(self.model, prompt, self.logger)
+            if plan is not None:
+                if self._is_valid_slot(plan, calendar, time_length, user_timezone, lunch_time):
+                    return plan
+                self.logger.warning("Gemini suggested a slot that breaks scheduling rules; using fallback")
+        return self._fallback_slot(calendar, time_length, user_timezone, lunch_time, count, after)
+
+    def _refinement_candidates(self, plan: dict, calendar: "ParsedCalendar", time_length, user_timezone, lunch_time: list, after, preferences) -> Optional[List[dict]]:
+        # The LLM is only worth a round trip when there are free-text preferences to weigh
+        if self.model is None or not preferences or not str(preferences).strip() or "error" in plan:
+            return None
+        tz = _timezone(user_timezone)
+        after = self._resolve_after(calendar, tz, after)
+        index = self.free_busy(calendar, user_timezone, lunch_time, after.date())
+        slots = index.next_slots(timedelta(hours=float(time_length)), after, self.refinement_candidates)
+        return [format_slot(s, e) for s, e in slots]
+
+    def _refine(self, plan: dict, suggestion, candidates: List[dict], calendar: "ParsedCalendar", time_length, user_timezone, lunch_time: list) -> dict:
+        if suggestion is None:
+            return plan
+        if not self._is_valid_slot(suggestion, calendar, time_length, user_timezone, lunch_time):
+            self.logger.warning("Gemini suggested a slot that breaks scheduling rules; keeping deterministic slot")
+            return plan
+
+        refined = format_slot(*self.slot_bounds(suggestion, user_timezone))
+        # Only the offered slots are acceptable: they all start at or after ``after``,
+        # and a free slot Gemini made up was never weighed against the others
+        if format_slot_key(refined) not in {format_slot_key(c) for c in candidates}:
+            self.logger.warning("Gemini suggested a slot it was not offered; keeping deterministic slot")
+            return plan
+        if "alternatives" in plan:
+            ranked = [format_slot_key(plan)] + [format_slot_key(a) for a in plan["alternatives"]]
+            chosen = format_slot_key(refined)
+            refined["alternatives"] = [
+                {"date": d, "start_time": s, "end_time": e} for d, s, e in ranked if (d, s, e) != chosen
+            ][:len(plan["alternatives"])]
+        return refined
+
+    def _is_valid_slot(self, plan, calendar: "ParsedCalendar", time_length, user_timezone, lunch_time: list) -> bool:
+        """Check a proposed slot against working hours, lunch, padding and existing events."""
+        bounds = self.slot_bounds(plan, user_timezone) if isinstance(plan, dict) else None
+        if bounds is None:
+            return False
+        start, end = bounds
+        if end - start != timedelta(hours=float(time_length)):
+            return False
+        return self.free_busy(calendar, user_timezone, lunch_time, start.date()).is_free(start, end)
+
+    def iter_slots(self, skeleton_calendar, time_length, user_timezone, lunch_time: list, after=None):
+        """Every free slot of ``time_length`` hours in time order, for callers that place several bookings."""
+        calendar = self._load_calendar(skeleton_calendar, user_timezone)
+        after = self._resolve_after(calendar, _timezone(user_timezone), after)
+        index = self.free_busy(calendar, user_timezone, lunch_time, after.date())
+        return index.iter_slots(timedelta(hours=float(time_length)), after)
+
+    def slot_bounds(self, plan: dict, user_timezone):
+        """(start, end) of a planned slot in ``user_timezone``, or None if the plan has no valid slot."""
+        return parse_slot(plan, _timezone(user_timezone))
 
-        # Choose day from first event or today
-        base_day = events_local[0][0].date() if events_local else datetime.now(tz).date()
+    def free_busy(self, calendar: "ParsedCalendar", user_timezone, lunch_time: list, start_day: date) -> FreeBusyIndex:
+        """Free/busy index for ``calendar`` from ``start_day``, cached per calendar version."""
+        rules = self.rules._replace(lunch=_lunch_window(tuple(lunch_time)))
+        return _free_busy_index(calendar.path, calendar.version, user_timezone, rules, start_day)
+
+    def _resolve_after(self, calendar: "ParsedCalendar", tz, after) -> datetime:
+        if after is None:
+            # Choose day from first event or today
+            base_day = calendar.events[0][0].date() if calendar.events else datetime.now(tz).date()
+            return localize(tz, datetime.combine(base_day, dtime()))
+        if isinstance(after, str):
+            after = datetime.fromisoformat(after)
+        if after.tzinfo is None:
+            return localize(tz, after)
+        return after.astimezone(tz)
+
+    @timed(STAGE_SECONDS.labels("appointment.fallback"))
+    def _fallback_slot(self, calendar: "ParsedCalendar", time_length, user_timezone, lunch_time: list, count: int = 1, after=None):
+        # Fallback deterministic scheduler
+        tz = _timezone(user_timezone)
+        after = self._resolve_after(calendar, tz, after)
+        index = self.free_busy(calendar, user_timezone, lunch_time, after.date())
 
         duration = timedelta(hours=float(time_length))
-        pad = timedelta(minutes=15)
-        work_start = tz.localize(datetime.combine(base_day, dtime(hour=8)))
-        work_end = tz.localize(datetime.combine(base_day, dtime(hour=17)))
-
-        # Lunch window
-        ls = datetime.strptime(lunch_time[0], "%H:%M").time()
-        le = datetime.strptime(lunch_time[1], "%H:%M").time()
-        lunch_start = tz.localize(datetime.combine(base_day, ls))
-        lunch_end = tz.localize(datetime.combine(base_day, le))
-
-        # Build blocked intervals
-        blocked: List[Tuple[datetime, datetime]] = []
-        for s, e in events_local:
-            # clamp to work hours
-            s2 = max(work_start, s - pad)
-            e2 = min(work_end, e + pad)
-            if s2 < e2:
-                blocked.append((s2, e2))
-        blocked.append((lunch_start, lunch_end))
-        blocked.sort(key=lambda x: x[0])
-
-        # Merge overlaps
-        merged: List[Tuple[datetime, datetime]] = []
-        for s, e in blocked:
-            if not merged or s > merged[-1][1]:
-                merged.append((s, e))
-            else:
-                merged[-1] = (merged[-1][0], max(merged[-1][1], e))
-
-        # Find earliest gap
-        cursor = work_start
-        for s, e in merged:
-            if cursor + duration <= s:
-                start = cursor
-                end = start + duration
-                return {
-                    "date": start.strftime("%Y-%m-%d"),
-                    "start_time": start.strftime("%H:%M"),
-                    "end_time": end.strftime("%H:%M"),
-                }
-            cursor = max(cursor, e)
-
-        if cursor + duration <= work_end:
-            start = cursor
-            end = start + duration
-            return {
-                "date": start.strftime("%Y-%m-%d"),
-                "start_time": start.strftime("%H:%M"),
-                "end_time": end.strftime("%H:%M"),
-            }
-
-        # No slot available
-        result = {"error": "No available slot found"}
-        self.logger.info(f"Appointment fallback result: {result}")
+        slots = index.next_slots(duration, after, max(1, int(count)))
+        if not slots:
+            # No slot available
+            result = {"error": "No available slot found"}
+            self.logger.info("Appointment fallback result: %s", result)
+            return result
+
+        result = format_slot(*slots[0])
+        if count > 1:
+            result["alternatives"] = [format_slot(s, e) for s, e in slots[1:]]
         return result
+
+
+class ParsedCalendar(NamedTuple):
+    path: str
+    # (st_mtime_ns, st_size) of the parsed file
+    version: Tuple[int, int]
+    # (start, end) of every event in the requested timezone, sorted by start
+    events: Tuple[Tuple[datetime, datetime], ...]
+    # Event listing embedded in the LLM prompt
+    text: str
+
+
+@lru_cache(maxsize=32)
+def _timezone(name: str) -> tzinfo:
+    # Deferred so importing the planner does not load pytz's zone database
+    import pytz
+
+    return pytz.timezone(name)
+
+
+@lru_cache(maxsize=16)
+def _parsed_events(ics_path: str, mtime_ns: int, size: int) -> Tuple[Tuple[str, datetime, datetime], ...]:
+    # mtime/size are part of the cache key so an edited file is parsed again
+    with open(ics_path, 'r', encoding='utf-8') as file:
+        calendar_data = file.read()
+
+    # ics pulls in arrow and friends; import it only once a calendar is parsed
+    from ics import Calendar
+
+    # Parse it into a Calendar object
+    calendar = Calendar(calendar_data)
+    # event.begin and event.end are Arrow objects, so convert to datetime
+    events = [(event.name, event.begin.datetime, event.end.datetime) for event in calendar.events]
+    events.sort(key=lambda e: e[1])
+    return tuple(events)
+
+
+@lru_cache(maxsize=64)
+def _localized_calendar(ics_path: str, mtime_ns: int, size: int, user_timezone: str) -> ParsedCalendar:
+    tz = _timezone(user_timezone)
+    events: List[Tuple[datetime, datetime]] = []
+    lines: List[str] = []
+    for name, begin, end in _parsed_events(ics_path, mtime_ns, size):
+        start = begin.astimezone(tz)
+        finish = end.astimezone(tz)
+        events.append((start, finish))
+        lines.append(f"Event: {name}, Start: {start}, End: {finish}\n")
+    return ParsedCalendar(ics_path, (mtime_ns, size), tuple(events), "".join(lines))
+
+
+@lru_cache(maxsize=64)
+def _free_busy_index(ics_path: str, version: Tuple[int, int], user_timezone: str, rules: SchedulingRules, start_day: date) -> FreeBusyIndex:
+    calendar = _localized_calendar(ics_path, version[0], version[1], user_timezone)
+    return FreeBusyIndex(calendar.events, _timezone(user_timezone), start_day, rules)
+
+
+@lru_cache(maxsize=32)
+def _lunch_window(lunch_time: Tuple[str, str]) -> Tuple[dtime, dtime]:
+    # Lunch window
+    ls = datetime.strptime(lunch_time[0], "%H:%M").time()
+    le = datetime.strptime(lunch_time[1], "%H:%M").time()
+    return ls, le
@@ -1,33 +1,25 @@
-import os
-import json
+import copy
 import re
-from typing import List, Dict, Any
+from typing import List, Dict, Any, Optional
+from backend.utils.cache import TieredCache
+from backend.utils.llm import generate_json, generate_json_async, lazy_model
 from backend.utils.logging import get_logger
-from backend.utils.retry import retry
+from backend.utils.metrics import STAGE_SECONDS, timed
 
-try:
-    import google.generativeai as genai
-except Exception:
-    genai = None
-
-def clean_json(text: str) -> str:
-    # Remove ```json ... ``` or ``` ... ``` blocks
-    return re.sub(r"```(?:json)?\s*([\s\S]*?)\s*```", r"\1", text).strip()
 
 class InsurancePlannerAgent:
-    def __init__(self, api_key: str, model_name="gemini-flash-latest"):
-        self.model = None
+    model = lazy_model()
+
+    def __init__(self, api_key: str, model_name="gemini-flash-latest", cache: Optional[TieredCache] = None):
+        # Gemini model comes from the shared registry the first time it is needed
+        self.api_key = api_key
+        self.model_name = model_name
         self.logger = get_logger(__name__)
-        if api_key and genai is not None:
-            try:
-                genai.configure(api_key=api_key, transport="rest")
-                self.model = genai.GenerativeModel(model_name)
-            except Exception:
-                self.logger.warning("Failed to initialize Gemini; using fallback")
-                self.model = None
+        # Gemini coverage answers keyed by normalized inputs; fallback plans are never cached
+        self.cache = cache
 
-    def plan_request(self, insurance_info: List[str], service: str) -> Dict[str, Any]:
-        prompt = f"""
+    def _build_prompt(self, insurance_info: List[str], service: str) -> str:
+        return f"""
         You are a medical insurance researcher.
         Given the provider is {insurance_info[0]}, the insurance company is {insurance_info[1]}, and the plan is {insurance_info[2]}.
         Return a JSON object with:
@@ -45,17 +37,34 @@ class InsurancePlannerAgent:
         Respond with ONLY valid JSON. No explanation or text outside the JSON.
         """
 
+    @timed(STAGE_SECONDS.labels("insurance.plan"))
+    def plan_request(self, insurance_info: List[str], service: str) -> Dict[str, Any]:
         if self.model is not None:
-            try:
-                response = retry(lambda: self.model.generate_content(prompt))
-                response_text = clean_json(response.text)
-                try:
-                    return json.loads(response_text)
-                except json.JSONDecodeError:
-                    self.logger.warning("Gemini returned non-JSON; using fallback")
-            except Exception as e:
-                self.logger.error(f"Gemini error: {e}; using fallback")
+            prompt = self._build_prompt(insurance_info, service)
+            compute = lambda: generate_json(self.model, prompt, self.logger)
+            if self.cache is not None:
+                plan = self.cache.get_or_compute(coverage_key(insurance_info, service), compute)
+            else:
+                plan = compute()
+            if plan is not None:
+                return copy.deepcopy(plan)
+        return self._fallback_plan(insurance_info, service)
 
+    @timed(STAGE_SECONDS.labels("insurance.plan"))
+    async def plan_request_async(self, insurance_info: List[str], service: str) -> Dict[str, Any]:
+        if self.model is not None:
+            prompt = self._build_prompt(insurance_info, service)
+            compute = lambda: generate_json_async(self.model, prompt, self.logger)
+            if self.cache is not None:
+                plan = await self.cache.get_or_compute_async(coverage_key(insurance_info, service), compute)
+            else:
+                plan = await compute()
+            if plan is not None:
+                return copy.deepcopy(plan)
+        return self._fallback_plan(insurance_info, service)
+
+    @timed(STAGE_SECONDS.labels("insurance.fallback"))
+    def _fallback_plan(self, insurance_info: List[str], service: str) -> Dict[str, Any]:
         # Fallback stubbed values for demo
         provider = insurance_info[0] if insurance_info else "Unknown Provider"
         company = insurance_info[1] if len(insurance_info) > 1 else "Unknown Company"
@@ -77,5 +86,37 @@ class InsurancePlannerAgent:
         if "hmo" in plan_name.lower():
             base["deductable"] = "$0"
             base["co-pay"] = "$15"
-        self.logger.info(f"Insurance fallback plan: {base}")
+        self.logger.info("Insurance fallback plan: %s", base)
         return base
+
+
+# Spelled-out plan types -> the abbreviation used in most plan names
+PLAN_ALIASES = {
+    "preferred provider organization": "ppo",
+    "health maintenance organization": "hmo",
+    "exclusive provider organization": "epo",
+    "point of service": "pos",
+    "point-of-service": "pos",
+    "high deductible health plan": "hdhp",
+    "high-deductible health plan": "hdhp",
+}
+
+_PUNCT = re.compile(r"[^\w\s%$-]")
+
+
+def _normalize(text: Any) -> str:
+    text = _PUNCT.sub(" ", str(text or "").lower())
+    return " ".join(text.split())
+
+
+def coverage_key(insurance_info: List[str], service: str) -> str:
+    """Cache key for a coverage question, insensitive to case, spacing and plan-name spelling."""
+    provider = _normalize(insurance_info[0] if insurance_info else "")
+    company = _normalize(insurance_info[1] if len(insurance_info) > 1 else "")
+    plan_name = _normalize(insurance_info[2] if len(insurance_info) > 2 else "")
+    for long_form, alias in PLAN_ALIASES.items():
+        plan_name = plan_name.replace(long_form, alias)
+    # "Aetna Open Choice PPO" with company "Aetna" is the same plan as "Open Choice PPO"
+    if company and plan_name.startswith(company + " "):
+        plan_name = plan_name[len(company) + 1:]
+    return "|".join(("coverage", provider, company, plan_name, _normalize(service)))
@@ -1,30 +1,195 @@
+from contextlib import aclosing
+from pathlib import Path
+from typing import Any, AsyncIterator, Dict, Optional, Tuple
+
+from backend.utils.cache import AnswerCache
+from backend.utils.concurrency import run_blocking
+from backend.utils.keyword_matcher import KeywordMatcher, load_matcher, normalize_text
+from backend.utils.llm import StreamInterrupted
+from backend.utils.logging import get_logger
+from backend.utils.metrics import STAGE_SECONDS, timed
+
+
+logger = get_logger(__name__)
+
+# Default emergency vocabulary; the API overrides it with EMERGENCY_KEYWORDS_PATH
+EMERGENCY_KEYWORDS_PATH = Path(__file__).resolve().parents[1] / "resources" / "emergency_keywords.txt"
+
+
 class KnowledgeAgent:
-    def __init__(self, llm_model, escalation_callback):
+    INSTRUCTION = "Answer with very general health guidance only. Do not give personal medical advice. Escalate if unsure."
+
+    URGENT_MESSAGE = "This sounds urgent. I am escalating to a human healthcare provider."
+    UNCERTAIN_MESSAGE = "I'm not certain about this question. A healthcare professional will assist you shortly."
+    INTERRUPTED_MESSAGE = "The answer was cut off. Please ask again."
+    # Streamed text kept back until it cannot be the start of an uncertainty phrase
+    STREAM_HOLDBACK = len("I don't know") - 1
+
+    def __init__(
+        self,
+        llm_model,
+        escalation_callback,
+        emergency_matcher: Optional[KeywordMatcher] = None,
+        cache: Optional[AnswerCache] = None,
+    ):
         self.llm_model = llm_model
         self.escalation_callback = escalation_callback  # e.g., send Slack/email
+        self.emergency_matcher = emergency_matcher or load_matcher(EMERGENCY_KEYWORDS_PATH)
+        # Answers to repeated general questions, keyed by question_key()
+        self.cache = cache
 
+    @timed(STAGE_SECONDS.labels("chat.advice"))
     def get_general_advice(self, query: str) -> str:
         """
-        Provide general medical guidance. Escalate if unsafe or uncertain. 
+        Provide general medical guidance. Escalate if unsafe or uncertain.
+        """
+        # Step 1: Screen the question; emergencies never wait on the LLM
+        urgent = self._screen(query)
+        if urgent is not None:
+            return urgent
+
+        cached = self._cached(query)
+        if cached is not None:
+            return cached
+
+        # Step 2: Ask LLM for advice
+        response = self.llm_model.generate_response(query, instruction=self.INSTRUCTION)
+        return self._remember(query, response, self._apply_guardrails(query, response))
+
+    @timed(STAGE_SECONDS.labels("chat.advice"))
+    async def get_general_advice_async(self, query: str) -> str:
+        """
+        Async counterpart of ``get_general_advice``. Uses the model's async
+        entry point when it has one, otherwise runs it on the blocking pool.
+        """
+        urgent = self._screen(query)
+        if urgent is not None:
+            return urgent
+        cached = self._cached(query)
+        if cached is not None:
+            return cached
+
+        generate_async = getattr(self.llm_model, "generate_response_async", None)
+        if generate_async is not None:
+            response = await generate_async(query, instruction=self.INSTRUCTION)
+        else:
+            response = await run_blocking(self.llm_model.generate_response, query, instruction=self.INSTRUCTION)
+        return self._remember(query, response, self._apply_guardrails(query, response))
+
+    async def stream_general_advice(self, query: str) -> AsyncIterator[Tuple[str, Dict[str, Any]]]:
         """
-        # Step 1: Ask LLM for advice
-        response = self.llm_model.generate_response(
-            query,
-            instruction="Answer with very general health guidance only. Do not give personal medical advice. Escalate if unsure."
-        )
-
-        # Step 2: Simple guardrails
-        unsafe_keywords = ["chest pain", "seizure", "shortness of breath", "suicidal"]
-        if any(word in query.lower() for word in unsafe_keywords):
-            self.escalation_callback(query, reason="Emergency keyword detected")
-            return "This sounds urgent. I am escalating to a human healthcare provider."
-
-        if "I don't know" in response or "unsure" in response.lower():
+        Streaming ``get_general_advice``. Yields ``("token", {"text"})`` chunks as
+        the model produces them, then ``("done", {"message"})`` with the full
+        answer, or ``("escalation", {"reason", "message"})`` as soon as a
+        guardrail trips, after which no more text is sent. A stream the model
+        breaks off ends with ``("error", {"detail"})`` instead of ``done``.
+        """
+        urgent = self._screen(query)
+        if urgent is not None:
+            yield "escalation", {"reason": "Emergency keyword detected", "message": urgent}
+            return
+        cached = self._cached(query)
+        if cached is not None:
+            yield "token", {"text": cached}
+            yield "done", {"message": cached}
+            return
+
+        stream = getattr(self.llm_model, "generate_response_stream", None)
+        if stream is None:
+            message = await self.get_general_advice_async(query)
+            if message in (self.URGENT_MESSAGE, self.UNCERTAIN_MESSAGE):
+                yield "escalation", {"reason": "LLM uncertainty", "message": message}
+            else:
+                yield "token", {"text": message}
+                yield "done", {"message": message}
+            return
+
+        text = ""
+        sent = 0
+        try:
+            async with aclosing(stream(query, instruction=self.INSTRUCTION)) as chunks:
+                async for chunk in chunks:
+                    text += chunk
+                    if self._is_uncertain(text):
+                        yield self._escalate(query, "LLM uncertainty", self.UNCERTAIN_MESSAGE)
+                        return
+                    safe = len(text) - self.STREAM_HOLDBACK
+                    if safe > sent:
+                        yield "token", {"text": text[sent:safe]}
+                        sent = safe
+        except StreamInterrupted as exc:
+            # The held-back tail is dropped too: the client already knows the answer is incomplete
+            logger.warning("Chat stream interrupted after %d chars: %s", len(text), exc)
+            yield "error", {"detail": self.INTERRUPTED_MESSAGE}
+            return
+        if len(text) > sent:
+            yield "token", {"text": text[sent:]}
+        # Only reached when the model finished, so partial text is never cached
+        self._remember(query, text, text)
+        yield "done", {"message": text}
+
+    def _screen(self, query: str) -> Optional[str]:
+        # Single pass over the question, however many terms the vocabulary has
+        if self.emergency_matcher.search(query) is None:
+            return None
+        self.escalation_callback(query, reason="Emergency keyword detected")
+        return self.URGENT_MESSAGE
+
+    def _apply_guardrails(self, query: str, response: str) -> str:
+        # Step 3: Check the answer itself
+        if self._is_uncertain(response):
             self.escalation_callback(query, reason="LLM uncertainty")
-            return "I'm not certain about this question. A healthcare professional will assist you shortly."
+            return self.UNCERTAIN_MESSAGE
 
-        # Step 3: Return safe, general response
+        # Step 4: Return safe, general response
         return response
 
+    def _cached(self, query: str) -> Optional[str]:
+        return self.cache.get(question_key(query)) if self.cache is not None else None
+
+    def _remember(self, query: str, response: str, answer: str) -> str:
+        # Only genuine answers are cached: never escalations, uncertain replies or
+        # the wrapper's "not sure"/"not configured" stand-ins after a failed call
+        if self.cache is not None and answer is response and self._cacheable(response):
+            self.cache.set(question_key(query), response)
+        return answer
+
+    @classmethod
+    def _cacheable(cls, response: Optional[str]) -> bool:
+        if not response or not response.strip() or cls._is_uncertain(response):
+            return False
+        lowered = response.lower()
+        return "not sure" not in lowered and "not configured" not in lowered
+
+    def _escalate(self, query: str, reason: str, message: str) -> Tuple[str, Dict[str, Any]]:
+        self.escalation_callback(query, reason=reason)
+        return "escalation", {"reason": reason, "message": message}
+
+    @staticmethod
+    def _is_uncertain(response: Optional[str]) -> bool:
+        response = response or ""
+        return "I don't know" in response or "unsure" in response.lower()
+
+
+# Filler words dropped from cache keys. Question words and negations are kept
+# because they change what is being asked.
+STOP_WORDS = frozenset("""
+    a an the and or but so if then than
+    i im ive id me my mine we our us you your yours he she him her his they them their it its
+    is are was were be been being am do does did doing have has had having
+    can could should would will shall may might must
+    to of in on at by for with from into about as
+    this that these those there here
+    please pls hi hello hey thanks thank ok okay just really also very quite
+    tell explain know let get got any some
+""".split())
+
+
+def question_key(query: str) -> str:
+    """Cache key for a chat question: lowercase, no punctuation, no filler words."""
+    return " ".join(w for w in normalize_text(query).split() if w not in STOP_WORDS)
+
+
 def escalate_to_human(query, reason):
-    print(f"[ESCALATION] {reason} → Human needed for: {query}")
+    # Synchronous fallback; the API queues escalations through EscalationQueue instead
+    logger.warning(f"[ESCALATION] {reason} → Human needed for: {query}")
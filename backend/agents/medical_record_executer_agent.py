@@ -1,4 +1,7 @@
-from typing import List, Dict, Any, Optional
+from collections.abc import Sequence
+from typing import List, Dict, Any, Iterable, Optional
+
+from backend.utils.records import normalize_patient_id, patient_index
 
 
 class MedicalExecutorAgent:
@@ -10,19 +13,24 @@ class MedicalExecutorAgent:
         Given a planning result and the full records list, return the matching
         record subset. Falls back gracefully if keys are missing.
         """
-        if not isinstance(full_records, list):
+        if not _is_rows(full_records):
             return {"error": "Invalid full_records payload"}
+        return self._lookup(plan, full_records)
 
+    def _lookup(
+        self,
+        plan: Dict[str, Any],
+        full_records: List[Dict[str, Any]],
+        index: Optional[Dict[str, Dict[str, Any]]] = None,
+    ) -> Dict[str, Any]:
         pid = plan.get("patient_id") if isinstance(plan, dict) else None
         field = plan.get("field") if isinstance(plan, dict) else None
 
         match: Optional[Dict[str, Any]] = None
         if pid is not None:
-            for row in full_records:
-                # Support multiple potential id keys
-                if str(row.get("Patient ID")) == str(pid) or str(row.get("patient_id")) == str(pid):
-                    match = row
-                    break
+            match = (index if index is not None else patient_index(full_records)).get(normalize_patient_id(pid))
+            if match is None:
+                return {"warning": f"No record found for patient {pid}"}
 
         if match is None and full_records:
             match = full_records[0]
@@ -30,8 +38,59 @@ class MedicalExecutorAgent:
         if match is None:
             return {"warning": "No records found"}
 
+        return self._select(pid, field, match)
+
+    def fetch_records(
+        self,
+        patient_ids: Iterable[Any],
+        full_records: List[Dict[str, Any]],
+        field: Optional[str] = None,
+    ) -> List[Dict[str, Any]]:
+        """
+        Batch lookup: one result per requested patient ID, in input order,
+        using the same ID index as ``fetch_record``.
+        """
+        if not _is_rows(full_records):
+            return [{"error": "Invalid full_records payload"}]
+
+        index = patient_index(full_records)
+        return [self._lookup_id(index, pid, field) for pid in patient_ids]
+
+    def fetch_plans(self, plans: List[Any], full_records: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        """
+        Resolve many planner results in one pass over a single ID index, in
+        input order. A plan naming several patients yields ``{"records": [...]}``,
+        any other plan the same result as ``fetch_record``.
+        """
+        if not _is_rows(full_records):
+            return [{"error": "Invalid full_records payload"} for _ in plans]
+
+        # Built once here even for a plain list, not once per plan
+        index = patient_index(full_records)
+        results: List[Dict[str, Any]] = []
+        for plan in plans:
+            ids = plan.get("patient_ids") if isinstance(plan, dict) else None
+            if isinstance(ids, list) and len(ids) > 1:
+                results.append({"records": [self._lookup_id(index, pid, plan.get("field")) for pid in ids]})
+            else:
+                results.append(self._lookup(plan, full_records, index))
+        return results
+
+    def _lookup_id(self, index: Dict[str, Dict[str, Any]], pid: Any, field: Optional[str]) -> Dict[str, Any]:
+        match = index.get(normalize_patient_id(pid))
+        if match is None:
+            return {"warning": f"No record found for patient {pid}"}
+        return self._select(pid, field, match)
+
+    @staticmethod
+    def _select(pid: Any, field: Optional[str], match: Dict[str, Any]) -> Dict[str, Any]:
         if field and isinstance(field, str):
             # Return only requested field if present
             return {"patient_id": pid, "field": field, "value": match.get(field)}
 
         return match
+
+
+def _is_rows(full_records: Any) -> bool:
+    # Any row sequence: a list, a RecordSnapshot or a record_store.MappedRecords
+    return isinstance(full_records, Sequence) and not isinstance(full_records, (str, bytes))
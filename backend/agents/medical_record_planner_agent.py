@@ -1,86 +1,362 @@
-import os
+import asyncio
 import json
 import re
-from typing import Dict, Any, List
+from typing import Dict, Any, List, Optional, Tuple
+from backend.utils.llm import generate_json, generate_json_async, lazy_model
 from backend.utils.logging import get_logger
-from backend.utils.retry import retry
+from backend.utils.metrics import STAGE_SECONDS, timed
+from backend.utils.records import derived, patient_id_of, patient_index
 
-try:
-    import google.generativeai as genai
-except Exception:  # pragma: no cover - optional at runtime
-    genai = None
-
-def clean_json(text: str) -> str:
-    # Remove ```json ... ``` or ``` ... ``` blocks
-    return re.sub(r"```(?:json)?\s*([\s\S]*?)\s*```", r"\1", text).strip()
 
 class MedicalPlannerAgent:
-    def __init__(self, api_key: str, model_name="gemini-flash-latest"):
-        self.model = None
+    model = lazy_model()
+
+    # Matches returned per page by the fallback planner
+    page_size = 100
+    # Approximate token budget for the skeleton section of the prompt
+    prompt_budget = 1500
+    # Queries planned per Gemini call by plan_batch
+    batch_size = 25
+
+    def __init__(self, api_key: str, model_name="gemini-flash-latest", prompt_budget: Optional[int] = None):
+        # Gemini model comes from the shared registry the first time it is needed
+        self.api_key = api_key
+        self.model_name = model_name
+        if prompt_budget is not None:
+            self.prompt_budget = max(1, int(prompt_budget))
         self.logger = get_logger(__name__)
-        if api_key and genai is not None:
-            try:
-                genai.configure(api_key=api_key, transport="rest")
-                self.model = genai.GenerativeModel(model_name)
-            except Exception:
-                self.logger.warning("Failed to initialize Gemini; using fallback")
-                self.model = None
-
-    def plan_request(self, query: str, skeleton_data: List[Dict[str, Any]]) -> dict:
-        prompt = f"""
+
+    def _build_prompt(self, query: str, skeleton_data: List[Dict[str, Any]]) -> str:
+        # Skeleton rows are sent as "field: IDs" lines capped by prompt_budget,
+        # so the prompt stays the same size however many patients the sheet has
+        skeleton = compact_skeleton(skeleton_data or [], query, self.prompt_budget)
+        return f"""
         You are a medical records planner.
         Use ONLY the skeleton data (no real medical info) to decide which patient and field to fetch.
 
-        Skeleton data: {json.dumps(skeleton_data)}
+        Skeleton data, as patient IDs per field (count in parentheses; "+N more" marks a truncated list):
+        {skeleton}
 
         For the query: "{query}", return a JSON object with:
         {{
-            "row": "...",
             "patient_id": "...",
+            "patient_ids": ["..."],
             "field": "Labs | Prescriptions | Exam | Notes | Vaccinations | etc."
         }}
+        List every matching patient in "patient_ids" when the query asks for more than one.
+        If the query asks for every patient with a field, set "patient_ids" to "all" instead of listing them.
 
         Respond with ONLY valid JSON. No explanation or text outside the JSON.
         """
 
+    def _build_batch_prompt(self, queries: List[str], skeleton_data: List[Dict[str, Any]]) -> str:
+        skeleton = compact_skeleton(skeleton_data or [], "\n".join(queries), self.prompt_budget)
+        numbered = "\n        ".join(f"{i}. {json.dumps(q)}" for i, q in enumerate(queries))
+        return f"""
+        You are a medical records planner.
+        Use ONLY the skeleton data (no real medical info) to decide which patient and field to fetch.
+
+        Skeleton data, as patient IDs per field (count in parentheses; "+N more" marks a truncated list):
+        {skeleton}
+
+        Plan each of these numbered queries on its own:
+        {numbered}
+
+        Return a JSON array with one object per query, in the same order:
+        [
+            {{"index": 0, "patient_id": "...", "patient_ids": ["..."], "field": "Labs | Prescriptions | Exam | Notes | Vaccinations | etc."}}
+        ]
+        List every matching patient in "patient_ids" when a query asks for more than one.
+        If a query asks for every patient with a field, set its "patient_ids" to "all" instead of listing them.
+
+        Respond with ONLY valid JSON. No explanation or text outside the JSON.
+        """
+
+    @timed(STAGE_SECONDS.labels("records.plan"))
+    def plan_request(
+        self,
+        query: str,
+        skeleton_data: List[Dict[str, Any]],
+        offset: int = 0,
+        limit: Optional[int] = None,
+    ) -> dict:
         # Use LLM if available
         if self.model is not None:
-            try:
-                response = retry(lambda: self.model.generate_content(prompt))
-                response_text = clean_json(response.text)
-                try:
-                    return json.loads(response_text)
-                except json.JSONDecodeError:
-                    self.logger.warning("Gemini returned non-JSON; using fallback")
-            except Exception as e:
-                self.logger.error(f"Gemini error: {e}; using fallback")
-
-        # Fallback heuristic: infer a field and first matching patient
-        q = (query or "").lower()
-        known_fields = [
-            "labs", "prescriptions", "allergies", "notes", "vaccinations", "imaging"
-        ]
-        field = next((f.title() for f in known_fields if f in q), "Labs")
-
-        pid = None
-        row_idx = None
-        for idx, row in enumerate(skeleton_data or []):
-            fields_col = row.get("Fields")
-            if isinstance(fields_col, str):
-                fields = [x.strip().lower() for x in fields_col.split(",")]
-            elif isinstance(fields_col, list):
-                fields = [str(x).strip().lower() for x in fields_col]
-            else:
-                fields = []
-            if field.lower() in fields:
-                pid = row.get("Patient ID") or row.get("patient_id")
-                row_idx = idx + 1
-                break
+            plan = generate_json(self.model, self._build_prompt(query, skeleton_data), self.logger)
+            if plan is not None:
+                return self._complete_plan(plan, skeleton_data, offset, limit)
+        return self._fallback_plan(query, skeleton_data, offset, limit)
 
-        if pid is None and skeleton_data:
-            pid = skeleton_data[0].get("Patient ID") or skeleton_data[0].get("patient_id")
-            row_idx = 1
+    @timed(STAGE_SECONDS.labels("records.plan"))
+    async def plan_request_async(
+        self,
+        query: str,
+        skeleton_data: List[Dict[str, Any]],
+        offset: int = 0,
+        limit: Optional[int] = None,
+    ) -> dict:
+        if self.model is not None:
+            plan = await generate_json_async(self.model, self._build_prompt(query, skeleton_data), self.logger)
+            if plan is not None:
+                return self._complete_plan(plan, skeleton_data, offset, limit)
+        return self._fallback_plan(query, skeleton_data, offset, limit)
 
-        plan = {"row": row_idx, "patient_id": pid, "field": field}
-        self.logger.info(f"Planner fallback plan: {plan}")
+    @timed(STAGE_SECONDS.labels("records.plan_batch"))
+    def plan_batch(self, lookups: List[Dict[str, Any]], skeleton_data: List[Dict[str, Any]]) -> List[dict]:
+        """
+        Plan several ``{"query", "offset"?, "limit"?}`` lookups together: one
+        Gemini call per ``batch_size`` queries, and the indexed fallback for
+        any query the model leaves unanswered. Plans come back in input order.
+        """
+        answers: List[Optional[dict]] = [None] * len(lookups)
+        if self.model is not None:
+            for start in range(0, len(lookups), self.batch_size):
+                chunk = lookups[start:start + self.batch_size]
+                prompt = self._build_batch_prompt([l.get("query", "") for l in chunk], skeleton_data)
+                answers[start:start + len(chunk)] = batch_answers(generate_json(self.model, prompt, self.logger), len(chunk))
+        return [self._batch_plan(answer, lookup, skeleton_data) for answer, lookup in zip(answers, lookups)]
+
+    @timed(STAGE_SECONDS.labels("records.plan_batch"))
+    async def plan_batch_async(self, lookups: List[Dict[str, Any]], skeleton_data: List[Dict[str, Any]]) -> List[dict]:
+        """Async ``plan_batch``; the Gemini calls for separate chunks run concurrently."""
+        answers: List[Optional[dict]] = [None] * len(lookups)
+        if self.model is not None:
+            starts = range(0, len(lookups), self.batch_size)
+            replies = await asyncio.gather(*(
+                generate_json_async(
+                    self.model,
+                    self._build_batch_prompt([l.get("query", "") for l in lookups[start:start + self.batch_size]], skeleton_data),
+                    self.logger,
+                )
+                for start in starts
+            ))
+            for start, reply in zip(starts, replies):
+                count = len(lookups[start:start + self.batch_size])
+                answers[start:start + count] = batch_answers(reply, count)
+        return [self._batch_plan(answer, lookup, skeleton_data) for answer, lookup in zip(answers, lookups)]
+
+    def _batch_plan(self, answer: Optional[dict], lookup: Dict[str, Any], skeleton_data: List[Dict[str, Any]]) -> dict:
+        offset, limit = lookup.get("offset", 0), lookup.get("limit")
+        if answer is not None:
+            return self._complete_plan(answer, skeleton_data, offset, limit)
+        return self._fallback_plan(lookup.get("query", ""), skeleton_data, offset, limit)
+
+    def _complete_plan(self, plan: Any, skeleton_data: List[Dict[str, Any]], offset: int, limit: Optional[int]) -> Any:
+        # The prompt no longer carries row numbers or full ID lists; fill them from the local indexes
+        if not isinstance(plan, dict):
+            return plan
+        ids = plan.get("patient_ids")
+        if isinstance(ids, str) and ids.strip().lower() == "all":
+            matches = field_index(skeleton_data or []).get(canonical_field(plan.get("field") or ""), [])
+            plan.update(self._page(matches, offset, limit))
+            if plan.get("patient_id") is None and plan["patient_ids"]:
+                plan["patient_id"] = plan["patient_ids"][0]
+        if plan.get("row") is None and plan.get("patient_id") is not None:
+            plan["row"] = patient_rows(skeleton_data or []).get(str(plan["patient_id"]).strip())
+        return plan
+
+    def _page(self, matches: List[Tuple[int, Optional[str]]], offset: int, limit: Optional[int]) -> dict:
+        offset = max(0, int(offset or 0))
+        limit = self.page_size if limit is None else max(1, int(limit))
+        page = matches[offset:offset + limit]
+        return {
+            "rows": [r for r, _ in page],
+            "patient_ids": [p for _, p in page],
+            "total": len(matches),
+            "offset": offset,
+            "limit": limit,
+            "next_offset": offset + limit if offset + limit < len(matches) else None,
+        }
+
+    @timed(STAGE_SECONDS.labels("records.fallback"))
+    def _fallback_plan(
+        self,
+        query: str,
+        skeleton_data: List[Dict[str, Any]],
+        offset: int = 0,
+        limit: Optional[int] = None,
+    ) -> dict:
+        # Fallback heuristic: infer a field, then every patient that has it
+        field = detect_field(query) or "Labs"
+        matches = field_index(skeleton_data or []).get(field, [])
+        paging = self._page(matches, offset, limit)
+
+        if paging["rows"]:
+            row_idx, pid = paging["rows"][0], paging["patient_ids"][0]
+        elif matches:
+            row_idx, pid = matches[0]
+        elif skeleton_data:
+            row_idx, pid = 1, patient_id_of(skeleton_data[0])
+        else:
+            row_idx, pid = None, None
+
+        plan = {"row": row_idx, "patient_id": pid, "field": field, **paging}
+        self.logger.info("Planner fallback plan: field=%s total=%d offset=%s", field, len(matches), paging["offset"])
         return plan
+
+
+# Canonical record field -> lowercase spellings seen in skeleton sheets and queries
+FIELD_SYNONYMS: Dict[str, Tuple[str, ...]] = {
+    "Labs": ("lab", "labs", "laboratory", "lab work", "lab result", "lab results", "blood work", "bloodwork", "blood test", "blood tests"),
+    "Vaccinations": ("vaccine", "vaccines", "vaccination", "vaccinations", "immunization", "immunizations", "shot", "shots"),
+    "Prescriptions": ("prescription", "prescriptions", "medication", "medications", "meds", "rx"),
+    "Allergies": ("allergy", "allergies"),
+    "Notes": ("note", "notes"),
+    "Imaging": ("imaging", "x-ray", "x-rays", "xray", "xrays", "mri", "ct scan", "scan", "scans"),
+    "Exam": ("exam", "exams", "physical", "physicals", "checkup", "check-up"),
+}
+
+_CANONICAL_FIELDS: Dict[str, str] = {
+    spelling: canonical
+    for canonical, spellings in FIELD_SYNONYMS.items()
+    for spelling in spellings
+}
+
+# Longest spellings first so "blood work" wins over a shorter overlapping term
+_FIELD_PATTERN = re.compile(
+    r"\b(" + "|".join(re.escape(s) for s in sorted(_CANONICAL_FIELDS, key=len, reverse=True)) + r")\b"
+)
+
+
+def batch_answers(reply: Any, count: int) -> List[Optional[dict]]:
+    """Per-query plans from a batched Gemini reply, placed by "index" when given, else by position."""
+    if isinstance(reply, dict):
+        reply = reply.get("plans")
+    answers: List[Optional[dict]] = [None] * count
+    if not isinstance(reply, list):
+        return answers
+    for position, item in enumerate(reply):
+        if not isinstance(item, dict):
+            continue
+        index = item.pop("index", position)
+        if isinstance(index, int) and 0 <= index < count and answers[index] is None:
+            answers[index] = item
+    return answers
+
+
+def canonical_field(name: Any) -> str:
+    text = " ".join(str(name).split()).lower()
+    return _CANONICAL_FIELDS.get(text, text.title())
+
+
+def detect_field(query: str) -> Optional[str]:
+    """Return the canonical field named in a free-text query, if any."""
+    m = _FIELD_PATTERN.search((query or "").lower())
+    return _CANONICAL_FIELDS[m.group(1)] if m else None
+
+
+def _row_fields(row: Dict[str, Any]) -> List[str]:
+    fields_col = row.get("Fields")
+    if isinstance(fields_col, str):
+        return [x for x in fields_col.split(",") if x.strip()]
+    if isinstance(fields_col, list):
+        return [str(x) for x in fields_col if str(x).strip()]
+    return []
+
+
+def build_field_index(skeleton_data: List[Dict[str, Any]]) -> Dict[str, List[Tuple[int, Optional[str]]]]:
+    """Inverted index: canonical field -> [(1-based row, patient ID), ...] in sheet order."""
+    index: Dict[str, List[Tuple[int, Optional[str]]]] = {}
+    for idx, row in enumerate(skeleton_data, start=1):
+        pid = patient_id_of(row)
+        for field in {canonical_field(f) for f in _row_fields(row)}:
+            index.setdefault(field, []).append((idx, pid))
+    return index
+
+
+def field_index(skeleton_data: List[Dict[str, Any]]) -> Dict[str, List[Tuple[int, Optional[str]]]]:
+    """Field index for ``skeleton_data``, built once per snapshot."""
+    return derived(skeleton_data, "field_index", build_field_index)
+
+
+def build_patient_rows(skeleton_data: List[Dict[str, Any]]) -> Dict[str, int]:
+    """Patient ID -> 1-based sheet row. The first row wins on duplicate IDs."""
+    rows: Dict[str, int] = {}
+    for idx, row in enumerate(skeleton_data, start=1):
+        pid = patient_id_of(row)
+        if pid is not None:
+            rows.setdefault(pid, idx)
+    return rows
+
+
+def patient_rows(skeleton_data: List[Dict[str, Any]]) -> Dict[str, int]:
+    return derived(skeleton_data, "patient_rows", build_patient_rows)
+
+
+# Rough chars-per-token ratio for Gemini on short ASCII tokens such as IDs
+CHARS_PER_TOKEN = 4
+# Patients named in a query whose fields are listed ahead of the per-field lists
+MAX_MENTIONED_PATIENTS = 20
+
+_ID_TOKEN = re.compile(r"[\w-]+")
+
+
+def estimate_tokens(text: str) -> int:
+    return -(-len(text) // CHARS_PER_TOKEN)
+
+
+def _mentioned_patients(query: str, skeleton_data: List[Dict[str, Any]]) -> List[str]:
+    known = patient_index(skeleton_data)
+    found = [t for t in dict.fromkeys(_ID_TOKEN.findall(query or "")) if t in known]
+    return found[:MAX_MENTIONED_PATIENTS]
+
+
+def _encode_fields(index: Dict[str, List[Tuple[int, Optional[str]]]], focus: Optional[str], budget_chars: int) -> List[str]:
+    # The queried field is listed first and may use whatever budget it needs;
+    # the others split what is left evenly
+    fields = sorted(index, key=lambda f: (f != focus, -len(index[f]), f))
+    headers: List[str] = []
+    remaining = budget_chars
+    for field in fields:
+        header = f"{field} ({len(index[field])}):"
+        # Room for the header, separators and a worst-case "+N more" suffix
+        cost = len(header) + len(f" +{len(index[field])} more") + 2
+        if headers and cost > remaining:
+            break
+        headers.append(header)
+        remaining -= cost
+
+    lines = []
+    for i, header in enumerate(headers):
+        field = fields[i]
+        share = remaining if field == focus else remaining // (len(headers) - i)
+        ids: List[str] = []
+        used = 0
+        for _, pid in index[field]:
+            cost = len(pid or "") + 1
+            if used + cost > share:
+                break
+            ids.append(pid or "")
+            used += cost
+        remaining -= used
+        more = len(index[field]) - len(ids)
+        lines.append(" ".join(filter(None, [header, ",".join(ids), f"+{more} more" if more else ""])))
+    return lines
+
+
+def _compact_fields(skeleton_data: List[Dict[str, Any]], focus: Optional[str], budget_tokens: int) -> str:
+    lines = _encode_fields(field_index(skeleton_data), focus, budget_tokens * CHARS_PER_TOKEN)
+    return "\n".join(lines) if lines else "(no patients)"
+
+
+def compact_skeleton(skeleton_data: List[Dict[str, Any]], query: str, budget_tokens: int) -> str:
+    """Skeleton rows as "field (count): id,id,..." lines within ~``budget_tokens`` tokens.
+
+    Built from the field index, so the result only depends on the query's
+    field and patients, not on how the sheet's rows are laid out.
+    """
+    focus = detect_field(query)
+    mentioned = _mentioned_patients(query, skeleton_data)
+    if not mentioned:
+        return derived(
+            skeleton_data, f"compact_skeleton:{focus}:{budget_tokens}",
+            lambda rows: _compact_fields(rows, focus, budget_tokens),
+        )
+
+    rows = patient_index(skeleton_data)
+    line = "Patients named in the query: " + "; ".join(
+        f"{pid}: {', '.join(sorted({canonical_field(f) for f in _row_fields(rows[pid])})) or '-'}" for pid in mentioned
+    )
+    budget_chars = budget_tokens * CHARS_PER_TOKEN - len(line) - 1
+    lines = _encode_fields(field_index(skeleton_data), focus, max(0, budget_chars))
+    return "\n".join([line] + lines)
@@ -1,6 +1,11 @@
+import asyncio
 import os
+import sqlite3
+from contextlib import aclosing, asynccontextmanager
+from functools import partial
+from datetime import datetime, timedelta
 from pathlib import Path
-from typing import List
+from typing import List, Optional
 
 BASE_DIR = Path(__file__).resolve().parent
 PROJECT_ROOT = BASE_DIR.parent
@@ -24,19 +29,25 @@ except Exception:
     # dotenv is optional in production
     pass
 
-from fastapi import FastAPI, HTTPException
+from fastapi import Depends, FastAPI, HTTPException, Request
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import Response, StreamingResponse
 from pydantic import BaseModel, Field
 
 import json
 
-from backend.utils.google import load_sheet_records
-from backend.utils.logging import get_logger
-from backend.utils.retry import retry
-try:
-    import google.generativeai as genai
-except Exception:
-    genai = None
+from backend.utils.record_store import MappedRecords
+from backend.utils.records import RecordSnapshotCache
+from backend.utils.reservations import ReservationLedger
+from backend.utils.logging import RequestIdMiddleware, get_logger, log_queue_depth
+from backend.utils.cache import AnswerCache, TieredCache
+from backend.utils.escalations import EscalationQueue
+from backend.utils.outbox import Outbox
+from backend.utils.concurrency import iterate_blocking, run_blocking
+from backend.utils.keyword_matcher import load_matcher
+from backend.utils.metrics import CONTENT_TYPE as METRICS_CONTENT_TYPE, QUEUE_DEPTH, REGISTRY as METRICS
+from backend.utils.llm import StreamInterrupted, flight_key, inflight, registry as gemini_registry, request_options
+from backend.utils.retry import deadline_expired, remaining_budget, retry, retry_async
 
 logger = get_logger(__name__)
 
@@ -54,6 +65,12 @@ from backend.orchestrating_agent import HealthcareOrchestrator
 
 class RecordsRequest(BaseModel):
     query: str
+    offset: int = Field(0, ge=0, description="Index of the first matching patient to return")
+    limit: Optional[int] = Field(None, ge=1, description="Max matching patients per page")
+
+
+class RecordsBatchRequest(BaseModel):
+    queries: List[RecordsRequest] = Field(..., min_length=1, max_length=200)
 
 
 class InsuranceRequest(BaseModel):
@@ -66,6 +83,20 @@ class InsuranceRequest(BaseModel):
 class AppointmentRequest(BaseModel):
     patientName: str = Field("Patient")
     patientEmail: str = Field("patient@example.com")
+    count: int = Field(1, ge=1, le=50, description="Number of slots to return (first one plus alternatives)")
+    after: Optional[datetime] = Field(None, description="Earliest acceptable start, in the clinic timezone if naive")
+    preferences: Optional[str] = Field(None, description="Free-text scheduling preferences, e.g. 'mornings, not Fridays'")
+
+
+class BatchAppointmentRequest(BaseModel):
+    patients: List[AppointmentRequest] = Field(..., min_length=1, max_length=200)
+    after: Optional[datetime] = Field(None, description="Earliest acceptable start for the first patient")
+
+
+class IntakeRequest(BaseModel):
+    records: Optional[RecordsRequest] = None
+    insurance: Optional[InsuranceRequest] = None
+    appointment: Optional[AppointmentRequest] = None
 
 
 class ChatRequest(BaseModel):
@@ -84,13 +115,22 @@ def _load_local_json(path: str) -> List[dict]:
     return []
 
 
+# Parsed spreadsheets, re-read only when the file's mtime/size changes
+record_snapshots = RecordSnapshotCache()
+# Full records are read row by row from a memory map instead of parsed whole
+record_stores = RecordSnapshotCache(factory=partial(
+    MappedRecords.open,
+    index_dir=os.getenv("RECORD_INDEX_DIR", str(PROJECT_ROOT / ".cache" / "record_index")),
+))
+
+
 def load_skeleton_records() -> List[dict]:
     path = os.getenv(
         "SKELETON_SPREADSHEET_PATH",
         "backend/utils/MedicalRecordSkeletonSpreadsheet - Sheet1.csv",
     )
     try:
-        return load_sheet_records(path)
+        return record_snapshots.get(path)
     except Exception:
         return _load_local_json("backend/resources/skeleton_records.json")
 
@@ -100,8 +140,9 @@ def load_full_records() -> List[dict]:
         "FULL_SPREADSHEET_PATH",
         "backend/utils/MedicalRecordSpreadsheet - Sheet1.csv",
     )
+    cache = record_snapshots if os.getenv("FULL_RECORDS_STORE", "mmap") == "memory" else record_stores
     try:
-        return load_sheet_records(path)
+        return cache.get(path)
     except Exception:
         return _load_local_json("backend/resources/full_records.json")
 
@@ -115,21 +156,49 @@ def load_calendar_defaults():
 
 
 def create_medical_agents(api_key: str):
-    planner = MedicalPlannerAgent(api_key=api_key)
+    planner = MedicalPlannerAgent(
+        api_key=api_key,
+        prompt_budget=int(os.getenv("RECORD_PROMPT_TOKEN_BUDGET", "1500")),
+    )
     executor = MedicalExecutorAgent()
     return planner, executor
 
 
 def create_insurance_agents(api_key: str):
-    planner = InsurancePlannerAgent(api_key=api_key)
+    cache = TieredCache(
+        ttl=float(os.getenv("INSURANCE_CACHE_TTL_SECONDS", "86400")),
+        stale_ttl=float(os.getenv("INSURANCE_CACHE_STALE_SECONDS", "604800")),
+        memory_size=int(os.getenv("INSURANCE_CACHE_MEMORY_ENTRIES", "1024")),
+        sqlite_path=os.getenv("INSURANCE_CACHE_PATH", str(PROJECT_ROOT / ".cache" / "insurance_coverage.sqlite3")) or None,
+    )
+    planner = InsurancePlannerAgent(api_key=api_key, cache=cache)
     executor = InsuranceExecutorAgent()
     return planner, executor
 
 
-def create_appointment_agents(api_key: str):
-    planner = AppointmentPlannerAgent(api_key=api_key)
-    # Use a no-op executor that returns a confirmation string
-    executor = AppointmentExecutorAgent()
+def create_outbox() -> Optional[Outbox]:
+    path = os.getenv("APPOINTMENT_OUTBOX_PATH", str(PROJECT_ROOT / ".cache" / "appointment_outbox.sqlite3"))
+    if not path:
+        return None
+    try:
+        return Outbox(path, max_attempts=int(os.getenv("APPOINTMENT_OUTBOX_MAX_ATTEMPTS", "8")))
+    except (OSError, sqlite3.Error) as exc:
+        logger.warning(f"Appointment outbox at {path} unavailable ({exc}); booking side effects run inline")
+        return None
+
+
+def create_appointment_agents(api_key: str, outbox: Optional[Outbox] = None):
+    planner = AppointmentPlannerAgent(
+        api_key=api_key,
+        horizon_days=int(os.getenv("APPOINTMENT_HORIZON_DAYS", "14")),
+        include_weekends=os.getenv("APPOINTMENT_INCLUDE_WEEKENDS", "false").lower() in ("1", "true", "yes"),
+        work_hours=(os.getenv("WORK_START", "08:00"), os.getenv("WORK_END", "17:00")),
+        padding_minutes=int(os.getenv("APPOINTMENT_PADDING_MINUTES", "15")),
+        mode=os.getenv("APPOINTMENT_PLANNER_MODE", "deterministic"),
+    )
+    # Use a no-op executor that returns a confirmation string; with calendar/email
+    # clients attached, their calls are queued in the outbox and run in the background
+    executor = AppointmentExecutorAgent(outbox=outbox)
     return planner, executor
 
 
@@ -137,7 +206,16 @@ def create_appointment_agents(api_key: str):
 GENAI_MODEL = os.getenv("KNOWLEDGE_MODEL", "gemini-2.5-flash")
 
 
-def create_knowledge_agent(api_key: str) -> KnowledgeAgent:
+def create_escalation_queue() -> EscalationQueue:
+    return EscalationQueue(
+        maxsize=int(os.getenv("ESCALATION_QUEUE_SIZE", "1000")),
+        journal_path=os.getenv("ESCALATION_JOURNAL_PATH", str(PROJECT_ROOT / ".cache" / "escalations.jsonl")) or None,
+        batch_size=int(os.getenv("ESCALATION_BATCH_SIZE", "20")),
+        dedup_seconds=float(os.getenv("ESCALATION_DEDUP_SECONDS", "300")),
+    )
+
+
+def create_knowledge_agent(api_key: str, escalations: Optional[EscalationQueue] = None) -> KnowledgeAgent:
     # Resolve API key from common env var aliases if not provided explicitly
     resolved_key = api_key or os.getenv("GEMINI_API_KEY") or os.getenv("GOOGLE_API_KEY") or os.getenv("GENAI_API_KEY") or os.getenv("GOOGLE_GENAI_API_KEY") or os.getenv("GOOGLEAI_API_KEY") or ""
     if resolved_key:
@@ -147,30 +225,41 @@ def create_knowledge_agent(api_key: str) -> KnowledgeAgent:
 
     class GeminiWrapper:
         def __init__(self, api_key: str, model_name: str):
-            self.model = None
+            self.api_key = api_key
+            # Set by assigning .model (e.g. a fake model in benchmarks); bypasses the registry
+            self._model = None
+            # Try requested model, then fallbacks if needed
+            self.candidates = [model_name, "gemini-2.5-flash", "gemini-2.5-flash-lite", "gemini-2.0-flash-lite", "gemini-1.5-flash", "gemini-1.5-flash-latest", "gemini-pro"]
             if not api_key:
                 logger.warning("Knowledge agent: Missing API key; Gemini disabled.")
-                return
-            if genai is None:
-                logger.warning("Knowledge agent: google-generativeai not installed; Gemini disabled.")
-                return
-            try:
-                genai.configure(api_key=api_key, transport="rest")
-            except Exception as exc:
-                logger.warning(f"Knowledge agent: Failed to configure Gemini client: {exc}")
-                return
 
-            # Try requested model, then fallbacks if needed
-            candidates = [model_name, "gemini-2.5-flash", "gemini-2.5-flash-lite", "gemini-2.0-flash-lite", "gemini-1.5-flash", "gemini-1.5-flash-latest", "gemini-pro"]
-            for name in [m for m in candidates if m]:
-                try:
-                    self.model = genai.GenerativeModel(name)
-                    logger.info(f"Knowledge agent: Initialized Gemini model '{name}'.")
-                    break
-                except Exception as exc:
-                    logger.warning(f"Knowledge agent: Failed to init model '{name}': {exc}")
-            if not self.model:
-                logger.error("Knowledge agent: Could not initialize any Gemini model; knowledge disabled.")
+        @property
+        def model(self):
+            # Picked from the shared registry on first use, so startup does no model discovery
+            if self._model is not None:
+                return self._model
+            return gemini_registry.first_available(self.api_key, self.candidates)
+
+        @model.setter
+        def model(self, value):
+            self._model = value
+
+        def _call_failed(self, model, exc: Exception) -> str:
+            logger.error(f"Gemini knowledge call failed: {exc}")
+            if type(exc).__name__ == "NotFound":
+                # Model retired or not enabled for this key; the next call tries the next candidate
+                gemini_registry.mark_unavailable(model)
+            return "I'm not sure how to answer that right now."
+
+        @staticmethod
+        def _build_prompt(query: str, instruction: str) -> str:
+            return (
+                f"Instruction: {instruction}\n"
+                "Respond in a warm, conversational tone. Offer at most two specific, relevant tips. "
+                "Avoid generic lifestyle lists and only suggest contacting a professional if the message sounds urgent. "
+                "Keep it under three sentences.\n"
+                f"Question: {query}"
+            )
 
         def generate_response(self, query: str, instruction: str) -> str:
             if not self.model:
@@ -179,28 +268,164 @@ def create_knowledge_agent(api_key: str) -> KnowledgeAgent:
                     "GOOGLE_API_KEY on the backend environment."
                 )
 
-            prompt = (
-                f"Instruction: {instruction}\n"
-                "Respond in a warm, conversational tone. Offer at most two specific, relevant tips. "
-                "Avoid generic lifestyle lists and only suggest contacting a professional if the message sounds urgent. "
-                "Keep it under three sentences.\n"
-                f"Question: {query}"
+            if deadline_expired():
+                logger.warning("Knowledge agent: request time budget spent; skipping Gemini.")
+                return "I'm not sure how to answer that right now."
+
+            model = self.model
+            prompt = self._build_prompt(query, instruction)
+
+            def call() -> str:
+                try:
+                    response = retry(lambda: model.generate_content(prompt, **request_options()))
+                    text = getattr(response, "text", "")
+                    return text.strip() or "I'm not sure how to answer that right now."
+                except Exception as exc:
+                    return self._call_failed(model, exc)
+
+            return inflight.do(
+                flight_key(model, prompt), call,
+                timeout=remaining_budget(), default="I'm not sure how to answer that right now.",
+            )
+
+        async def generate_response_async(self, query: str, instruction: str) -> str:
+            if not self.model:
+                return self.generate_response(query, instruction)
+
+            if deadline_expired():
+                logger.warning("Knowledge agent: request time budget spent; skipping Gemini.")
+                return "I'm not sure how to answer that right now."
+
+            model = self.model
+            prompt = self._build_prompt(query, instruction)
+
+            async def call() -> str:
+                try:
+                    response = await retry_async(
+                        lambda: run_blocking(model.generate_content, prompt, **request_options())
+                    )
+                    text = getattr(response, "text", "")
+                    return text.strip() or "I'm not sure how to answer that right now."
+                except Exception as exc:
+                    return self._call_failed(model, exc)
+
+            return await inflight.do_async(
+                flight_key(model, prompt), call,
+                timeout=remaining_budget(), default="I'm not sure how to answer that right now.",
             )
+
+        async def generate_response_stream(self, query: str, instruction: str):
+            """Yield answer text chunks as Gemini streams them."""
+            if not self.model or deadline_expired():
+                # Not configured / out of budget: same single message as generate_response
+                yield self.generate_response(query, instruction)
+                return
+
+            model = self.model
+            prompt = self._build_prompt(query, instruction)
+            produced = False
+            # No retry or single-flight here: each client needs its own stream, and a
+            # partially sent answer cannot be retried
+            chunks = iterate_blocking(model.generate_content, prompt, stream=True, **request_options())
             try:
-                response = retry(lambda: self.model.generate_content(prompt))
-                text = getattr(response, "text", "")
-                return text.strip() or "I'm not sure how to answer that right now."
+                while True:
+                    try:
+                        chunk = await asyncio.wait_for(chunks.__anext__(), remaining_budget())
+                    except StopAsyncIteration:
+                        break
+                    try:
+                        text = chunk.text
+                    except Exception:
+                        # Chunks without text parts (e.g. safety metadata) raise on .text
+                        text = ""
+                    if text:
+                        produced = True
+                        yield text
+            except asyncio.TimeoutError as exc:
+                logger.warning("Knowledge agent: request time budget spent while streaming.")
+                if produced:
+                    # The caller must not mistake the partial text for a full answer
+                    raise StreamInterrupted("time budget spent mid-answer") from exc
             except Exception as exc:
-                logger.error(f"Gemini knowledge call failed: {exc}")
-                return "I'm not sure how to answer that right now."
+                message = self._call_failed(model, exc)
+                if produced:
+                    raise StreamInterrupted(str(exc)) from exc
+                produced = True
+                yield message
+            finally:
+                await chunks.aclose()
+            if not produced:
+                yield "I'm not sure how to answer that right now."
 
     llm = GeminiWrapper(resolved_key, GENAI_MODEL)
-    return KnowledgeAgent(llm, escalate_to_human)
+    vocabulary = os.getenv("EMERGENCY_KEYWORDS_PATH")
+    matcher = load_matcher(vocabulary) if vocabulary else None
+    cache_size = int(os.getenv("CHAT_CACHE_SIZE", "2048"))
+    cache = AnswerCache(
+        maxsize=cache_size,
+        ttl=float(os.getenv("CHAT_CACHE_TTL_SECONDS", "3600")),
+        similarity=float(os.getenv("CHAT_CACHE_SIMILARITY", "0")),
+    ) if cache_size > 0 else None
+    # Escalations are queued and delivered in the background so the chat reply never waits on the sink
+    callback = escalations.submit if escalations is not None else escalate_to_human
+    return KnowledgeAgent(llm, callback, emergency_matcher=matcher, cache=cache)
+
+
+def create_orchestrator(
+    escalations: Optional[EscalationQueue] = None,
+    outbox: Optional[Outbox] = None,
+) -> HealthcareOrchestrator:
+    api_key = os.getenv("GEMINI_API_KEY", "")
+    app_planner, app_executor = create_appointment_agents(api_key, outbox)
+    rec_planner, rec_executor = create_medical_agents(api_key)
+    ins_planner, ins_executor = create_insurance_agents(api_key)
+    knowledge = create_knowledge_agent(api_key, escalations)
+
+    return HealthcareOrchestrator(
+        appointment_agents=(app_planner, app_executor),
+        record_agents=(rec_planner, rec_executor),
+        insurance_agents=(ins_planner, ins_executor),
+        knowledge_agent=knowledge,
+        load_skeleton_records=load_skeleton_records,
+        load_full_records=load_full_records,
+        load_calendar_defaults=load_calendar_defaults,
+        request_budget=float(os.getenv("REQUEST_BUDGET_SECONDS", "20")),
+        intake_timeout=float(os.getenv("INTAKE_BRANCH_TIMEOUT_SECONDS", "15")),
+        reservations=ReservationLedger(
+            ttl_seconds=float(os.getenv("APPOINTMENT_HOLD_TTL_SECONDS", "600")),
+            padding=timedelta(minutes=int(os.getenv("APPOINTMENT_PADDING_MINUTES", "15"))),
+        ),
+    )
 
 
 # ---------- FastAPI App ----------
 
-app = FastAPI(title="Clinix API", version="0.1.0")
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # Agents are built when the server starts, not at import, so importing this
+    # module stays cheap; Gemini, ics and pytz load on first use
+    app.state.escalations = create_escalation_queue()
+    app.state.escalations.start()
+    outbox = create_outbox()
+    if outbox is not None:
+        outbox.start()
+    app.state.orchestrator = create_orchestrator(app.state.escalations, outbox)
+    QUEUE_DEPTH.set_function(app.state.escalations.depth, "escalations")
+    QUEUE_DEPTH.set_function(inflight.in_flight, "gemini_inflight")
+    QUEUE_DEPTH.set_function(log_queue_depth, "logging")
+    if outbox is not None:
+        QUEUE_DEPTH.set_function(outbox.depth, "appointment_outbox")
+    try:
+        yield
+    finally:
+        # Flush queued escalations; anything undelivered stays in the journal
+        await run_blocking(app.state.escalations.stop)
+        if outbox is not None:
+            # Unfinished outbox jobs stay in SQLite and run after the next start
+            await run_blocking(outbox.stop)
+
+
+app = FastAPI(title="Clinix API", version="0.1.0", lifespan=lifespan)
 
 # CORS
 allow_origins = os.getenv("CORS_ALLOW_ORIGINS")
@@ -214,59 +439,137 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=["X-Request-ID"],
 )
+app.add_middleware(RequestIdMiddleware)
 
 
 # Dependency: Orchestrator
-GEMINI_API_KEY = os.getenv("GEMINI_API_KEY", "")
-app_planner, app_executor = create_appointment_agents(GEMINI_API_KEY)
-rec_planner, rec_executor = create_medical_agents(GEMINI_API_KEY)
-ins_planner, ins_executor = create_insurance_agents(GEMINI_API_KEY)
-knowledge = create_knowledge_agent(GEMINI_API_KEY)
-
-orchestrator = HealthcareOrchestrator(
-    appointment_agents=(app_planner, app_executor),
-    record_agents=(rec_planner, rec_executor),
-    insurance_agents=(ins_planner, ins_executor),
-    knowledge_agent=knowledge,
-    load_skeleton_records=load_skeleton_records,
-    load_full_records=load_full_records,
-    load_calendar_defaults=load_calendar_defaults,
-)
+def get_orchestrator(request: Request) -> HealthcareOrchestrator:
+    return request.app.state.orchestrator
+
+
+def get_escalations(request: Request) -> EscalationQueue:
+    return request.app.state.escalations
 
 
 @app.post("/records")
-async def get_records(payload: RecordsRequest):
+async def get_records(payload: RecordsRequest, orchestrator: HealthcareOrchestrator = Depends(get_orchestrator)):
+    try:
+        return await orchestrator.handle_record_async(payload.model_dump())
+    except Exception as exc:
+        raise HTTPException(status_code=500, detail=str(exc))
+
+
+@app.post("/records/batch")
+async def get_records_batch(payload: RecordsBatchRequest, orchestrator: HealthcareOrchestrator = Depends(get_orchestrator)):
     try:
-        return orchestrator.handle_record(payload.model_dump())
+        return await orchestrator.handle_records_batch_async(payload.model_dump())
     except Exception as exc:
         raise HTTPException(status_code=500, detail=str(exc))
 
 
 @app.post("/insurance")
-async def post_insurance(payload: InsuranceRequest):
+async def post_insurance(payload: InsuranceRequest, orchestrator: HealthcareOrchestrator = Depends(get_orchestrator)):
     try:
-        return orchestrator.handle_insurance(payload.model_dump())
+        return await orchestrator.handle_insurance_async(payload.model_dump())
     except Exception as exc:
         raise HTTPException(status_code=500, detail=str(exc))
 
 
 @app.post("/appointments")
-async def post_appointment(payload: AppointmentRequest):
+async def post_appointment(payload: AppointmentRequest, orchestrator: HealthcareOrchestrator = Depends(get_orchestrator)):
     try:
-        return orchestrator.handle_appointment(payload.model_dump())
+        return await orchestrator.handle_appointment_async(payload.model_dump())
+    except Exception as exc:
+        raise HTTPException(status_code=500, detail=str(exc))
+
+
+@app.post("/appointments/batch")
+async def post_appointment_batch(payload: BatchAppointmentRequest, orchestrator: HealthcareOrchestrator = Depends(get_orchestrator)):
+    try:
+        return await orchestrator.handle_appointment_batch_async(payload.model_dump())
+    except Exception as exc:
+        raise HTTPException(status_code=500, detail=str(exc))
+
+
+@app.get("/appointments/outbox")
+async def appointment_outbox_stats(orchestrator: HealthcareOrchestrator = Depends(get_orchestrator)):
+    return await run_blocking(orchestrator.outbox_stats)
+
+
+@app.post("/appointments/holds/{hold_id}/confirm")
+async def confirm_appointment_hold(hold_id: str, orchestrator: HealthcareOrchestrator = Depends(get_orchestrator)):
+    hold = await run_blocking(orchestrator.confirm_hold, hold_id)
+    if hold is None:
+        raise HTTPException(status_code=404, detail="Hold not found or expired")
+    return hold
+
+
+@app.delete("/appointments/holds/{hold_id}")
+async def release_appointment_hold(hold_id: str, orchestrator: HealthcareOrchestrator = Depends(get_orchestrator)):
+    if not await run_blocking(orchestrator.release_hold, hold_id):
+        raise HTTPException(status_code=404, detail="Hold not found or expired")
+    return {"released": hold_id}
+
+
+@app.post("/intake")
+async def post_intake(payload: IntakeRequest, orchestrator: HealthcareOrchestrator = Depends(get_orchestrator)):
+    if payload.records is None and payload.insurance is None and payload.appointment is None:
+        raise HTTPException(status_code=422, detail="Intake needs at least one of records, insurance or appointment")
+    try:
+        return await orchestrator.handle_intake_async(payload.model_dump())
     except Exception as exc:
         raise HTTPException(status_code=500, detail=str(exc))
 
 
 @app.post("/chat")
-async def post_chat(payload: ChatRequest):
+async def post_chat(payload: ChatRequest, orchestrator: HealthcareOrchestrator = Depends(get_orchestrator)):
     try:
-        return orchestrator.handle_chat(payload.model_dump())
+        return await orchestrator.handle_chat_async(payload.model_dump())
     except Exception as exc:
         raise HTTPException(status_code=500, detail=str(exc))
 
 
+@app.get("/escalations/queue")
+async def escalation_queue_stats(escalations: EscalationQueue = Depends(get_escalations)):
+    return escalations.stats()
+
+
+@app.get("/chat/cache")
+async def chat_cache_stats(orchestrator: HealthcareOrchestrator = Depends(get_orchestrator)):
+    return orchestrator.chat_cache_stats()
+
+
+def _sse(event: str, data: dict) -> str:
+    return f"event: {event}\ndata: {json.dumps(data)}\n\n"
+
+
+@app.post("/chat/stream")
+async def post_chat_stream(payload: ChatRequest, orchestrator: HealthcareOrchestrator = Depends(get_orchestrator)):
+    async def events():
+        try:
+            async with aclosing(orchestrator.handle_chat_stream(payload.model_dump())) as stream:
+                async for event, data in stream:
+                    yield _sse(event, data)
+        except Exception as exc:
+            logger.error(f"Chat stream failed: {exc}")
+            yield _sse("error", {"detail": str(exc)})
+
+    return StreamingResponse(
+        events(),
+        media_type="text/event-stream",
+        # Keep proxies from buffering the stream
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+
+@app.get("/metrics")
+async def metrics():
+    # Rendering only reads counters; cheap enough to stay on the event loop
+    return Response(METRICS.render(), media_type=METRICS_CONTENT_TYPE)
+
+
 @app.get("/")
 async def health():
     return {"status": "ok"}
@@ -0,0 +1,111 @@
+"""Synthetic spreadsheets and calendars shaped like the files the API reads.
+
+Rows follow ``backend/utils/MedicalRecord*Spreadsheet - Sheet1.csv`` (``ID``,
+``Fields``, ...) and events follow
+``backend/resources/AppointmentSkeletonCalendar.ics``. Generation is seeded,
+and files are written once per (kind, size, seed) under ``CACHE_DIR`` and
+reused by later runs.
+"""
+import csv
+import random
+from datetime import datetime, timedelta, timezone
+from pathlib import Path
+from typing import Dict, List
+
+PROJECT_ROOT = Path(__file__).resolve().parents[2]
+CACHE_DIR = PROJECT_ROOT / "backend" / ".cache" / "benchmarks"
+
+# Spellings used in the skeleton sheet; the planner folds them into canonical fields
+FIELDS = ("Lab", "Vaccine", "Prescription", "Exam", "Notes", "Imaging", "Allergy")
+_NAMES = ("Lina Rodgers", "Omar Haddad", "Mei Chen", "Ana Souza", "Tom Becker", "Priya Nair", "Kofi Mensah", "Ivy Novak")
+_INFO = (
+    "Test: Complete Blood Count (CBC)\nResult: WBC 6.2 x10^3/uL, Hemoglobin 13.5 g/dL",
+    "Vaccine: Influenza (2025-2026)\nLot: FL2025-118",
+    "Medication: Lisinopril 10 mg daily\nRefills: 2",
+    "Annual physical; vitals within normal limits",
+)
+
+
+def _fields(rng: random.Random) -> str:
+    # Most patients have one field, some two
+    picked = rng.sample(FIELDS, 2 if rng.random() < 0.2 else 1)
+    return ", ".join(picked)
+
+
+def skeleton_rows(n: int, seed: int = 0) -> List[Dict[str, str]]:
+    rng = random.Random(seed)
+    return [{"ID": str(i + 1), "Fields": _fields(rng)} for i in range(n)]
+
+
+def full_rows(n: int, seed: int = 0) -> List[Dict[str, str]]:
+    rng = random.Random(seed)
+    rows = []
+    for i in range(n):
+        visit = datetime(2025, 1, 1) + timedelta(days=rng.randrange(365))
+        rows.append({
+            "ID": str(i + 1),
+            "Fields": _fields(rng),
+            "Name": rng.choice(_NAMES),
+            "Date of Last Visit": visit.strftime("%m/%d/%Y"),
+            "Accessibility": rng.choice(("None", "Wheelchair", "Interpreter")),
+            "Info": rng.choice(_INFO),
+        })
+    return rows
+
+
+def write_csv(rows: List[Dict[str, str]], path: Path) -> Path:
+    path.parent.mkdir(parents=True, exist_ok=True)
+    tmp = path.with_suffix(".tmp")
+    with tmp.open("w", encoding="utf-8", newline="") as handle:
+        writer = csv.DictWriter(handle, fieldnames=list(rows[0]) if rows else ["ID", "Fields"])
+        writer.writeheader()
+        writer.writerows(rows)
+    tmp.replace(path)
+    return path
+
+
+def write_ics(n_events: int, path: Path, seed: int = 0, per_day: int = 6) -> Path:
+    """``n_events`` non-overlapping weekday events from 2025-01-01, ``per_day`` per clinic day (08:00-17:00 New York)."""
+    rng = random.Random(seed)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    lines = ["BEGIN:VCALENDAR", "VERSION:2.0", "PRODID:-//Clinix//Benchmark Calendar//EN"]
+    day = datetime(2025, 1, 1, 13, 0, tzinfo=timezone.utc)
+    made = 0
+    while made < n_events:
+        if day.weekday() < 5:
+            # Nine clinic hours split into per_day slots; each event fills part of its slot
+            slot = timedelta(hours=9) / per_day
+            for k in range(min(per_day, n_events - made)):
+                start = day + slot * k + timedelta(minutes=rng.choice((0, 15, 30)))
+                end = start + timedelta(minutes=rng.choice((15, 30, 45)))
+                lines += [
+                    "BEGIN:VEVENT",
+                    f"UID:{made + 1}@bench.example.com",
+                    "DTSTAMP:20250101T090000Z",
+                    f"DTSTART:{start:%Y%m%dT%H%M%SZ}",
+                    f"DTEND:{end:%Y%m%dT%H%M%SZ}",
+                    f"SUMMARY:Busy {made + 1}",
+                    "END:VEVENT",
+                ]
+                made += 1
+        day += timedelta(days=1)
+    lines.append("END:VCALENDAR")
+    tmp = path.with_suffix(".tmp")
+    tmp.write_text("\r\n".join(lines) + "\r\n", encoding="utf-8")
+    tmp.replace(path)
+    return path
+
+
+def skeleton_csv(n: int, seed: int = 0) -> Path:
+    path = CACHE_DIR / f"skeleton_{n}_{seed}.csv"
+    return path if path.is_file() else write_csv(skeleton_rows(n, seed), path)
+
+
+def full_csv(n: int, seed: int = 0) -> Path:
+    path = CACHE_DIR / f"full_{n}_{seed}.csv"
+    return path if path.is_file() else write_csv(full_rows(n, seed), path)
+
+
+def calendar_ics(n_events: int, seed: int = 0) -> Path:
+    path = CACHE_DIR / f"calendar_{n_events}_{seed}.ics"
+    return path if path.is_file() else write_ics(n_events, path, seed)
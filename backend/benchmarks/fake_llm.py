@@ -0,0 +1,117 @@
+"""Gemini stand-in for offline benchmarks.
+
+``FakeLLM`` implements the part of the google-generativeai model API the
+agents call: ``generate_content(prompt, stream=False, **kwargs)`` returning an
+object with ``.text`` (an iterator of such chunks when streaming) and a
+``model_name``. Latency, error rate and malformed-JSON rate are configurable
+and seeded. Replies are picked from the prompt, so each planner gets a
+well-formed answer of the shape it asked for.
+"""
+import json
+import random
+import re
+import threading
+import time
+from typing import Any, Dict, Iterator, NamedTuple, Optional, Tuple
+
+_QUERY = re.compile(r'For the query: "(.*?)"', re.S)
+_CANDIDATES = re.compile(r"are all available: (\[.*?\])\n", re.S)
+
+CHAT_ANSWER = "Drink plenty of water and rest. If it does not improve in a few days, book a visit with your clinician."
+
+
+class FakeResponse(NamedTuple):
+    text: str
+
+
+class FakeLLMError(RuntimeError):
+    """Injected API failure; retry() handles it like any other client error."""
+
+
+class FakeLLM:
+    def __init__(
+        self,
+        latency: float = 0.3,
+        jitter: float = 0.1,
+        error_rate: float = 0.0,
+        malformed_rate: float = 0.0,
+        stream_chunks: int = 8,
+        seed: Optional[int] = None,
+        model_name: str = "fake-gemini",
+    ):
+        self.latency = latency
+        self.jitter = jitter
+        self.error_rate = error_rate
+        self.malformed_rate = malformed_rate
+        self.stream_chunks = max(1, stream_chunks)
+        self.model_name = model_name
+        self._rng = random.Random(seed)
+        self._lock = threading.Lock()
+        self.calls = 0
+        self.errors = 0
+        self.malformed = 0
+
+    def _draw(self, wants_json: bool) -> Tuple[float, bool, bool]:
+        with self._lock:
+            self.calls += 1
+            delay = max(0.0, self._rng.gauss(self.latency, self.jitter)) if self.jitter else self.latency
+            fail = self._rng.random() < self.error_rate
+            bad = wants_json and not fail and self._rng.random() < self.malformed_rate
+            self.errors += fail
+            self.malformed += bad
+        return delay, fail, bad
+
+    def generate_content(self, prompt: str, stream: bool = False, **kwargs: Any):
+        wants_json = "valid JSON" in prompt
+        delay, fail, bad = self._draw(wants_json)
+        text = self.answer(prompt)
+        if bad:
+            # Truncated mid-object, the usual shape of a broken model reply
+            text = "Here is the JSON you asked for: " + text[: len(text) // 2]
+        if stream:
+            return self._stream(text, delay, fail)
+        time.sleep(delay)
+        if fail:
+            raise FakeLLMError("injected Gemini failure")
+        return FakeResponse(text)
+
+    def _stream(self, text: str, delay: float, fail: bool) -> Iterator[FakeResponse]:
+        size = max(1, -(-len(text) // self.stream_chunks))
+        pieces = [text[i:i + size] for i in range(0, len(text), size)]
+        for i, piece in enumerate(pieces):
+            time.sleep(delay / len(pieces))
+            if fail and i == len(pieces) // 2:
+                raise FakeLLMError("injected Gemini failure mid-stream")
+            yield FakeResponse(piece)
+
+    @staticmethod
+    def answer(prompt: str) -> str:
+        if "medical records planner" in prompt:
+            # Imported here so loading this module does not set up agent loggers early
+            from backend.agents.medical_record_planner_agent import detect_field
+
+            query = _QUERY.search(prompt)
+            field = detect_field(query.group(1) if query else "") or "Labs"
+            return json.dumps({"patient_id": None, "patient_ids": "all", "field": field})
+        if "insurance researcher" in prompt:
+            return json.dumps({"deductable": "$750", "co-pay": "$30", "co-insurance": "20%", "out-of-pocket maximum": "$4000"})
+        if "scheduling assistant" in prompt:
+            candidates = _CANDIDATES.search(prompt)
+            if candidates:
+                return json.dumps(json.loads(candidates.group(1))[0])
+            # Free-form planning: a plausible slot, which the planner validates
+            return json.dumps({"date": "2025-01-02", "start_time": "09:00", "end_time": "10:30"})
+        return CHAT_ANSWER
+
+    def stats(self) -> Dict[str, int]:
+        with self._lock:
+            return {"calls": self.calls, "errors": self.errors, "malformed": self.malformed}
+
+
+def install_fake_llm(orchestrator, llm: FakeLLM) -> None:
+    """Point every agent of ``orchestrator`` at ``llm`` instead of the Gemini registry."""
+    for planner in (orchestrator.rec_planner, orchestrator.ins_planner, orchestrator.app_planner):
+        if planner is not None:
+            planner.model = llm
+    if orchestrator.knowledge is not None:
+        orchestrator.knowledge.llm_model.model = llm
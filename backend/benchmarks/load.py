@@ -0,0 +1,389 @@
+"""End-to-end load generator for the API, with a fake Gemini.
+
+Drives the FastAPI app in-process over ASGI, lifespan included: no server,
+no network and no API key. Every agent is pointed at ``FakeLLM``. Its
+latency, error rate and malformed-JSON rate are configurable, so p50/p99
+latency and throughput can be compared across changes.
+
+By default ``--concurrency`` workers send requests back to back (closed loop).
+With ``--rate``, requests start on a fixed schedule instead (open loop), and
+latency is counted from the scheduled start, so queueing delay is included
+when the app falls behind.
+
+Appointment holds (from /appointments and /intake) are released after each
+booking so a long run does not use up the planning horizon. ``--keep-holds``
+confirms them instead, and the run then checks that no two kept bookings
+overlap and that the reservation ledger still has every one of them; the
+exit status is 1 if either fails.
+
+Usage (from the repo root):
+    python -m backend.benchmarks.load --duration 30 --concurrency 32
+    python -m backend.benchmarks.load --rate 200 --latency 0.4 --error-rate 0.02 --malformed-rate 0.05
+    python -m backend.benchmarks.load --mix records=1 --rows 100000 --json > records.json
+    python -m backend.benchmarks.load --mix appointments=1 --keep-holds --duration 60
+"""
+import argparse
+import asyncio
+import json
+import os
+import random
+import re
+import sys
+import tempfile
+import time
+from datetime import datetime
+from typing import Any, Dict, List, Optional, Tuple
+
+from backend.benchmarks import datasets
+from backend.benchmarks.fake_llm import FakeLLM, install_fake_llm
+from backend.benchmarks.timing import format_seconds, summarize
+
+DEFAULT_MIX = "records=4,insurance=2,appointments=2,chat=3,chat_stream=1"
+
+_QUERIES = (
+    "Find all the IDs that require Lab",
+    "Which patients need vaccines?",
+    "List patients with prescriptions",
+    "Who is due for an exam?",
+    "Show imaging for every patient",
+)
+_PROVIDERS = ("AdventHealth Orlando", "Mayo Clinic", "Cleveland Clinic", "UCLA Health", "Mass General")
+_COMPANIES = ("Aetna", "Cigna", "UnitedHealthcare", "Humana", "Blue Cross")
+_PLANS = ("Open Choice PPO", "Select HMO", "Choice Plus EPO", "Gold POS", "Silver HDHP", "Bronze PPO")
+_QUESTIONS = (
+    "How much water should I drink a day?",
+    "What helps with a mild headache?",
+    "Is it normal to feel tired after a flu shot?",
+    "How can I sleep better?",
+    "What should I eat before a blood test?",
+    "I have chest pain and shortness of breath",
+)
+
+
+def _parse_mix(raw: str) -> Dict[str, float]:
+    mix = {}
+    for item in raw.split(","):
+        name, _, weight = item.partition("=")
+        if name.strip():
+            mix[name.strip()] = float(weight or 1)
+    unknown = set(mix) - set(SCENARIOS)
+    if unknown:
+        raise argparse.ArgumentTypeError(f"unknown scenario(s) {sorted(unknown)}; choose from {sorted(SCENARIOS)}")
+    return mix
+
+
+def _records(rng: random.Random) -> Tuple[str, str, Optional[dict]]:
+    return "POST", "/records", {"query": rng.choice(_QUERIES), "offset": rng.choice((0, 0, 0, 100)), "limit": 50}
+
+
+def _insurance(rng: random.Random) -> Tuple[str, str, Optional[dict]]:
+    return "POST", "/insurance", {"provider": rng.choice(_PROVIDERS), "company": rng.choice(_COMPANIES), "plan": rng.choice(_PLANS)}
+
+
+def _appointments(rng: random.Random) -> Tuple[str, str, Optional[dict]]:
+    n = rng.randrange(10000)
+    return "POST", "/appointments", {"patientName": f"Patient {n}", "patientEmail": f"p{n}@example.com", "count": rng.choice((1, 3))}
+
+
+def _chat(rng: random.Random) -> Tuple[str, str, Optional[dict]]:
+    return "POST", "/chat", {"message": rng.choice(_QUESTIONS)}
+
+
+def _chat_stream(rng: random.Random) -> Tuple[str, str, Optional[dict]]:
+    return "POST", "/chat/stream", {"message": rng.choice(_QUESTIONS)}
+
+
+def _intake(rng: random.Random) -> Tuple[str, str, Optional[dict]]:
+    return "POST", "/intake", {
+        "records": _records(rng)[2],
+        "insurance": _insurance(rng)[2],
+        "appointment": _appointments(rng)[2],
+    }
+
+
+SCENARIOS = {
+    "records": _records,
+    "insurance": _insurance,
+    "appointments": _appointments,
+    "chat": _chat,
+    "chat_stream": _chat_stream,
+    "intake": _intake,
+}
+
+
+async def asgi_request(app, method: str, path: str, payload: Optional[dict] = None) -> Tuple[int, bytes]:
+    """One HTTP request straight into an ASGI app; returns (status, body)."""
+    body = json.dumps(payload).encode() if payload is not None else b""
+    scope = {
+        "type": "http",
+        "asgi": {"version": "3.0"},
+        "http_version": "1.1",
+        "method": method,
+        "scheme": "http",
+        "path": path,
+        "raw_path": path.encode(),
+        "query_string": b"",
+        "root_path": "",
+        "headers": [(b"host", b"bench"), (b"content-type", b"application/json"), (b"content-length", str(len(body)).encode())],
+        "client": ("127.0.0.1", 0),
+        "server": ("bench", 80),
+    }
+    finished = asyncio.Event()
+    received = False
+    status = 0
+    chunks: List[bytes] = []
+
+    async def receive():
+        nonlocal received
+        if not received:
+            received = True
+            return {"type": "http.request", "body": body, "more_body": False}
+        # Streaming responses listen for a disconnect; only send one once the response is done
+        await finished.wait()
+        return {"type": "http.disconnect"}
+
+    async def send(message):
+        nonlocal status
+        if message["type"] == "http.response.start":
+            status = message["status"]
+        elif message["type"] == "http.response.body":
+            chunks.append(message.get("body", b""))
+            if not message.get("more_body"):
+                finished.set()
+
+    try:
+        await app(scope, receive, send)
+    finally:
+        finished.set()
+    return status, b"".join(chunks)
+
+
+class _Recorder:
+    def __init__(self, keep_holds: bool = False):
+        self.latencies: Dict[str, List[float]] = {}
+        self.errors: Dict[str, int] = {}
+        self.keep_holds = keep_holds
+        # Confirmed holds of a --keep-holds run, checked for double bookings at the end
+        self.kept: List[dict] = []
+
+    def record(self, scenario: str, seconds: float, ok: bool) -> None:
+        self.latencies.setdefault(scenario, []).append(seconds)
+        if not ok:
+            self.errors[scenario] = self.errors.get(scenario, 0) + 1
+
+
+async def _send(app, scenario: str, rng: random.Random, recorder: _Recorder, started: float) -> None:
+    method, path, payload = SCENARIOS[scenario](rng)
+    try:
+        status, body = await asgi_request(app, method, path, payload)
+        ok = status < 400 and (scenario != "chat_stream" or b"event: error" not in body)
+    except Exception:
+        status, body, ok = 0, b"", False
+    recorder.record(scenario, time.perf_counter() - started, ok)
+    if scenario in ("appointments", "intake") and ok:
+        booked = json.loads(body) if body else {}
+        booked = booked.get("appointment") or {} if scenario == "intake" else booked
+        hold = booked.get("plan", {}).get("hold")
+        if isinstance(hold, dict) and hold.get("hold_id"):
+            await _settle(app, hold, recorder)
+
+
+async def _settle(app, hold: dict, recorder: _Recorder) -> None:
+    if not recorder.keep_holds:
+        # Release the hold so a long run does not exhaust the planning horizon
+        await asgi_request(app, "DELETE", f"/appointments/holds/{hold['hold_id']}")
+        return
+    status, _ = await asgi_request(app, "POST", f"/appointments/holds/{hold['hold_id']}/confirm")
+    if status < 400:
+        recorder.kept.append(hold)
+
+
+def _check_bookings(kept: List[dict], ledger) -> Dict[str, int]:
+    """Kept bookings that overlap their neighbour in time, or that the ledger no longer has."""
+    slots = sorted((datetime.fromisoformat(h["start"]), datetime.fromisoformat(h["end"])) for h in kept)
+    overlapping = sum(1 for (_, end), (start, _) in zip(slots, slots[1:]) if start < end)
+    lost = sum(1 for h in kept if ledger is None or ledger.get(h["hold_id"]) is None)
+    return {"kept": len(kept), "overlapping": overlapping, "lost": lost}
+
+
+async def _closed_loop(app, mix: Dict[str, float], duration: float, concurrency: int, rng: random.Random, recorder: _Recorder) -> None:
+    names, weights = list(mix), list(mix.values())
+    stop_at = time.perf_counter() + duration
+
+    async def worker(seed: int) -> None:
+        local = random.Random(seed)
+        while time.perf_counter() < stop_at:
+            await _send(app, local.choices(names, weights)[0], local, recorder, time.perf_counter())
+
+    await asyncio.gather(*(worker(rng.randrange(1 << 30)) for _ in range(concurrency)))
+
+
+async def _open_loop(app, mix: Dict[str, float], duration: float, rate: float, concurrency: int, rng: random.Random, recorder: _Recorder) -> None:
+    names, weights = list(mix), list(mix.values())
+    # Cap on requests in flight so an overloaded app cannot exhaust memory
+    slots = asyncio.Semaphore(max(concurrency, 1))
+    tasks = []
+    start = time.perf_counter()
+    i = 0
+    while True:
+        scheduled = start + i / rate
+        if scheduled - start >= duration:
+            break
+        delay = scheduled - time.perf_counter()
+        if delay > 0:
+            await asyncio.sleep(delay)
+        await slots.acquire()
+
+        async def one(scenario: str, local: random.Random, at: float) -> None:
+            try:
+                await _send(app, scenario, local, recorder, at)
+            finally:
+                slots.release()
+
+        tasks.append(asyncio.ensure_future(one(rng.choices(names, weights)[0], random.Random(rng.randrange(1 << 30)), scheduled)))
+        i += 1
+    await asyncio.gather(*tasks)
+
+
+_LLM_CALLS = re.compile(r'^clinix_llm_calls_total\{agent="[^"]*",outcome="([^"]+)"\} (\S+)$', re.M)
+
+
+def _llm_outcomes(metrics_text: str) -> Dict[str, int]:
+    totals: Dict[str, int] = {}
+    for outcome, value in _LLM_CALLS.findall(metrics_text):
+        totals[outcome] = totals.get(outcome, 0) + int(float(value))
+    return totals
+
+
+def _configure(rows: Optional[int], events: Optional[int], workdir: str) -> None:
+    # Read by backend.api.main when the lifespan builds the agents
+    if rows:
+        os.environ["SKELETON_SPREADSHEET_PATH"] = str(datasets.skeleton_csv(rows))
+        os.environ["FULL_SPREADSHEET_PATH"] = str(datasets.full_csv(rows))
+    if events:
+        os.environ["APPOINTMENT_SKELETON_ICS"] = str(datasets.calendar_ics(events))
+    # Nothing persisted between runs, so every run starts cold
+    os.environ["INSURANCE_CACHE_PATH"] = ""
+    os.environ["ESCALATION_JOURNAL_PATH"] = ""
+    os.environ["APPOINTMENT_OUTBOX_PATH"] = os.path.join(workdir, "outbox.sqlite3")
+    os.environ.setdefault("LOG_LEVEL", "WARNING")
+
+
+async def run_async(
+    mix: Dict[str, float],
+    duration: float = 10.0,
+    concurrency: int = 16,
+    rate: Optional[float] = None,
+    llm: Optional[FakeLLM] = None,
+    rows: Optional[int] = None,
+    events: Optional[int] = None,
+    seed: int = 0,
+    keep_holds: bool = False,
+) -> dict:
+    llm = llm or FakeLLM(seed=seed)
+    with tempfile.TemporaryDirectory(prefix="clinix-load-") as workdir:
+        _configure(rows, events, workdir)
+        from backend.api.main import app
+
+        async with app.router.lifespan_context(app):
+            install_fake_llm(app.state.orchestrator, llm)
+            rng = random.Random(seed)
+            recorder = _Recorder(keep_holds)
+            started = time.perf_counter()
+            if rate:
+                await _open_loop(app, mix, duration, rate, concurrency, rng, recorder)
+            else:
+                await _closed_loop(app, mix, duration, concurrency, rng, recorder)
+            elapsed = time.perf_counter() - started
+            _, metrics_text = await asgi_request(app, "GET", "/metrics")
+            bookings = _check_bookings(recorder.kept, app.state.orchestrator.reservations) if keep_holds else None
+
+    total = sum(len(v) for v in recorder.latencies.values())
+    errors = sum(recorder.errors.values())
+    result = {
+        "python": sys.version.split()[0],
+        "mode": f"open loop at {rate}/s" if rate else f"closed loop, {concurrency} workers",
+        "duration_seconds": elapsed,
+        "requests": total,
+        "throughput_rps": total / elapsed if elapsed else 0.0,
+        "error_rate": errors / total if total else 0.0,
+        "fake_llm": {
+            "latency": llm.latency, "jitter": llm.jitter,
+            "error_rate": llm.error_rate, "malformed_rate": llm.malformed_rate,
+            **llm.stats(),
+        },
+        "llm_outcomes": _llm_outcomes(metrics_text.decode()),
+        "overall": summarize([s for v in recorder.latencies.values() for s in v]),
+        "scenarios": {
+            name: {**summarize(samples), "errors": recorder.errors.get(name, 0)}
+            for name, samples in sorted(recorder.latencies.items())
+        },
+    }
+    if bookings is not None:
+        result["bookings"] = bookings
+    return result
+
+
+def run(mix: Dict[str, float], **kwargs: Any) -> dict:
+    return asyncio.run(run_async(mix, **kwargs))
+
+
+def _print_report(result: dict) -> None:
+    llm = result["fake_llm"]
+    print(f"Python {result['python']}, {result['mode']}, {result['duration_seconds']:.1f}s")
+    print(
+        f"fake LLM: latency {llm['latency']}s ±{llm['jitter']}, error rate {llm['error_rate']}, "
+        f"malformed rate {llm['malformed_rate']} ({llm['calls']} calls)"
+    )
+    print(f"LLM outcomes: {result['llm_outcomes']}")
+    print(f"{result['requests']} requests, {result['throughput_rps']:.1f} req/s, error rate {result['error_rate']:.2%}")
+    if "bookings" in result:
+        b = result["bookings"]
+        print(f"bookings kept: {b['kept']}, overlapping: {b['overlapping']}, missing from ledger: {b['lost']}")
+    print(f"{'scenario':<14}{'n':>7}{'err':>6}{'p50':>11}{'p90':>11}{'p99':>11}{'max':>11}")
+    rows = [("overall", {**result["overall"], "errors": round(result["error_rate"] * result["requests"])})]
+    rows += list(result["scenarios"].items())
+    for name, row in rows:
+        if not row.get("count"):
+            continue
+        print(
+            f"{name:<14}{row['count']:>7}{row['errors']:>6}"
+            + "".join(f"{format_seconds(row[k]):>11}" for k in ("p50", "p90", "p99", "max"))
+        )
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--duration", type=float, default=10.0, help="Seconds to generate load")
+    parser.add_argument("--concurrency", type=int, default=16, help="Closed-loop workers, or max in flight with --rate")
+    parser.add_argument("--rate", type=float, default=None, help="Open loop: requests started per second")
+    parser.add_argument("--mix", type=_parse_mix, default=_parse_mix(DEFAULT_MIX), help=f"Scenario weights (default {DEFAULT_MIX})")
+    parser.add_argument("--latency", type=float, default=0.3, help="Fake LLM mean latency in seconds")
+    parser.add_argument("--jitter", type=float, default=0.1, help="Fake LLM latency standard deviation")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="Fraction of fake LLM calls that raise")
+    parser.add_argument("--malformed-rate", type=float, default=0.0, help="Fraction of JSON replies that are not valid JSON")
+    parser.add_argument("--rows", type=int, default=None, help="Use a synthetic records sheet with this many rows")
+    parser.add_argument("--events", type=int, default=None, help="Use a synthetic calendar with this many events")
+    parser.add_argument("--keep-holds", action="store_true", help="Confirm appointment holds instead of releasing them, then check for double bookings")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--json", action="store_true", help="Print the result as JSON")
+    args = parser.parse_args(argv)
+
+    llm = FakeLLM(
+        latency=args.latency, jitter=args.jitter,
+        error_rate=args.error_rate, malformed_rate=args.malformed_rate, seed=args.seed,
+    )
+    result = run(
+        args.mix, duration=args.duration, concurrency=args.concurrency, rate=args.rate,
+        llm=llm, rows=args.rows, events=args.events, seed=args.seed, keep_holds=args.keep_holds,
+    )
+    if args.json:
+        print(json.dumps(result, indent=2))
+    else:
+        _print_report(result)
+    bookings = result.get("bookings")
+    return 1 if bookings and (bookings["overlapping"] or bookings["lost"]) else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
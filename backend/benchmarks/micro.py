@@ -0,0 +1,160 @@
+"""Micro-benchmarks for request-path building blocks on synthetic data.
+
+Cases, each timed per call on datasets of every requested size:
+
+- ``load_sheet_records``: parse the full-records CSV
+- ``fetch_record.cold`` / ``fetch_record``: ``MedicalExecutorAgent.fetch_record``
+  on a fresh snapshot (builds the patient ID index) and on a warm one
+- ``fetch_record.mapped``: the same lookup against ``MappedRecords`` (the
+  sidecar index is built once beforehand)
+- ``records.fallback.cold`` / ``records.fallback``: the records planner
+  fallback, with and without building the field index
+- ``records.prompt``: the compact skeleton embedded in the Gemini prompt
+- ``insurance.fallback``: the insurance planner fallback (size independent)
+- ``appointment.plan.cold`` / ``appointment.plan``: ``plan_slot``'s
+  deterministic solver with the calendar parsed from scratch and cached
+
+Datasets are generated once under backend/.cache/benchmarks. The default sizes
+keep a run to about a minute; ``--rows 1000000`` needs a few GB of memory and
+``--events 100000`` spends minutes in the ICS parser on the cold case.
+
+Usage (from the repo root):
+    python -m backend.benchmarks.micro
+    python -m backend.benchmarks.micro --rows 10,1000,100000,1000000 --events 10,1000,100000 --json > micro.json
+"""
+import argparse
+import json
+import os
+import sys
+from typing import Any, Callable, Dict, List, Optional
+
+from backend.benchmarks import datasets
+from backend.benchmarks.timing import format_seconds, sample, summarize
+
+DEFAULT_ROWS = (10, 1000, 100000)
+DEFAULT_EVENTS = (10, 1000, 10000)
+
+RECORD_QUERY = "Find all the IDs that require Lab"
+
+
+def _sizes(raw: str) -> List[int]:
+    return [int(part) for part in raw.split(",") if part.strip()]
+
+
+def record_cases(rows: int, repeat: int, max_seconds: float) -> List[Dict[str, Any]]:
+    from backend.agents.medical_record_executer_agent import MedicalExecutorAgent
+    from backend.agents.medical_record_planner_agent import MedicalPlannerAgent, compact_skeleton
+    from backend.utils.google import load_sheet_records
+    from backend.utils.record_store import MappedRecords
+    from backend.utils.records import RecordSnapshot
+
+    full_path = str(datasets.full_csv(rows))
+    skeleton_path = str(datasets.skeleton_csv(rows))
+    full = RecordSnapshot(load_sheet_records(full_path))
+    mapped = MappedRecords.open(full_path, index_dir=str(datasets.CACHE_DIR))
+    skeleton = RecordSnapshot(load_sheet_records(skeleton_path))
+    executor = MedicalExecutorAgent()
+    planner = MedicalPlannerAgent(api_key="")
+    # Last patient: the worst case for any scan
+    plan = {"patient_id": str(rows), "field": "Info"}
+
+    cases: Dict[str, List[float]] = {
+        "load_sheet_records": sample(lambda: load_sheet_records(full_path), repeat=min(repeat, 10), max_seconds=max_seconds),
+        "fetch_record.cold": sample(
+            lambda snapshot: executor.fetch_record(plan, snapshot),
+            setup=lambda: (RecordSnapshot(full),), warmup=0, repeat=min(repeat, 10), max_seconds=max_seconds,
+        ),
+        "fetch_record": sample(lambda: executor.fetch_record(plan, full), repeat=repeat, max_seconds=max_seconds),
+        "fetch_record.mapped": sample(lambda: executor.fetch_record(plan, mapped), repeat=repeat, max_seconds=max_seconds),
+        "records.fallback.cold": sample(
+            lambda snapshot: planner._fallback_plan(RECORD_QUERY, snapshot),
+            setup=lambda: (RecordSnapshot(skeleton),), warmup=0, repeat=min(repeat, 10), max_seconds=max_seconds,
+        ),
+        "records.fallback": sample(lambda: planner._fallback_plan(RECORD_QUERY, skeleton), repeat=repeat, max_seconds=max_seconds),
+        "records.prompt": sample(
+            lambda snapshot: compact_skeleton(snapshot, RECORD_QUERY, planner.prompt_budget),
+            setup=lambda: (RecordSnapshot(skeleton),), warmup=0, repeat=min(repeat, 10), max_seconds=max_seconds,
+        ),
+    }
+    return [{"case": name, "size": rows, **summarize(samples)} for name, samples in cases.items()]
+
+
+def insurance_cases(repeat: int, max_seconds: float) -> List[Dict[str, Any]]:
+    from backend.agents.insurance_planning_agent import InsurancePlannerAgent
+
+    insurance = InsurancePlannerAgent(api_key="")
+    samples = sample(
+        lambda: insurance._fallback_plan(["AdventHealth", "Aetna", "Open Choice PPO"], "General Consultation"),
+        repeat=repeat, max_seconds=max_seconds,
+    )
+    return [{"case": "insurance.fallback", "size": 1, **summarize(samples)}]
+
+
+def calendar_cases(events: int, repeat: int, max_seconds: float) -> List[Dict[str, Any]]:
+    from backend.agents import appointment_planning_agent as appointments
+
+    ics_path = str(datasets.calendar_ics(events))
+    planner = appointments.AppointmentPlannerAgent(api_key="", mode="deterministic")
+    args = (ics_path, 1.5, "America/New_York", ["12:00", "13:00"])
+
+    def cold() -> tuple:
+        # Parsed calendars and free/busy indexes are memoized per file version
+        appointments._parsed_events.cache_clear()
+        appointments._localized_calendar.cache_clear()
+        appointments._free_busy_index.cache_clear()
+        return ()
+
+    cases = {
+        "appointment.plan.cold": sample(lambda: planner.plan_slot(*args), setup=cold, warmup=0, repeat=min(repeat, 5), max_seconds=max_seconds),
+        "appointment.plan": sample(lambda: planner.plan_slot(*args), repeat=repeat, max_seconds=max_seconds),
+    }
+    return [{"case": name, "size": events, **summarize(samples)} for name, samples in cases.items()]
+
+
+def run(rows=DEFAULT_ROWS, events=DEFAULT_EVENTS, repeat: int = 50, max_seconds: float = 5.0,
+        progress: Optional[Callable[[str], None]] = None) -> dict:
+    results: List[Dict[str, Any]] = []
+    for size in rows:
+        if progress:
+            progress(f"records: {size} rows")
+        results.extend(record_cases(size, repeat, max_seconds))
+    results.extend(insurance_cases(repeat, max_seconds))
+    for size in events:
+        if progress:
+            progress(f"calendar: {size} events")
+        results.extend(calendar_cases(size, repeat, max_seconds))
+    return {"python": sys.version.split()[0], "repeat": repeat, "results": results}
+
+
+def _print_report(result: dict) -> None:
+    print(f"Python {result['python']}, up to {result['repeat']} samples per case")
+    print(f"{'case':<24}{'size':>10}{'n':>6}{'p50':>12}{'p99':>12}{'min':>12}")
+    for row in result["results"]:
+        print(
+            f"{row['case']:<24}{row['size']:>10}{row['count']:>6}"
+            f"{format_seconds(row['p50']):>12}{format_seconds(row['p99']):>12}{format_seconds(row['min']):>12}"
+        )
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--rows", type=_sizes, default=list(DEFAULT_ROWS), help="Comma-separated record counts")
+    parser.add_argument("--events", type=_sizes, default=list(DEFAULT_EVENTS), help="Comma-separated calendar event counts")
+    parser.add_argument("--repeat", type=int, default=50, help="Max samples per warm case (cold cases take fewer)")
+    parser.add_argument("--max-seconds", type=float, default=5.0, help="Time cap per case")
+    parser.add_argument("--json", action="store_true", help="Print the result as JSON")
+    args = parser.parse_args(argv)
+
+    # Fallback INFO lines would dominate the output and the timings
+    os.environ.setdefault("LOG_LEVEL", "WARNING")
+    result = run(args.rows, args.events, args.repeat, args.max_seconds,
+                 progress=lambda msg: print(msg, file=sys.stderr))
+    if args.json:
+        print(json.dumps(result, indent=2))
+    else:
+        _print_report(result)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
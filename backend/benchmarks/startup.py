@@ -0,0 +1,159 @@
+"""Cold-start benchmark for the API.
+
+Measures two things, each in fresh interpreters so runs are comparable:
+
+- import time of ``backend.api.main`` via ``python -X importtime``, with the
+  slowest modules by cumulative time
+- time from launching uvicorn to the first successful ``GET /`` healthcheck
+
+Usage (from the repo root):
+    python -m backend.benchmarks.startup --runs 5 --top 15
+    python -m backend.benchmarks.startup --json > startup.json
+"""
+import argparse
+import json
+import os
+import re
+import socket
+import statistics
+import subprocess
+import sys
+import time
+import urllib.request
+from pathlib import Path
+from typing import Dict, List, Optional, Tuple
+
+PROJECT_ROOT = Path(__file__).resolve().parents[2]
+APP = "backend.api.main:app"
+MODULE = "backend.api.main"
+
+# "import time: self [us] | cumulative | imported package"
+_IMPORTTIME_LINE = re.compile(r"^import time:\s+(\d+)\s+\|\s+(\d+)\s+\|(\s*)(\S+)")
+
+
+def _env() -> Dict[str, str]:
+    env = dict(os.environ)
+    env["PYTHONPATH"] = os.pathsep.join(filter(None, [str(PROJECT_ROOT), env.get("PYTHONPATH")]))
+    return env
+
+
+def parse_importtime(stderr: str) -> List[Tuple[str, int, int]]:
+    """(module, self_us, cumulative_us) for every line of ``-X importtime`` output."""
+    rows = []
+    for line in stderr.splitlines():
+        match = _IMPORTTIME_LINE.match(line)
+        if match:
+            rows.append((match.group(4), int(match.group(1)), int(match.group(2))))
+    return rows
+
+
+def measure_import(python: str = sys.executable) -> List[Tuple[str, int, int]]:
+    proc = subprocess.run(
+        [python, "-X", "importtime", "-c", f"import {MODULE}"],
+        cwd=PROJECT_ROOT, env=_env(), capture_output=True, text=True, check=False,
+    )
+    if proc.returncode != 0:
+        raise RuntimeError(f"import {MODULE} failed:\n{proc.stderr[-2000:]}")
+    return parse_importtime(proc.stderr)
+
+
+def _free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def measure_first_healthcheck(python: str = sys.executable, timeout: float = 60.0) -> float:
+    """Seconds from spawning uvicorn until ``GET /`` answers 200."""
+    port = _free_port()
+    url = f"http://127.0.0.1:{port}/"
+    started = time.perf_counter()
+    proc = subprocess.Popen(
+        [python, "-m", "uvicorn", APP, "--host", "127.0.0.1", "--port", str(port), "--log-level", "warning"],
+        cwd=PROJECT_ROOT, env=_env(), stdout=subprocess.DEVNULL, stderr=subprocess.PIPE, text=True,
+    )
+    try:
+        while time.perf_counter() - started < timeout:
+            if proc.poll() is not None:
+                raise RuntimeError(f"uvicorn exited with code {proc.returncode}:\n{proc.stderr.read()[-2000:]}")
+            try:
+                with urllib.request.urlopen(url, timeout=1) as resp:
+                    if resp.status == 200:
+                        return time.perf_counter() - started
+            except OSError:
+                time.sleep(0.01)
+        raise TimeoutError(f"no healthcheck response within {timeout}s")
+    finally:
+        proc.stderr.close()
+        proc.terminate()
+        try:
+            proc.wait(timeout=5)
+        except subprocess.TimeoutExpired:
+            proc.kill()
+
+
+def _summary(values: List[float]) -> Dict[str, float]:
+    return {
+        "median": statistics.median(values),
+        "min": min(values),
+        "max": max(values),
+    }
+
+
+def run(runs: int = 5, top: int = 15, healthcheck: bool = True) -> dict:
+    # One discarded run so .pyc compilation does not skew the first sample
+    measure_import()
+
+    totals: List[float] = []
+    cumulative: Dict[str, List[int]] = {}
+    for _ in range(runs):
+        rows = measure_import()
+        totals.append(next(cum for mod, _, cum in rows if mod == MODULE) / 1e6)
+        for mod, _, cum in rows:
+            cumulative.setdefault(mod, []).append(cum)
+
+    slowest = sorted(
+        ((mod, statistics.median(values) / 1e3) for mod, values in cumulative.items() if mod != MODULE),
+        key=lambda item: item[1], reverse=True,
+    )[:top]
+    result = {
+        "python": sys.version.split()[0],
+        "runs": runs,
+        "import_seconds": _summary(totals),
+        "slowest_imports_ms": [{"module": mod, "cumulative_ms": round(ms, 2)} for mod, ms in slowest],
+    }
+    if healthcheck:
+        result["first_healthcheck_seconds"] = _summary([measure_first_healthcheck() for _ in range(runs)])
+    return result
+
+
+def _print_report(result: dict) -> None:
+    imp = result["import_seconds"]
+    print(f"Python {result['python']}, {result['runs']} runs")
+    print(f"import {MODULE}: median {imp['median'] * 1e3:.1f} ms (min {imp['min'] * 1e3:.1f}, max {imp['max'] * 1e3:.1f})")
+    health = result.get("first_healthcheck_seconds")
+    if health:
+        print(f"first healthcheck: median {health['median'] * 1e3:.1f} ms (min {health['min'] * 1e3:.1f}, max {health['max'] * 1e3:.1f})")
+    print("slowest imports (cumulative, median):")
+    for row in result["slowest_imports_ms"]:
+        print(f"  {row['cumulative_ms']:9.2f} ms  {row['module']}")
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--top", type=int, default=15, help="Number of slowest modules to list")
+    parser.add_argument("--no-healthcheck", action="store_true", help="Only measure import time")
+    parser.add_argument("--json", action="store_true", help="Print the result as JSON")
+    args = parser.parse_args(argv)
+
+    result = run(runs=args.runs, top=args.top, healthcheck=not args.no_healthcheck)
+    if args.json:
+        print(json.dumps(result, indent=2))
+    else:
+        _print_report(result)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,64 @@
+"""Sample collection and percentile summaries shared by the benchmarks."""
+import math
+import time
+from typing import Any, Callable, Dict, List, Optional, Sequence
+
+
+def percentile(ordered: Sequence[float], q: float) -> float:
+    """Nearest-rank percentile of already sorted samples (q in 0..100)."""
+    if not ordered:
+        return math.nan
+    rank = max(1, math.ceil(q / 100 * len(ordered)))
+    return ordered[min(rank, len(ordered)) - 1]
+
+
+def summarize(samples: Sequence[float]) -> Dict[str, float]:
+    ordered = sorted(samples)
+    if not ordered:
+        return {"count": 0}
+    return {
+        "count": len(ordered),
+        "mean": sum(ordered) / len(ordered),
+        "min": ordered[0],
+        "p50": percentile(ordered, 50),
+        "p90": percentile(ordered, 90),
+        "p99": percentile(ordered, 99),
+        "max": ordered[-1],
+    }
+
+
+def sample(
+    func: Callable[..., Any],
+    setup: Optional[Callable[[], tuple]] = None,
+    repeat: int = 50,
+    max_seconds: float = 5.0,
+    warmup: int = 1,
+) -> List[float]:
+    """Seconds per call of ``func(*setup())``, ``repeat`` times or until ``max_seconds`` is spent.
+
+    ``setup`` runs untimed before every call, e.g. to hand each call a cold cache.
+    ``warmup`` calls run first and are not recorded, so lazily built indexes
+    do not land in a warm case's tail. At least one sample is always taken.
+    """
+    for _ in range(warmup):
+        func(*(setup() if setup is not None else ()))
+    samples: List[float] = []
+    budget_end = time.perf_counter() + max_seconds
+    while len(samples) < repeat:
+        args = setup() if setup is not None else ()
+        start = time.perf_counter()
+        func(*args)
+        samples.append(time.perf_counter() - start)
+        if time.perf_counter() >= budget_end:
+            break
+    return samples
+
+
+def format_seconds(value: float) -> str:
+    if math.isnan(value):
+        return "-"
+    if value < 1e-3:
+        return f"{value * 1e6:.1f}us"
+    if value < 1:
+        return f"{value * 1e3:.2f}ms"
+    return f"{value:.2f}s"
@@ -1,4 +1,9 @@
-from typing import Callable, Optional, Tuple, Dict, Any
+import asyncio
+import functools
+import inspect
+import time
+from contextlib import aclosing
+from typing import AsyncIterator, Callable, Optional, Tuple, Dict, Any, List
 
 from backend.agents.appointment_planning_agent import AppointmentPlannerAgent
 from backend.agents.appointment_executer_agent import AppointmentExecutorAgent
@@ -7,6 +12,53 @@ from backend.agents.medical_record_executer_agent import MedicalExecutorAgent
 from backend.agents.insurance_planning_agent import InsurancePlannerAgent
 from backend.agents.insurance_executer_agent import InsuranceExecutorAgent
 from backend.agents.knowledge_agent import KnowledgeAgent
+from backend.utils.concurrency import run_blocking
+from backend.utils.metrics import REQUEST_SECONDS, STAGE_SECONDS, timed
+from backend.utils.reservations import ReservationLedger
+from backend.utils.retry import deadline_scope
+from backend.utils.scheduling import format_slot
+
+
+def _budgeted(method):
+    """Run a handler inside one deadline scope sized by ``self.request_budget``, and time it."""
+    elapsed = REQUEST_SECONDS.labels(method.__name__)
+
+    if inspect.isasyncgenfunction(method):
+        @functools.wraps(method)
+        async def stream_wrapper(self, *args, **kwargs):
+            start = time.perf_counter()
+            try:
+                with deadline_scope(self.request_budget):
+                    async with aclosing(method(self, *args, **kwargs)) as events:
+                        async for event in events:
+                            yield event
+            finally:
+                elapsed.observe(time.perf_counter() - start)
+        return stream_wrapper
+
+    if inspect.iscoroutinefunction(method):
+        @timed(elapsed)
+        @functools.wraps(method)
+        async def async_wrapper(self, *args, **kwargs):
+            with deadline_scope(self.request_budget):
+                return await method(self, *args, **kwargs)
+        return async_wrapper
+
+    @timed(elapsed)
+    @functools.wraps(method)
+    def wrapper(self, *args, **kwargs):
+        with deadline_scope(self.request_budget):
+            return method(self, *args, **kwargs)
+    return wrapper
+
+
+_LOAD_SKELETON = STAGE_SECONDS.labels("records.load_skeleton")
+_LOAD_FULL = STAGE_SECONDS.labels("records.load_full")
+_LOAD_CALENDAR = STAGE_SECONDS.labels("appointment.load_calendar")
+
+# Intake branches stop waiting on Gemini this long before their hard timeout,
+# leaving time for the deterministic fallback
+INTAKE_FALLBACK_MARGIN = 0.5
 
 
 class HealthcareOrchestrator:
@@ -19,6 +71,9 @@ class HealthcareOrchestrator:
         load_skeleton_records: Optional[Callable[[], list]] = None,
         load_full_records: Optional[Callable[[], list]] = None,
         load_calendar_defaults: Optional[Callable[[], Tuple[str, float, str, list]]] = None,
+        request_budget: Optional[float] = None,
+        reservations: Optional[ReservationLedger] = None,
+        intake_timeout: Optional[float] = None,
     ):
         # Agents
         if appointment_agents:
@@ -44,39 +99,136 @@ class HealthcareOrchestrator:
 
         self.knowledge = knowledge_agent
 
-        # Data loaders (dependency injected)
-        self.load_skeleton_records = load_skeleton_records or (lambda: [])
-        self.load_full_records = load_full_records or (lambda: [])
-        self.load_calendar_defaults = load_calendar_defaults or (lambda: ("AppointmentSkeletonCalendar.ics", 1.0, "America/New_York", ["12:00", "13:00"]))
+        # Data loaders (dependency injected), timed as their own stages
+        self.load_skeleton_records = timed(_LOAD_SKELETON)(load_skeleton_records or (lambda: []))
+        self.load_full_records = timed(_LOAD_FULL)(load_full_records or (lambda: []))
+        self.load_calendar_defaults = timed(_LOAD_CALENDAR)(load_calendar_defaults or (lambda: ("AppointmentSkeletonCalendar.ics", 1.0, "America/New_York", ["12:00", "13:00"])))
+
+        # Seconds shared by every stage (loaders, LLM retries, executors) of one
+        # handle_* call; planners go straight to their fallback once it is spent.
+        self.request_budget = request_budget
+
+        # Shared slot holds so concurrent /appointments calls never get the same slot
+        self.reservations = reservations
+
+        # Seconds each branch of handle_intake_async may take
+        self.intake_timeout = intake_timeout
 
     # Records
+    @_budgeted
     def handle_record(self, payload: Dict[str, Any]) -> Dict[str, Any]:
         if not self.rec_planner:
             raise RuntimeError("Record planner not configured")
 
         query = payload.get("query", "")
         skeleton = self.load_skeleton_records()
-        plan = self.rec_planner.plan_request(query, skeleton)
+        plan = self.rec_planner.plan_request(query, skeleton, payload.get("offset", 0), payload.get("limit"))
 
         result: Dict[str, Any] = {}
         if self.rec_executor:
             full = self.load_full_records()
-            result = self.rec_executor.fetch_record(plan, full)
+            result = self._fetch_records(plan, full)
 
         return {"plan": plan, "result": result}
 
+    @_budgeted
+    async def handle_record_async(self, payload: Dict[str, Any]) -> Dict[str, Any]:
+        if not self.rec_planner:
+            raise RuntimeError("Record planner not configured")
+
+        query = payload.get("query", "")
+        skeleton = await run_blocking(self.load_skeleton_records)
+        plan = await self.rec_planner.plan_request_async(query, skeleton, payload.get("offset", 0), payload.get("limit"))
+
+        result: Dict[str, Any] = {}
+        if self.rec_executor:
+            full = await run_blocking(self.load_full_records)
+            result = self._fetch_records(plan, full)
+
+        return {"plan": plan, "result": result}
+
+    @_budgeted
+    def handle_records_batch(self, payload: Dict[str, Any]) -> Dict[str, Any]:
+        if not self.rec_planner:
+            raise RuntimeError("Record planner not configured")
+
+        lookups = self._record_lookups(payload)
+        skeleton = self.load_skeleton_records()
+        plans = self.rec_planner.plan_batch(lookups, skeleton)
+
+        results: List[Dict[str, Any]] = [{} for _ in plans]
+        if self.rec_executor:
+            results = self._fetch_records_batch(plans, self.load_full_records())
+        return self._batch_response(lookups, plans, results)
+
+    @_budgeted
+    async def handle_records_batch_async(self, payload: Dict[str, Any]) -> Dict[str, Any]:
+        if not self.rec_planner:
+            raise RuntimeError("Record planner not configured")
+
+        lookups = self._record_lookups(payload)
+        skeleton = await run_blocking(self.load_skeleton_records)
+        plans = await self.rec_planner.plan_batch_async(lookups, skeleton)
+
+        results: List[Dict[str, Any]] = [{} for _ in plans]
+        if self.rec_executor:
+            full = await run_blocking(self.load_full_records)
+            results = self._fetch_records_batch(plans, full)
+        return self._batch_response(lookups, plans, results)
+
+    @staticmethod
+    def _record_lookups(payload: Dict[str, Any]) -> List[Dict[str, Any]]:
+        # Items are /records payloads; bare strings are accepted as queries
+        return [q if isinstance(q, dict) else {"query": str(q)} for q in payload.get("queries") or []]
+
+    @staticmethod
+    def _batch_response(lookups: List[Dict[str, Any]], plans: List[Any], results: List[Dict[str, Any]]) -> Dict[str, Any]:
+        return {"results": [
+            {"query": lookup.get("query", ""), "plan": plan, "result": result}
+            for lookup, plan, result in zip(lookups, plans, results)
+        ]}
+
+    @timed(STAGE_SECONDS.labels("records.execute"))
+    def _fetch_records_batch(self, plans: List[Any], full: list) -> List[Dict[str, Any]]:
+        return self.rec_executor.fetch_plans(plans, full)
+
+    @timed(STAGE_SECONDS.labels("records.execute"))
+    def _fetch_records(self, plan: Dict[str, Any], full: list) -> Dict[str, Any]:
+        # Multi-patient plans resolve every matched ID in one indexed pass
+        ids = plan.get("patient_ids") if isinstance(plan, dict) else None
+        if isinstance(ids, list) and len(ids) > 1:
+            return {"records": self.rec_executor.fetch_records(ids, full, plan.get("field"))}
+        return self.rec_executor.fetch_record(plan, full)
+
     # Insurance
+    @_budgeted
     def handle_insurance(self, payload: Dict[str, Any]) -> Dict[str, Any]:
         if not self.ins_planner:
             raise RuntimeError("Insurance planner not configured")
 
+        insurance_info, service = self._insurance_args(payload)
+        plan = self.ins_planner.plan_request(insurance_info, service)
+        return self._insurance_result(plan)
+
+    @_budgeted
+    async def handle_insurance_async(self, payload: Dict[str, Any]) -> Dict[str, Any]:
+        if not self.ins_planner:
+            raise RuntimeError("Insurance planner not configured")
+
+        insurance_info, service = self._insurance_args(payload)
+        plan = await self.ins_planner.plan_request_async(insurance_info, service)
+        return self._insurance_result(plan)
+
+    @staticmethod
+    def _insurance_args(payload: Dict[str, Any]) -> Tuple[list, str]:
         provider = payload.get("provider", "")
         company = payload.get("company", payload.get("insurance_company", ""))
         plan_name = payload.get("plan", payload.get("plan_name", ""))
         service = payload.get("service", "General Consultation")
+        return [provider, company, plan_name], service
 
-        plan = self.ins_planner.plan_request([provider, company, plan_name], service)
-
+    @timed(STAGE_SECONDS.labels("insurance.execute"))
+    def _insurance_result(self, plan: Dict[str, Any]) -> Dict[str, Any]:
         # In this prototype, planner is authoritative; executor optional
         details = {}
         if self.ins_executor:
@@ -87,13 +239,117 @@ class HealthcareOrchestrator:
         return {"plan": plan, "details": details}
 
     # Appointments
+    @_budgeted
     def handle_appointment(self, payload: Dict[str, Any]) -> Dict[str, Any]:
         if not self.app_planner:
             raise RuntimeError("Appointment planner not configured")
 
         calendar_path, time_len, tz, lunch_window = self.load_calendar_defaults()
-        plan = self.app_planner.plan_slot(calendar_path, time_len, tz, lunch_window)
+        plan = self.app_planner.plan_slot(
+            calendar_path, time_len, tz, lunch_window,
+            count=payload.get("count", 1), after=payload.get("after"),
+            preferences=payload.get("preferences"),
+        )
+        plan = self._hold(plan, payload, (calendar_path, time_len, tz, lunch_window))
+        return {"plan": plan, "booking": self._book(payload, plan)}
+
+    @_budgeted
+    async def handle_appointment_async(self, payload: Dict[str, Any]) -> Dict[str, Any]:
+        if not self.app_planner:
+            raise RuntimeError("Appointment planner not configured")
+
+        calendar_path, time_len, tz, lunch_window = self.load_calendar_defaults()
+        plan = await self.app_planner.plan_slot_async(
+            calendar_path, time_len, tz, lunch_window,
+            count=payload.get("count", 1), after=payload.get("after"),
+            preferences=payload.get("preferences"),
+        )
+        plan = await run_blocking(self._hold, plan, payload, (calendar_path, time_len, tz, lunch_window))
+        return {"plan": plan, "booking": await self._book_async(payload, plan)}
+
+    @_budgeted
+    def handle_appointment_batch(self, payload: Dict[str, Any]) -> Dict[str, Any]:
+        if not self.app_planner:
+            raise RuntimeError("Appointment planner not configured")
+
+        patients = payload.get("patients") or []
+        plans = self._place_batch(patients, self.load_calendar_defaults(), payload.get("after"))
+        return {"appointments": [
+            {"patient": patient, "plan": plan, "booking": self._book(patient, plan)}
+            for patient, plan in zip(patients, plans)
+        ]}
+
+    @_budgeted
+    async def handle_appointment_batch_async(self, payload: Dict[str, Any]) -> Dict[str, Any]:
+        return await run_blocking(self.handle_appointment_batch, payload)
+
+    def confirm_hold(self, hold_id: str) -> Optional[Dict[str, Any]]:
+        hold = self.reservations.confirm(hold_id) if self.reservations else None
+        if hold is None:
+            return None
+        # Booking side effects were kept back until the patient confirmed
+        confirm_booking = getattr(self.app_executor, "confirm_booking", None)
+        if confirm_booking is not None:
+            confirm_booking(hold_id)
+        return hold.to_dict()
 
+    def release_hold(self, hold_id: str) -> bool:
+        cancel_booking = getattr(self.app_executor, "cancel_booking", None)
+        if cancel_booking is not None:
+            cancel_booking(hold_id)
+        return bool(self.reservations and self.reservations.release(hold_id))
+
+    @timed(STAGE_SECONDS.labels("appointment.hold"))
+    def _hold(self, plan: Dict[str, Any], payload: Dict[str, Any], calendar_args: tuple) -> Dict[str, Any]:
+        """Reserve the planned slot, or the next free one if another request already holds it."""
+        if self.reservations is None or not isinstance(plan, dict) or "error" in plan:
+            return plan
+
+        holder = payload.get("patientName", "Patient")
+        hold = None
+        proposed = self.app_planner.slot_bounds(plan, calendar_args[2])
+        if proposed is not None:
+            hold = self.reservations.try_reserve(proposed[0], proposed[1], holder)
+        if hold is None:
+            for start, end in self.app_planner.iter_slots(*calendar_args, after=payload.get("after")):
+                hold = self.reservations.try_reserve(start, end, holder)
+                if hold is not None:
+                    break
+        if hold is None:
+            return {"error": "No available slot found"}
+
+        held = {**plan, **format_slot(hold.start, hold.end), "hold": hold.to_dict()}
+        if held.get("alternatives"):
+            held["alternatives"] = [
+                alt for alt in held["alternatives"]
+                if (bounds := self.app_planner.slot_bounds(alt, calendar_args[2])) and self.reservations.is_free(*bounds)
+            ]
+        return held
+
+    @timed(STAGE_SECONDS.labels("appointment.batch_place"))
+    def _place_batch(self, patients: List[Dict[str, Any]], calendar_args: tuple, after=None) -> List[Dict[str, Any]]:
+        # One forward walk over the free/busy index places every patient in order
+        plans: List[Dict[str, Any]] = []
+        if patients:
+            for start, end in self.app_planner.iter_slots(*calendar_args, after=after):
+                patient = patients[len(plans)]
+                if self.reservations is None:
+                    plans.append(format_slot(start, end))
+                else:
+                    hold = self.reservations.try_reserve(start, end, patient.get("patientName", "Patient"))
+                    if hold is None:
+                        continue
+                    plans.append({**format_slot(start, end), "hold": hold.to_dict()})
+                if len(plans) == len(patients):
+                    break
+        plans.extend({"error": "No available slot found"} for _ in range(len(patients) - len(plans)))
+        return plans
+
+    @timed(STAGE_SECONDS.labels("appointment.book"))
+    def _book(self, payload: Dict[str, Any], plan: Dict[str, Any]):
+        return self._execute_booking(payload, plan)
+
+    def _execute_booking(self, payload: Dict[str, Any], plan: Dict[str, Any]):
         booking = None
         if self.app_executor:
             try:
@@ -104,12 +360,102 @@ class HealthcareOrchestrator:
                 )
             except Exception as e:
                 booking = {"warning": f"Booking skipped: {e}"}
+        return booking
+
+    @timed(STAGE_SECONDS.labels("appointment.book"))
+    async def _book_async(self, payload: Dict[str, Any], plan: Dict[str, Any]):
+        book_async = getattr(self.app_executor, "book_appointment_async", None)
+        if book_async is None:
+            # Executor clients may do network I/O, keep them off the event loop
+            return await run_blocking(self._execute_booking, payload, plan)
+        try:
+            return await book_async(
+                patient_name=payload.get("patientName", "Patient"),
+                patient_email=payload.get("patientEmail", "patient@example.com"),
+                plan_result=plan,
+            )
+        except Exception as e:
+            return {"warning": f"Booking skipped: {e}"}
+
+    # Intake
+    @_budgeted
+    async def handle_intake_async(self, payload: Dict[str, Any]) -> Dict[str, Any]:
+        """
+        One check-in: the ``records``, ``insurance`` and ``appointment`` flows
+        present in ``payload`` run concurrently, so the reply takes about as
+        long as the slowest of them. Each branch has its own timeout; one that
+        raises or times out is reported under ``errors`` while the others'
+        results are still returned.
+        """
+        handlers = {
+            "records": self.handle_record_async,
+            "insurance": self.handle_insurance_async,
+            "appointment": self.handle_appointment_async,
+        }
+        branches = [name for name in handlers if payload.get(name) is not None]
+        outcomes = await asyncio.gather(*(self._intake_branch(handlers[name], payload[name]) for name in branches))
+
+        response: Dict[str, Any] = {name: None for name in handlers}
+        errors: Dict[str, str] = {}
+        timings: Dict[str, float] = {}
+        for name, (result, error, seconds) in zip(branches, outcomes):
+            response[name] = result
+            timings[name] = round(seconds, 3)
+            if error is not None:
+                errors[name] = error
+        response["errors"] = errors
+        response["timings"] = timings
+        return response
 
-        return {"plan": plan, "booking": booking}
+    async def _intake_branch(self, handler, branch_payload: Dict[str, Any]) -> Tuple[Optional[Dict[str, Any]], Optional[str], float]:
+        start = time.perf_counter()
+        timeout = self.intake_timeout
+        soft = None if timeout is None else max(0.0, timeout - INTAKE_FALLBACK_MARGIN)
+        try:
+            # wait_for runs the handler in its own task, which inherits this scope
+            with deadline_scope(soft):
+                result = await asyncio.wait_for(handler(branch_payload), timeout)
+        except asyncio.TimeoutError:
+            # A cancelled appointment branch may leave a hold behind; it lapses after its TTL
+            return None, f"timed out after {timeout:g}s", time.perf_counter() - start
+        except Exception as exc:
+            return None, str(exc) or type(exc).__name__, time.perf_counter() - start
+        return result, None, time.perf_counter() - start
 
     # Chat
+    @_budgeted
     def handle_chat(self, payload: Dict[str, Any]) -> Dict[str, Any]:
         if not self.knowledge:
             return {"message": "Knowledge agent not configured"}
         query = payload.get("message", "")
         return {"message": self.knowledge.get_general_advice(query)}
+
+    @_budgeted
+    async def handle_chat_async(self, payload: Dict[str, Any]) -> Dict[str, Any]:
+        if not self.knowledge:
+            return {"message": "Knowledge agent not configured"}
+        query = payload.get("message", "")
+        return {"message": await self.knowledge.get_general_advice_async(query)}
+
+    def outbox_stats(self) -> Dict[str, Any]:
+        outbox = getattr(self.app_executor, "outbox", None)
+        if outbox is None:
+            return {"enabled": False}
+        return {"enabled": True, **outbox.stats()}
+
+    def chat_cache_stats(self) -> Dict[str, Any]:
+        cache = getattr(self.knowledge, "cache", None)
+        if cache is None:
+            return {"enabled": False}
+        return {"enabled": True, **cache.stats()}
+
+    @_budgeted
+    async def handle_chat_stream(self, payload: Dict[str, Any]) -> AsyncIterator[Tuple[str, Dict[str, Any]]]:
+        """Yield ``(event, data)`` pairs: "token" chunks, then "done" or "escalation"."""
+        if not self.knowledge:
+            yield "done", {"message": "Knowledge agent not configured"}
+            return
+        query = payload.get("message", "")
+        async with aclosing(self.knowledge.stream_general_advice(query)) as events:
+            async for event in events:
+                yield event
@@ -0,0 +1,350 @@
+import asyncio
+import contextvars
+import json
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Awaitable, Callable, Dict, Optional, Set, Tuple
+
+from backend.utils.concurrency import run_blocking
+from backend.utils.logging import get_logger
+
+
+logger = get_logger(__name__)
+
+# (value, stored_at) as kept by every tier
+Entry = Tuple[Any, float]
+
+
+class LRUCache:
+    """Thread-safe, size-bounded LRU map of key -> (value, stored_at).
+
+    Entries older than ``max_age`` are dropped on access; freshness is the
+    caller's concern so the same entry can be served stale.
+    """
+
+    def __init__(self, maxsize: int = 1024, max_age: Optional[float] = None, clock: Callable[[], float] = time.time):
+        self.maxsize = maxsize
+        self.max_age = max_age
+        self._clock = clock
+        self._data: "OrderedDict[str, Entry]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key: str) -> Optional[Entry]:
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is None:
+                return None
+            if self.max_age is not None and self._clock() - entry[1] > self.max_age:
+                del self._data[key]
+                return None
+            self._data.move_to_end(key)
+            return entry
+
+    def set(self, key: str, value: Any, stored_at: Optional[float] = None) -> None:
+        with self._lock:
+            self._data[key] = (value, self._clock() if stored_at is None else stored_at)
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+
+    def delete(self, key: str) -> None:
+        with self._lock:
+            self._data.pop(key, None)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._data.clear()
+
+    def __len__(self) -> int:
+        return len(self._data)
+
+
+class SqliteCache:
+    """JSON values in a SQLite file, shared by every worker process on the host."""
+
+    # Expired rows are swept once every this many writes
+    sweep_every = 256
+
+    def __init__(self, path: str, max_age: Optional[float] = None, clock: Callable[[], float] = time.time):
+        self.path = path
+        self.max_age = max_age
+        self._clock = clock
+        self._local = threading.local()
+        self._writes = 0
+        self._lock = threading.Lock()
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        with self._conn() as conn:
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS cache (key TEXT PRIMARY KEY, value TEXT NOT NULL, stored_at REAL NOT NULL)"
+            )
+
+    def _conn(self) -> sqlite3.Connection:
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=5, isolation_level=None)
+            # WAL lets readers in other workers proceed while one writes
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+        return conn
+
+    def get(self, key: str) -> Optional[Entry]:
+        row = self._conn().execute("SELECT value, stored_at FROM cache WHERE key = ?", (key,)).fetchone()
+        if row is None:
+            return None
+        if self.max_age is not None and self._clock() - row[1] > self.max_age:
+            return None
+        return json.loads(row[0]), row[1]
+
+    def set(self, key: str, value: Any, stored_at: Optional[float] = None) -> None:
+        stored_at = self._clock() if stored_at is None else stored_at
+        conn = self._conn()
+        conn.execute(
+            "INSERT OR REPLACE INTO cache (key, value, stored_at) VALUES (?, ?, ?)",
+            (key, json.dumps(value), stored_at),
+        )
+        # Several threads write at once; an unlocked += could skip a sweep
+        with self._lock:
+            self._writes += 1
+            sweep = self._writes % self.sweep_every == 0
+        if self.max_age is not None and sweep:
+            conn.execute("DELETE FROM cache WHERE stored_at < ?", (self._clock() - self.max_age,))
+
+    def delete(self, key: str) -> None:
+        self._conn().execute("DELETE FROM cache WHERE key = ?", (key,))
+
+
+class TieredCache:
+    """In-memory LRU in front of an optional SQLite store, with stale-while-revalidate.
+
+    Entries younger than ``ttl`` are fresh. Up to ``stale_ttl`` seconds past
+    that they are still returned immediately, while a single background
+    refresh per key recomputes them. Values of ``None`` are never stored, so
+    callers return None for answers that must not be cached.
+    """
+
+    def __init__(
+        self,
+        ttl: float,
+        stale_ttl: float = 0.0,
+        memory_size: int = 1024,
+        sqlite_path: Optional[str] = None,
+        clock: Callable[[], float] = time.time,
+    ):
+        self.ttl = ttl
+        self.stale_ttl = stale_ttl
+        self._clock = clock
+        self.memory = LRUCache(memory_size, max_age=ttl + stale_ttl, clock=clock)
+        self.disk: Optional[SqliteCache] = None
+        if sqlite_path:
+            try:
+                self.disk = SqliteCache(sqlite_path, max_age=ttl + stale_ttl, clock=clock)
+            except (OSError, sqlite3.Error) as exc:
+                logger.warning(f"Persistent cache at {sqlite_path} unavailable ({exc}); using memory only")
+        self._refreshing: Set[str] = set()
+        self._refresh_lock = threading.Lock()
+        self._tasks: Set["asyncio.Task"] = set()
+
+    def lookup(self, key: str) -> Optional[Entry]:
+        entry = self.memory.get(key)
+        if entry is None and self.disk is not None:
+            try:
+                entry = self.disk.get(key)
+            except sqlite3.Error as exc:
+                logger.warning(f"Persistent cache read failed: {exc}")
+                entry = None
+            if entry is not None:
+                self.memory.set(key, entry[0], stored_at=entry[1])
+        return entry
+
+    def store(self, key: str, value: Any) -> None:
+        if value is None:
+            return
+        now = self._clock()
+        self.memory.set(key, value, stored_at=now)
+        if self.disk is not None:
+            try:
+                self.disk.set(key, value, stored_at=now)
+            except sqlite3.Error as exc:
+                logger.warning(f"Persistent cache write failed: {exc}")
+
+    def is_fresh(self, entry: Entry) -> bool:
+        return self._clock() - entry[1] <= self.ttl
+
+    def get_or_compute(self, key: str, compute: Callable[[], Any]) -> Any:
+        entry = self.lookup(key)
+        if entry is not None:
+            if not self.is_fresh(entry) and self._claim_refresh(key):
+                threading.Thread(target=self._refresh, args=(key, compute), name="clinix-cache-refresh", daemon=True).start()
+            return entry[0]
+        value = compute()
+        self.store(key, value)
+        return value
+
+    async def get_or_compute_async(self, key: str, compute: Callable[[], Awaitable[Any]]) -> Any:
+        entry = self.memory.get(key)
+        if entry is None and self.disk is not None:
+            entry = await run_blocking(self.lookup, key)
+        if entry is not None:
+            if not self.is_fresh(entry) and self._claim_refresh(key):
+                # Fresh context: the refresh must not inherit the request's deadline
+                task = asyncio.get_running_loop().create_task(
+                    self._refresh_async(key, compute), context=contextvars.Context()
+                )
+                self._tasks.add(task)
+                task.add_done_callback(self._tasks.discard)
+            return entry[0]
+        value = await compute()
+        if value is not None:
+            await run_blocking(self.store, key, value)
+        return value
+
+    def _claim_refresh(self, key: str) -> bool:
+        with self._refresh_lock:
+            if key in self._refreshing:
+                return False
+            self._refreshing.add(key)
+            return True
+
+    def _refresh(self, key: str, compute: Callable[[], Any]) -> None:
+        try:
+            self.store(key, compute())
+        except Exception as exc:
+            logger.warning(f"Background cache refresh failed for {key!r}: {exc}")
+        finally:
+            with self._refresh_lock:
+                self._refreshing.discard(key)
+
+    async def _refresh_async(self, key: str, compute: Callable[[], Awaitable[Any]]) -> None:
+        try:
+            value = await compute()
+            if value is not None:
+                await run_blocking(self.store, key, value)
+        except Exception as exc:
+            logger.warning(f"Background cache refresh failed for {key!r}: {exc}")
+        finally:
+            with self._refresh_lock:
+                self._refreshing.discard(key)
+
+
+def _trigrams(key: str) -> frozenset:
+    padded = f" {key} "
+    return frozenset(padded[i:i + 3] for i in range(len(padded) - 2))
+
+
+class AnswerCache:
+    """Bounded LRU/TTL cache of answers keyed by an already-normalized question.
+
+    With ``similarity`` > 0, a miss on the exact key falls back to the most
+    similar cached question whose character-trigram Jaccard score reaches the
+    threshold. Candidates come from a word index, so a lookup only compares
+    questions that share a word with it (at most ``max_candidates``).
+    """
+
+    def __init__(
+        self,
+        maxsize: int = 2048,
+        ttl: Optional[float] = 3600.0,
+        similarity: float = 0.0,
+        max_candidates: int = 256,
+        clock: Callable[[], float] = time.time,
+    ):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.similarity = similarity
+        self.max_candidates = max_candidates
+        self._clock = clock
+        # key -> (value, stored_at, trigrams)
+        self._data: "OrderedDict[str, Tuple[Any, float, frozenset]]" = OrderedDict()
+        self._words: Dict[str, Set[str]] = {}
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.similar_hits = 0
+        self.misses = 0
+        self.stores = 0
+
+    def _expired(self, stored_at: float) -> bool:
+        return self.ttl is not None and self._clock() - stored_at > self.ttl
+
+    def _drop(self, key: str) -> None:
+        # Caller holds self._lock
+        self._data.pop(key, None)
+        for word in set(key.split()):
+            keys = self._words.get(word)
+            if keys is not None:
+                keys.discard(key)
+                if not keys:
+                    del self._words[word]
+
+    def _similar(self, key: str) -> Optional[str]:
+        # Caller holds self._lock
+        grams = _trigrams(key)
+        best, best_score = None, self.similarity
+        seen: Set[str] = set()
+        for word in set(key.split()):
+            for candidate in self._words.get(word, ()):
+                if candidate in seen:
+                    continue
+                seen.add(candidate)
+                other = self._data[candidate][2]
+                score = len(grams & other) / len(grams | other)
+                if score >= best_score:
+                    best, best_score = candidate, score
+                if len(seen) >= self.max_candidates:
+                    return best
+        return best
+
+    def get(self, key: str) -> Optional[Any]:
+        if not key:
+            return None
+        with self._lock:
+            match = key if key in self._data else None
+            if match is None and self.similarity > 0:
+                match = self._similar(key)
+            if match is not None and self._expired(self._data[match][1]):
+                self._drop(match)
+                match = None
+            if match is None:
+                self.misses += 1
+                return None
+            if match == key:
+                self.hits += 1
+            else:
+                self.similar_hits += 1
+            self._data.move_to_end(match)
+            return self._data[match][0]
+
+    def set(self, key: str, value: Any) -> None:
+        if not key or value is None:
+            return
+        with self._lock:
+            self._drop(key)
+            self._data[key] = (value, self._clock(), _trigrams(key))
+            for word in set(key.split()):
+                self._words.setdefault(word, set()).add(key)
+            self.stores += 1
+            while len(self._data) > self.maxsize:
+                self._drop(next(iter(self._data)))
+
+    def clear(self) -> None:
+        with self._lock:
+            self._data.clear()
+            self._words.clear()
+
+    def stats(self) -> Dict[str, Any]:
+        lookups = self.hits + self.similar_hits + self.misses
+        return {
+            "size": len(self._data),
+            "maxsize": self.maxsize,
+            "hits": self.hits,
+            "similar_hits": self.similar_hits,
+            "misses": self.misses,
+            "stores": self.stores,
+            "hit_rate": (self.hits + self.similar_hits) / lookups if lookups else 0.0,
+        }
+
+    def __len__(self) -> int:
+        return len(self._data)
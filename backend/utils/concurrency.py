@@ -0,0 +1,76 @@
+import asyncio
+import contextvars
+import functools
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, AsyncIterator, Callable, Iterable
+
+
+# Upper bound on blocking calls (Gemini requests, file reads) that may be in
+# flight at once from the async request handlers of a single worker.
+MAX_BLOCKING_WORKERS = int(os.getenv("BLOCKING_POOL_SIZE", "32"))
+
+_executor = ThreadPoolExecutor(
+    max_workers=MAX_BLOCKING_WORKERS,
+    thread_name_prefix="clinix-blocking",
+)
+
+
+async def run_blocking(func: Callable[..., Any], *args: Any, **kwargs: Any) -> Any:
+    """Run a blocking callable on the shared bounded pool without stalling the event loop.
+
+    The caller's context variables are copied into the worker thread.
+    """
+    loop = asyncio.get_running_loop()
+    ctx = contextvars.copy_context()
+    call = functools.partial(ctx.run, func, *args, **kwargs)
+    return await loop.run_in_executor(_executor, call)
+
+
+async def iterate_blocking(func: Callable[..., Iterable[Any]], *args: Any, **kwargs: Any) -> AsyncIterator[Any]:
+    """Iterate a blocking iterable (e.g. a streamed Gemini response) from async code.
+
+    ``func(*args, **kwargs)`` is called and iterated on the shared pool; items
+    are yielded as soon as the worker produces them. Closing the async
+    iterator early stops the worker after its current item.
+    """
+    loop = asyncio.get_running_loop()
+    queue: asyncio.Queue = asyncio.Queue()
+    stop = threading.Event()
+    end = object()
+
+    def put(item: Any, exc: Any = None) -> None:
+        try:
+            loop.call_soon_threadsafe(queue.put_nowait, (item, exc))
+        except RuntimeError:
+            # Loop already closed; nobody is listening any more
+            stop.set()
+
+    def pump() -> None:
+        try:
+            for item in func(*args, **kwargs):
+                if stop.is_set():
+                    return
+                put(item)
+        except BaseException as exc:
+            put(end, exc)
+            return
+        put(end)
+
+    worker = asyncio.ensure_future(run_blocking(pump))
+    try:
+        while True:
+            item, exc = await queue.get()
+            if item is end:
+                if exc is not None:
+                    raise exc
+                return
+            yield item
+    finally:
+        stop.set()
+        if worker.done():
+            worker.exception()
+        else:
+            # Retrieve the result later so an abandoned worker never logs "exception was never retrieved"
+            worker.add_done_callback(lambda f: f.cancelled() or f.exception())
@@ -0,0 +1,384 @@
+import glob
+import json
+import os
+import threading
+import time
+import uuid
+from collections import OrderedDict, deque
+from typing import Any, Callable, Deque, Dict, List, NamedTuple, Optional
+
+from backend.utils.keyword_matcher import normalize_text
+from backend.utils.logging import get_logger
+from backend.utils.retry import retry
+
+try:
+    import fcntl
+except ImportError:  # pragma: no cover - Windows
+    fcntl = None
+
+
+logger = get_logger(__name__)
+
+
+class Escalation(NamedTuple):
+    escalation_id: str
+    query: str
+    reason: str
+    created_at: float
+
+    def to_dict(self) -> dict:
+        return self._asdict()
+
+
+Sink = Callable[[List[Escalation]], None]
+
+
+def log_sink(batch: List[Escalation]) -> None:
+    """Default sink: one log line per escalation, standing in for a pager/ticketing hook."""
+    for item in batch:
+        logger.warning(f"[ESCALATION] {item.reason} → Human needed for: {item.query}")
+
+
+class EscalationQueue:
+    """Bounded queue that hands escalations to a slow sink off the request path.
+
+    ``submit`` only records the escalation in memory and returns. A
+    background thread appends it to a JSONL journal, when configured, and
+    delivers batches to the sink with retry. Repeats of the same question
+    and reason within ``dedup_seconds`` are dropped.
+
+    Each process writes its own journal (``<name>.<pid>.jsonl`` next to
+    ``journal_path``) and holds an exclusive lock on it while running. On
+    start, a queue replays the journals of processes that no longer hold
+    their lock, so escalations pending at a crash or restart are delivered
+    once, by one worker.
+    """
+
+    # Journal is rewritten with only the pending entries once it has this many lines
+    compact_after = 1000
+
+    def __init__(
+        self,
+        sink: Sink = log_sink,
+        maxsize: int = 1000,
+        journal_path: Optional[str] = None,
+        batch_size: int = 20,
+        flush_interval: float = 0.5,
+        dedup_seconds: float = 300.0,
+        attempts: int = 3,
+        retry_delay: float = 1.0,
+        clock: Callable[[], float] = time.time,
+    ):
+        self.sink = sink
+        self.maxsize = maxsize
+        self.journal_path = _process_journal(journal_path) if journal_path else None
+        self.batch_size = max(1, batch_size)
+        self.flush_interval = flush_interval
+        self.dedup_seconds = dedup_seconds
+        self.attempts = attempts
+        self.retry_delay = retry_delay
+        self._clock = clock
+        self._pending: Deque[Escalation] = deque()
+        # "add" records accepted by submit() and not yet written by the worker
+        self._unjournaled: List[Dict[str, Any]] = []
+        self._in_flight = 0
+        # dedup key -> last accepted time, oldest first
+        self._recent: "OrderedDict[tuple, float]" = OrderedDict()
+        self._cond = threading.Condition()
+        self._journal_lock = threading.Lock()
+        self._journal_lines = 0
+        self._journal_file = None
+        self._worker: Optional[threading.Thread] = None
+        self._stopping = False
+        self.delivered = 0
+        self.deduplicated = 0
+        self.dropped = 0
+        self.failed_attempts = 0
+        if journal_path:
+            self._replay(journal_path)
+
+    # ---------- producer side ----------
+
+    def submit(self, query: str, reason: str = "") -> bool:
+        """Queue one escalation; False when it was a duplicate or the queue is full."""
+        now = self._clock()
+        key = (normalize_text(query).strip(), reason)
+        with self._cond:
+            self._forget_before(now - self.dedup_seconds)
+            if key in self._recent:
+                self.deduplicated += 1
+                return False
+            if len(self._pending) + self._in_flight >= self.maxsize:
+                self.dropped += 1
+                logger.error(f"Escalation queue full; dropped escalation ({reason}): {query}")
+                return False
+            item = Escalation(uuid.uuid4().hex, query, reason, now)
+            if self.journal_path:
+                # Written by the worker thread; no file I/O on the request path
+                self._unjournaled.append({"op": "add", **item.to_dict()})
+            self._recent[key] = now
+            self._pending.append(item)
+            self._cond.notify()
+        return True
+
+    def __call__(self, query: str, reason: str = "") -> bool:
+        # Usable directly as a KnowledgeAgent escalation callback
+        return self.submit(query, reason=reason)
+
+    def _forget_before(self, cutoff: float) -> None:
+        # Caller holds self._cond
+        while self._recent:
+            key, seen = next(iter(self._recent.items()))
+            if seen >= cutoff:
+                break
+            self._recent.popitem(last=False)
+
+    # ---------- worker ----------
+
+    def start(self) -> None:
+        with self._cond:
+            if self._worker is not None and self._worker.is_alive():
+                return
+            self._stopping = False
+            self._worker = threading.Thread(target=self._run, name="clinix-escalations", daemon=True)
+            self._worker.start()
+
+    def stop(self, timeout: float = 5.0) -> None:
+        """Deliver what is queued (within ``timeout``) and stop the worker."""
+        with self._cond:
+            self._stopping = True
+            self._cond.notify_all()
+        if self._worker is not None:
+            self._worker.join(timeout)
+            self._worker = None
+        self._flush_journal()
+        with self._journal_lock:
+            self._close_journal()
+
+    def _next_batch(self) -> List[Escalation]:
+        with self._cond:
+            while not self._pending and not self._stopping:
+                self._cond.wait()
+        # Journal new escalations before waiting for the batch to fill
+        self._flush_journal()
+        with self._cond:
+            # Give a burst a moment to fill the batch
+            deadline = time.monotonic() + self.flush_interval
+            while len(self._pending) < self.batch_size and not self._stopping:
+                left = deadline - time.monotonic()
+                if left <= 0:
+                    break
+                self._cond.wait(left)
+            batch = [self._pending.popleft() for _ in range(min(self.batch_size, len(self._pending)))]
+            self._in_flight = len(batch)
+        # Every "add" reaches the journal before its "done"
+        self._flush_journal()
+        return batch
+
+    def _run(self) -> None:
+        while True:
+            batch = self._next_batch()
+            if not batch:
+                return
+            try:
+                retry(lambda: self._deliver(batch), attempts=self.attempts, delay=self.retry_delay)
+            except Exception as exc:
+                logger.error(f"Escalation delivery failed for {len(batch)} item(s); will retry: {exc}")
+                with self._cond:
+                    self._in_flight = 0
+                    self._pending.extendleft(reversed(batch))
+                    if not self._stopping:
+                        self._cond.wait(self.retry_delay * 2 ** self.attempts)
+                    else:
+                        # Left in the journal for the next start
+                        return
+                continue
+            with self._cond:
+                self._in_flight = 0
+                self.delivered += len(batch)
+                empty = not self._pending
+            self._journal({"op": "done", "ids": [item.escalation_id for item in batch]})
+            if empty:
+                self._maybe_compact()
+
+    def _deliver(self, batch: List[Escalation]) -> None:
+        try:
+            self.sink(batch)
+        except Exception:
+            self.failed_attempts += 1
+            raise
+
+    # ---------- journal ----------
+
+    def _flush_journal(self) -> None:
+        with self._cond:
+            records, self._unjournaled = self._unjournaled, []
+        if records:
+            self._journal(*records)
+
+    def _journal(self, *records: Dict[str, Any]) -> None:
+        if not self.journal_path:
+            return
+        lines = "".join(json.dumps(record, ensure_ascii=False) + "\n" for record in records)
+        with self._journal_lock:
+            try:
+                if self._journal_file is None:
+                    self._journal_file = _open_locked(self.journal_path, "a")
+                # Flushed to the OS per write (no fsync): survives a process crash, not a power cut
+                self._journal_file.write(lines)
+                self._journal_file.flush()
+                self._journal_lines += len(records)
+            except OSError as exc:
+                logger.error(f"Escalation journal write failed: {exc}")
+                self._close_journal()
+
+    def _close_journal(self) -> None:
+        # Caller holds self._journal_lock
+        if self._journal_file is not None:
+            try:
+                self._journal_file.close()
+            except OSError:
+                pass
+            self._journal_file = None
+
+    def _replay(self, base: str) -> None:
+        os.makedirs(os.path.dirname(os.path.abspath(base)), exist_ok=True)
+        pending: "OrderedDict[str, Escalation]" = OrderedDict()
+        claimed = []
+        for path in _journals(base):
+            handle = _claim(path)
+            if handle is None:
+                # Owned by a running process, or already taken by another starting worker
+                continue
+            claimed.append((path, handle))
+            with handle:
+                _read_pending(handle, pending)
+        if os.path.exists(self.journal_path) and self.journal_path not in (path for path, _ in claimed):
+            # Another queue in this process owns the file
+            logger.error(f"Escalation journal {self.journal_path} is in use; journaling disabled")
+            self.journal_path = None
+            for _, handle in claimed:
+                handle.close()
+            return
+        with self._journal_lock:
+            # Pending entries move to our own journal before the claimed files go away,
+            # so a crash in between replays them twice rather than never
+            written = self._rewrite_journal(list(pending.values()))
+        for path, handle in claimed:
+            if written and path != self.journal_path:
+                try:
+                    os.unlink(path)
+                except OSError:
+                    pass
+            handle.close()
+        self._pending.extend(pending.values())
+        if pending:
+            logger.warning(f"Replaying {len(pending)} undelivered escalation(s) from {len(claimed)} journal(s)")
+
+    def _maybe_compact(self) -> None:
+        if not self.journal_path or self._journal_lines < self.compact_after:
+            return
+        with self._cond:
+            pending = list(self._pending)
+            # Unwritten adds are all in ``pending`` and go into the rewrite
+            unjournaled, self._unjournaled = self._unjournaled, []
+        with self._journal_lock:
+            written = self._rewrite_journal(pending)
+        if not written:
+            with self._cond:
+                self._unjournaled[:0] = unjournaled
+
+    def _rewrite_journal(self, pending: List[Escalation]) -> bool:
+        # Caller holds self._journal_lock
+        tmp = f"{self.journal_path}.tmp"
+        handle = None
+        try:
+            handle = _open_locked(tmp, "w")
+            for item in pending:
+                handle.write(json.dumps({"op": "add", **item.to_dict()}, ensure_ascii=False) + "\n")
+            handle.flush()
+            os.replace(tmp, self.journal_path)
+        except OSError as exc:
+            logger.warning(f"Escalation journal rewrite failed: {exc}")
+            if handle is not None:
+                handle.close()
+            return False
+        self._close_journal()
+        self._journal_file = handle
+        self._journal_lines = len(pending)
+        return True
+
+    # ---------- introspection ----------
+
+    def depth(self) -> int:
+        """Escalations accepted but not yet delivered."""
+        with self._cond:
+            return len(self._pending) + self._in_flight
+
+    def stats(self) -> Dict[str, Any]:
+        with self._cond:
+            return {
+                "depth": len(self._pending) + self._in_flight,
+                "maxsize": self.maxsize,
+                "delivered": self.delivered,
+                "deduplicated": self.deduplicated,
+                "dropped": self.dropped,
+                "failed_attempts": self.failed_attempts,
+                "running": self._worker is not None and self._worker.is_alive(),
+            }
+
+
+def _process_journal(base: str) -> str:
+    root, ext = os.path.splitext(base)
+    return f"{root}.{os.getpid()}{ext or '.jsonl'}"
+
+
+def _journals(base: str) -> List[str]:
+    """Journals of every process that used ``base``, plus ``base`` itself from older versions."""
+    root, ext = os.path.splitext(base)
+    ext = ext or ".jsonl"
+    found = [path for path in glob.glob(f"{glob.escape(root)}.*{ext}") if path[len(root) + 1:-len(ext)].isdigit()]
+    return sorted(found) + ([base] if os.path.isfile(base) else [])
+
+
+def _lock(handle) -> None:
+    # Non-blocking: a held lock means a live owner. Without fcntl (Windows) journals
+    # are not locked, and several workers sharing one directory would replay twice.
+    if fcntl is not None:
+        fcntl.flock(handle.fileno(), fcntl.LOCK_EX | fcntl.LOCK_NB)
+    # The path may have been replaced or removed between open() and the lock
+    if os.fstat(handle.fileno()).st_ino != os.stat(handle.name).st_ino:
+        raise FileNotFoundError(handle.name)
+
+
+def _open_locked(path: str, mode: str):
+    handle = open(path, mode, encoding="utf-8")
+    try:
+        _lock(handle)
+    except OSError:
+        handle.close()
+        raise
+    return handle
+
+
+def _claim(path: str):
+    """Open and lock a journal whose process is gone; None while it is still owned."""
+    try:
+        return _open_locked(path, "r")
+    except OSError:
+        return None
+
+
+def _read_pending(handle, pending: "OrderedDict[str, Escalation]") -> None:
+    for line in handle:
+        try:
+            record = json.loads(line)
+        except json.JSONDecodeError:
+            # Torn last line from a crash mid-write
+            continue
+        if record.get("op") == "add":
+            item = Escalation(record["escalation_id"], record["query"], record["reason"], record["created_at"])
+            pending[item.escalation_id] = item
+        elif record.get("op") == "done":
+            for escalation_id in record.get("ids", ()):
+                pending.pop(escalation_id, None)
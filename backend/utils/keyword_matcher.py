@@ -0,0 +1,111 @@
+import re
+from collections import deque
+from functools import lru_cache
+from pathlib import Path
+from typing import Dict, Iterable, List, Optional, Tuple
+
+_APOSTROPHES = re.compile(r"['‘’`]")
+_SEPARATORS = re.compile(r"[\W_]+")
+
+
+def normalize_text(text: str) -> str:
+    """Lowercase, drop apostrophes ("can't" == "cant") and collapse punctuation/whitespace to single spaces."""
+    return " " + _SEPARATORS.sub(" ", _APOSTROPHES.sub("", (text or "").lower())).strip() + " "
+
+
+class KeywordMatcher:
+    """Aho-Corasick automaton over whole-word phrases.
+
+    Matching is one pass over the normalized text, so the cost depends on
+    the length of the text and not on how many terms are loaded. Terms only
+    match on word boundaries: "od" does not match inside "good".
+    """
+
+    def __init__(self, terms: Iterable[str]):
+        self._goto: List[Dict[str, int]] = [{}]
+        self._fail: List[int] = [0]
+        # Per state: (normalized length, term) of every term ending there, via failure links too
+        self._out: List[Tuple[Tuple[int, str], ...]] = [()]
+        self.terms: Tuple[str, ...] = ()
+
+        seen = {}
+        for term in terms:
+            # Surrounding spaces make every match start and end on a word boundary
+            key = normalize_text(term)
+            if key.strip() and key not in seen:
+                seen[key] = term.strip()
+        for key, term in seen.items():
+            self._add(key, term)
+        self.terms = tuple(seen.values())
+        self._link()
+
+    def _add(self, key: str, term: str) -> None:
+        state = 0
+        for ch in key:
+            nxt = self._goto[state].get(ch)
+            if nxt is None:
+                nxt = len(self._goto)
+                self._goto[state][ch] = nxt
+                self._goto.append({})
+                self._fail.append(0)
+                self._out.append(())
+            state = nxt
+        self._out[state] = ((len(key), term),)
+
+    def _link(self) -> None:
+        # Breadth-first so every failure target is finished before it is used
+        queue = deque(self._goto[0].values())
+        while queue:
+            state = queue.popleft()
+            for ch, nxt in self._goto[state].items():
+                queue.append(nxt)
+                fail = self._fail[state]
+                while fail and ch not in self._goto[fail]:
+                    fail = self._fail[fail]
+                target = self._goto[fail].get(ch, 0)
+                self._fail[nxt] = target if target != nxt else 0
+                self._out[nxt] = self._out[nxt] + self._out[self._fail[nxt]]
+
+    def _scan(self, text: str):
+        goto, fail, out = self._goto, self._fail, self._out
+        state = 0
+        for i, ch in enumerate(normalize_text(text)):
+            while state and ch not in goto[state]:
+                state = fail[state]
+            state = goto[state].get(ch, 0)
+            for length, term in out[state]:
+                yield i + 1 - length, term
+
+    def search(self, text: str) -> Optional[str]:
+        """First term (by end position) found in ``text``, or None."""
+        for _, term in self._scan(text):
+            return term
+        return None
+
+    def find_all(self, text: str) -> List[str]:
+        """Every distinct term found in ``text``, in order of appearance."""
+        return list(dict.fromkeys(term for _, term in sorted(self._scan(text))))
+
+    def __contains__(self, text: str) -> bool:
+        return self.search(text) is not None
+
+    def __len__(self) -> int:
+        return len(self.terms)
+
+    @classmethod
+    def from_file(cls, path) -> "KeywordMatcher":
+        """One term per line; blank lines and ``#`` comments are ignored."""
+        with open(path, "r", encoding="utf-8") as f:
+            lines = (line.split("#", 1)[0].strip() for line in f)
+            return cls(line for line in lines if line)
+
+
+@lru_cache(maxsize=8)
+def _load_matcher(path: str, mtime_ns: int) -> KeywordMatcher:
+    return KeywordMatcher.from_file(path)
+
+
+def load_matcher(path) -> KeywordMatcher:
+    """Matcher for a vocabulary file, rebuilt only when the file changes."""
+    p = Path(path).resolve()
+    return _load_matcher(str(p), p.stat().st_mtime_ns)
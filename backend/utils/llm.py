@@ -0,0 +1,256 @@
+import json
+import re
+import threading
+import time
+from logging import Logger
+from typing import Any, Dict, Iterable, Optional, Set, Tuple
+
+from backend.utils.concurrency import run_blocking
+from backend.utils.logging import get_logger
+from backend.utils.metrics import LLM_CALLS, LLM_SECONDS
+from backend.utils.retry import current_deadline, deadline_expired, remaining_budget, retry, retry_async
+from backend.utils.singleflight import SingleFlight
+
+logger = get_logger(__name__)
+
+_GENAI_UNLOADED = object()
+genai: Any = _GENAI_UNLOADED
+
+
+def load_genai() -> Optional[Any]:
+    """Import ``google.generativeai`` on first use; None when it is not installed.
+
+    The SDK pulls in grpc and protobuf, which dominates import time, so it is
+    only loaded once a Gemini model is actually needed.
+    """
+    global genai
+    if genai is _GENAI_UNLOADED:
+        try:
+            import google.generativeai as module
+        except Exception as exc:  # pragma: no cover - optional at runtime
+            logger.warning(f"google-generativeai unavailable; Gemini disabled: {exc}")
+            module = None
+        genai = module
+    return genai
+
+class StreamInterrupted(RuntimeError):
+    """A streamed answer failed or ran out of budget after part of it was sent."""
+
+
+# Shared by every planner and the knowledge agent: concurrent identical
+# prompts wait on one upstream Gemini call and share its parsed result.
+inflight = SingleFlight()
+
+
+class GeminiRegistry:
+    """Process-wide Gemini client state shared by all agents.
+
+    ``genai.configure`` resets the library's cached clients (and their HTTP
+    sessions), so it runs once per API key instead of once per agent. Models
+    are created on first use and reused; the outcome of picking a model from
+    a list of candidates is remembered.
+    """
+
+    def __init__(self):
+        self._lock = threading.RLock()
+        self._configured_key: Optional[str] = None
+        self._models: Dict[str, Any] = {}
+        self._unavailable: Set[str] = set()
+        self._chosen: Dict[Tuple[str, ...], Optional[str]] = {}
+
+    def _configure(self, api_key: str) -> bool:
+        # Caller holds self._lock
+        if self._configured_key == api_key:
+            return True
+        try:
+            genai.configure(api_key=api_key, transport="rest")
+        except Exception as exc:
+            logger.warning(f"Failed to configure Gemini client: {exc}")
+            return False
+        self._configured_key = api_key
+        self._models.clear()
+        return True
+
+    def model(self, api_key: str, model_name: str) -> Optional[Any]:
+        """The shared model for ``model_name``; None when Gemini is disabled or unavailable."""
+        if not api_key or model_name in self._unavailable or load_genai() is None:
+            return None
+        model = self._models.get(model_name)
+        if model is not None and self._configured_key == api_key:
+            return model
+        with self._lock:
+            if not self._configure(api_key):
+                return None
+            model = self._models.get(model_name)
+            if model is None:
+                try:
+                    model = genai.GenerativeModel(model_name)
+                except Exception as exc:
+                    logger.warning(f"Failed to init Gemini model '{model_name}': {exc}")
+                    self._unavailable.add(model_name)
+                    return None
+                self._models[model_name] = model
+            return model
+
+    def first_available(self, api_key: str, candidates: Iterable[str]) -> Optional[Any]:
+        """First candidate model that can be created and has not been marked unavailable."""
+        names = tuple(dict.fromkeys(m for m in candidates if m))
+        chosen = self._chosen.get(names)
+        if chosen is not None and chosen not in self._unavailable:
+            return self.model(api_key, chosen)
+        with self._lock:
+            for name in names:
+                model = self.model(api_key, name)
+                if model is not None:
+                    self._chosen[names] = name
+                    logger.info(f"Using Gemini model '{name}'.")
+                    return model
+            self._chosen.pop(names, None)
+        return None
+
+    def mark_unavailable(self, model: Any) -> None:
+        """Skip a model (by name or instance) from now on, e.g. after the API reports it does not exist."""
+        with self._lock:
+            names = [model] if isinstance(model, str) else [n for n, m in self._models.items() if m is model]
+            for name in names:
+                self._unavailable.add(name)
+                self._models.pop(name, None)
+
+
+registry = GeminiRegistry()
+
+_UNSET = object()
+
+
+class lazy_model:
+    """Agent attribute resolved from the shared registry on first access.
+
+    The owner needs ``api_key`` and ``model_name`` attributes. Assigning to
+    the attribute (e.g. a fake model in tests) bypasses the registry.
+    """
+
+    def __set_name__(self, owner, name):
+        self.attr = "_" + name
+
+    def __get__(self, obj, objtype=None):
+        if obj is None:
+            return self
+        value = obj.__dict__.get(self.attr, _UNSET)
+        if value is _UNSET:
+            value = registry.model(obj.api_key, obj.model_name)
+            if value is None and obj.api_key and load_genai() is not None:
+                obj.logger.warning("Failed to initialize Gemini; using fallback")
+            obj.__dict__[self.attr] = value
+        return value
+
+    def __set__(self, obj, value):
+        obj.__dict__[self.attr] = value
+
+
+def clean_json(text: str) -> str:
+    # Remove ```json ... ``` or ``` ... ``` blocks
+    return re.sub(r"```(?:json)?\s*([\s\S]*?)\s*```", r"\1", text).strip()
+
+
+class _LLMMetrics:
+    """Metric children for one calling agent, bound once per logger name."""
+
+    __slots__ = ("seconds", "ok", "error", "invalid_json", "skipped")
+
+    def __init__(self, agent: str):
+        self.seconds = LLM_SECONDS.labels(agent)
+        self.ok = LLM_CALLS.labels(agent, "ok")
+        self.error = LLM_CALLS.labels(agent, "error")
+        self.invalid_json = LLM_CALLS.labels(agent, "invalid_json")
+        self.skipped = LLM_CALLS.labels(agent, "skipped")
+
+
+_llm_metrics: Dict[str, _LLMMetrics] = {}
+
+
+def _metrics_for(logger: Logger) -> _LLMMetrics:
+    metrics = _llm_metrics.get(logger.name)
+    if metrics is None:
+        # Agent label is the module name, e.g. "insurance_planning_agent"
+        metrics = _llm_metrics.setdefault(logger.name, _LLMMetrics(logger.name.rsplit(".", 1)[-1]))
+    return metrics
+
+
+def _parse(response: Any, logger: Logger) -> Optional[Any]:
+    response_text = clean_json(response.text)
+    try:
+        return json.loads(response_text)
+    except json.JSONDecodeError:
+        logger.warning("Gemini returned non-JSON; using fallback")
+        _metrics_for(logger).invalid_json.inc()
+        return None
+
+
+def request_options() -> Dict[str, Any]:
+    """Per-call client options; bounds the HTTP timeout by the remaining request budget."""
+    deadline = current_deadline()
+    if deadline is None:
+        return {}
+    return {"request_options": {"timeout": deadline.remaining()}}
+
+
+def flight_key(model: Any, prompt: str) -> Tuple[Any, str]:
+    """Identical prompts to the same model share one in-flight call."""
+    return getattr(model, "model_name", None) or id(model), prompt
+
+
+def _counted(plan: Optional[Any], metrics: _LLMMetrics) -> Optional[Any]:
+    # Parse failures were already counted by _parse
+    if plan is not None:
+        metrics.ok.inc()
+    return plan
+
+
+def generate_json(model: Any, prompt: str, logger: Logger) -> Optional[Any]:
+    """Ask ``model`` for a JSON answer. Returns None when the caller should use its fallback."""
+    metrics = _metrics_for(logger)
+    if deadline_expired():
+        logger.warning("Request time budget spent; using fallback")
+        metrics.skipped.inc()
+        return None
+
+    def call() -> Optional[Any]:
+        start = time.perf_counter()
+        try:
+            try:
+                response = retry(lambda: model.generate_content(prompt, **request_options()))
+            finally:
+                metrics.seconds.observe(time.perf_counter() - start)
+            return _counted(_parse(response, logger), metrics)
+        except Exception as e:
+            logger.error(f"Gemini error: {e}; using fallback")
+            metrics.error.inc()
+            return None
+
+    return inflight.do(flight_key(model, prompt), call, timeout=remaining_budget())
+
+
+async def generate_json_async(model: Any, prompt: str, logger: Logger) -> Optional[Any]:
+    """Async counterpart of ``generate_json``; the blocking client call runs on the shared pool."""
+    metrics = _metrics_for(logger)
+    if deadline_expired():
+        logger.warning("Request time budget spent; using fallback")
+        metrics.skipped.inc()
+        return None
+
+    async def call() -> Optional[Any]:
+        start = time.perf_counter()
+        try:
+            try:
+                response = await retry_async(
+                    lambda: run_blocking(model.generate_content, prompt, **request_options())
+                )
+            finally:
+                metrics.seconds.observe(time.perf_counter() - start)
+            return _counted(_parse(response, logger), metrics)
+        except Exception as e:
+            logger.error(f"Gemini error: {e}; using fallback")
+            metrics.error.inc()
+            return None
+
+    return await inflight.do_async(flight_key(model, prompt), call, timeout=remaining_budget())
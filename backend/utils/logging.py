@@ -1,6 +1,220 @@
+"""Logger setup shared by every backend module.
+
+LOG_MODE picks how records reach stderr:
+
+* ``sync`` (default): written by the thread that logged them.
+* ``queue``: put on an in-memory queue and written by one ``QueueListener``
+  thread, so request handling never waits on stderr.
+
+LOG_FORMAT=json emits one JSON object per line, carrying the request ID
+bound by ``RequestIdMiddleware``. Per-logger sampling (LOG_SAMPLING) and
+token-bucket rate limits (LOG_RATE_LIMITS) thin out INFO/DEBUG records from
+hot paths; warnings and errors are always kept. Hot-path calls pass
+%-style arguments so a filtered record is never formatted.
+"""
+import atexit
+import contextvars
+import json
 import logging
 import os
-from typing import Optional
+import queue
+import random
+import threading
+import time
+import uuid
+from logging.handlers import QueueHandler, QueueListener
+from typing import Dict, List, Optional
+
+
+request_id_var: contextvars.ContextVar[str] = contextvars.ContextVar("clinix_request_id", default="-")
+
+TEXT_FORMAT = "%(asctime)s %(levelname)s [%(name)s] %(message)s"
+
+# Records per second for INFO chatter on request paths; used when LOG_RATE_LIMITS is unset
+DEFAULT_RATE_LIMITS = {
+    "backend.utils.google": 5.0,
+    "backend.agents.medical_record_planner_agent": 5.0,
+    "backend.agents.insurance_planning_agent": 5.0,
+    "backend.agents.appointment_planning_agent": 5.0,
+}
+
+
+class _RequestContext(logging.Filter):
+    # Runs on the logging thread, where the request's context variables are visible
+    def filter(self, record: logging.LogRecord) -> bool:
+        record.request_id = request_id_var.get()
+        return True
+
+
+class _Sampler(logging.Filter):
+    """Keeps a random ``rate`` fraction of a logger's records below WARNING."""
+
+    def __init__(self, rate: float):
+        super().__init__()
+        self.rate = rate
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        return record.levelno >= logging.WARNING or random.random() < self.rate
+
+
+class _RateLimiter(logging.Filter):
+    """Token bucket over a logger's records below WARNING.
+
+    The first record let through after a quiet spell carries ``suppressed``,
+    the number dropped since the previous one.
+    """
+
+    def __init__(self, per_second: float, clock=time.monotonic):
+        super().__init__()
+        self.per_second = per_second
+        self.burst = max(1.0, per_second)
+        self._clock = clock
+        self._tokens = self.burst
+        self._last = clock()
+        self._suppressed = 0
+        self._lock = threading.Lock()
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        if record.levelno >= logging.WARNING:
+            return True
+        with self._lock:
+            now = self._clock()
+            self._tokens = min(self.burst, self._tokens + (now - self._last) * self.per_second)
+            self._last = now
+            if self._tokens < 1:
+                self._suppressed += 1
+                return False
+            self._tokens -= 1
+            suppressed, self._suppressed = self._suppressed, 0
+        if suppressed:
+            record.suppressed = suppressed
+        return True
+
+
+class TextFormatter(logging.Formatter):
+    def __init__(self):
+        super().__init__(TEXT_FORMAT)
+
+    def formatMessage(self, record: logging.LogRecord) -> str:
+        text = super().formatMessage(record)
+        suppressed = getattr(record, "suppressed", 0)
+        return f"{text} ({suppressed} similar suppressed)" if suppressed else text
+
+
+# Attributes every LogRecord has; anything else came from ``extra=`` and goes into the JSON
+_RECORD_ATTRS = frozenset(vars(logging.LogRecord("", 0, "", 0, "", (), None))) | {"message", "asctime", "request_id", "suppressed"}
+
+
+class JsonFormatter(logging.Formatter):
+    def format(self, record: logging.LogRecord) -> str:
+        entry = {
+            "ts": time.strftime("%Y-%m-%dT%H:%M:%S", time.gmtime(record.created)) + f".{int(record.msecs):03d}Z",
+            "level": record.levelname,
+            "logger": record.name,
+            "message": record.getMessage(),
+            "request_id": getattr(record, "request_id", "-"),
+        }
+        suppressed = getattr(record, "suppressed", 0)
+        if suppressed:
+            entry["suppressed"] = suppressed
+        for key, value in vars(record).items():
+            if key not in _RECORD_ATTRS:
+                entry[key] = value
+        if record.exc_info:
+            entry["exc"] = self.formatException(record.exc_info)
+        if record.stack_info:
+            entry["stack"] = self.formatStack(record.stack_info)
+        return json.dumps(entry, ensure_ascii=False, default=str)
+
+
+class _LazyQueueHandler(QueueHandler):
+    """Enqueues records unformatted; timestamps, JSON and tracebacks are built by the listener.
+
+    The message text is rendered from its arguments here, so an argument
+    mutated after the call cannot change what is logged. When the queue is
+    full the record is dropped and counted rather than blocking the caller.
+    """
+
+    def __init__(self, records: queue.Queue):
+        super().__init__(records)
+        self.dropped = 0
+
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        # In-process queue: exc_info can stay attached, nothing is pickled
+        record.msg = record.getMessage()
+        record.args = None
+        return record
+
+    def enqueue(self, record: logging.LogRecord) -> None:
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            self.dropped += 1
+
+
+_setup_lock = threading.Lock()
+_handler: Optional[logging.Handler] = None
+_listener: Optional[QueueListener] = None
+
+
+def _shared_handler() -> logging.Handler:
+    global _handler, _listener
+    with _setup_lock:
+        if _handler is None:
+            stream = logging.StreamHandler()
+            stream.setFormatter(JsonFormatter() if os.getenv("LOG_FORMAT", "text").lower() == "json" else TextFormatter())
+            if os.getenv("LOG_MODE", "sync").lower() == "queue":
+                records: queue.Queue = queue.Queue(int(os.getenv("LOG_QUEUE_SIZE", "10000")))
+                handler: logging.Handler = _LazyQueueHandler(records)
+                _listener = QueueListener(records, stream, respect_handler_level=True)
+                _listener.start()
+                atexit.register(stop_logging)
+            else:
+                handler = stream
+            handler.addFilter(_RequestContext())
+            _handler = handler
+    return _handler
+
+
+def _parse_levels(raw: str) -> Dict[str, float]:
+    # "backend.utils.google=0.1,backend.agents=5" -> {name: value}
+    values: Dict[str, float] = {}
+    for item in raw.split(","):
+        name, sep, value = item.partition("=")
+        if not sep:
+            continue
+        try:
+            values[name.strip()] = float(value)
+        except ValueError:
+            continue
+    return values
+
+
+def _lookup(values: Dict[str, float], name: str) -> Optional[float]:
+    # Most specific dotted prefix wins, so "backend.agents" covers every agent
+    while name:
+        if name in values:
+            return values[name]
+        name = name.rpartition(".")[0]
+    return None
+
+
+def _filters_for(name: str) -> List[logging.Filter]:
+    filters: List[logging.Filter] = []
+    rate = _lookup(_parse_levels(os.getenv("LOG_SAMPLING", "")), name)
+    if rate is not None and rate < 1:
+        filters.append(_Sampler(max(0.0, rate)))
+    raw_limits = os.getenv("LOG_RATE_LIMITS")
+    if raw_limits is None:
+        limits = DEFAULT_RATE_LIMITS
+    elif raw_limits.strip().lower() in ("", "off", "none"):
+        limits = {}
+    else:
+        limits = _parse_levels(raw_limits)
+    limit = _lookup(limits, name)
+    if limit is not None and limit > 0:
+        filters.append(_RateLimiter(limit))
+    return filters
 
 
 def get_logger(name: Optional[str] = None) -> logging.Logger:
@@ -8,10 +222,64 @@ def get_logger(name: Optional[str] = None) -> logging.Logger:
     if not logger.handlers:
         level = os.getenv("LOG_LEVEL", "INFO").upper()
         logger.setLevel(level)
-        handler = logging.StreamHandler()
-        fmt = logging.Formatter("%(asctime)s %(levelname)s [%(name)s] %(message)s")
-        handler.setFormatter(fmt)
-        logger.addHandler(handler)
+        logger.addHandler(_shared_handler())
+        for log_filter in _filters_for(logger.name):
+            logger.addFilter(log_filter)
         logger.propagate = False
     return logger
 
+
+def stop_logging() -> None:
+    """Write out queued records and stop the listener thread (no-op in sync mode)."""
+    global _listener
+    with _setup_lock:
+        listener, _listener = _listener, None
+    if listener is not None:
+        try:
+            listener.stop()
+        except queue.Full:
+            # No room for the stop sentinel; the listener is a daemon thread anyway
+            pass
+
+
+def log_queue_depth() -> int:
+    """Records waiting for the listener thread; always 0 in sync mode."""
+    return _handler.queue.qsize() if isinstance(_handler, QueueHandler) else 0
+
+
+class RequestIdMiddleware:
+    """ASGI middleware binding each HTTP request to an ID for its log records.
+
+    A well-formed inbound ``X-Request-ID`` is reused, otherwise a new one is
+    generated; either way it is echoed on the response.
+    """
+
+    header = b"x-request-id"
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        request_id = ""
+        for key, value in scope.get("headers", ()):
+            if key == self.header:
+                candidate = value.decode("latin-1")
+                if 0 < len(candidate) <= 128 and candidate.isprintable():
+                    request_id = candidate
+                break
+        request_id = request_id or uuid.uuid4().hex
+        encoded = request_id.encode("latin-1")
+
+        async def send_with_id(message):
+            if message["type"] == "http.response.start":
+                message = {**message, "headers": [*message.get("headers", ()), (self.header, encoded)]}
+            await send(message)
+
+        token = request_id_var.set(request_id)
+        try:
+            await self.app(scope, receive, send_with_id)
+        finally:
+            request_id_var.reset(token)
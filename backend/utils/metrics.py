@@ -0,0 +1,249 @@
+"""Minimal Prometheus-compatible counters and histograms.
+
+Label children are created once (``metric.labels(...)`` is cached) and are
+meant to be bound at import time, so recording a value is a lock, a bisect
+and two additions: no objects are built per request. ``render()`` produces
+the Prometheus text exposition format served at ``/metrics``.
+"""
+import asyncio
+import functools
+import math
+import threading
+import time
+from bisect import bisect_left
+from typing import Callable, Dict, Iterable, List, Optional, Sequence, Tuple
+
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+# Seconds; spans in-memory lookups through multi-second Gemini calls
+DEFAULT_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _labels_text(names: Sequence[str], values: Sequence[str], extra: str = "") -> str:
+    parts = [f'{n}="{_escape(v)}"' for n, v in zip(names, values)]
+    if extra:
+        parts.append(extra)
+    return "{" + ",".join(parts) + "}" if parts else ""
+
+
+def _num(value: float) -> str:
+    if math.isinf(value):
+        return "+Inf" if value > 0 else "-Inf"
+    return repr(float(value)) if not float(value).is_integer() else str(int(value))
+
+
+class _Metric:
+    kind = "untyped"
+
+    def __init__(self, name: str, documentation: str, labelnames: Iterable[str] = (), registry: Optional["Registry"] = None):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._children: Dict[Tuple[str, ...], object] = {}
+        self._lock = threading.Lock()
+        (registry if registry is not None else REGISTRY).register(self)
+
+    def _new_child(self):
+        raise NotImplementedError
+
+    def labels(self, *values: str):
+        """Child for one label combination; create it once and keep the reference."""
+        child = self._children.get(values)
+        if child is None:
+            if len(values) != len(self.labelnames):
+                raise ValueError(f"{self.name} expects labels {self.labelnames}")
+            with self._lock:
+                child = self._children.setdefault(tuple(str(v) for v in values), self._new_child())
+        return child
+
+    def _unlabelled(self):
+        return self.labels()
+
+    def render(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} {self.kind}"]
+        for values, child in sorted(self._children.items()):
+            lines.extend(self._render_child(values, child))
+        return lines
+
+    def _render_child(self, values, child) -> List[str]:
+        raise NotImplementedError
+
+
+class _CounterChild:
+    __slots__ = ("_value", "_lock")
+
+    def __init__(self):
+        self._value = 0.0
+        self._lock = threading.Lock()
+
+    def inc(self, amount: float = 1.0) -> None:
+        with self._lock:
+            self._value += amount
+
+    @property
+    def value(self) -> float:
+        return self._value
+
+
+class Counter(_Metric):
+    kind = "counter"
+
+    def _new_child(self):
+        return _CounterChild()
+
+    def inc(self, amount: float = 1.0) -> None:
+        self._unlabelled().inc(amount)
+
+    def _render_child(self, values, child) -> List[str]:
+        return [f"{self.name}_total{_labels_text(self.labelnames, values)} {_num(child.value)}"]
+
+
+class _HistogramChild:
+    __slots__ = ("_bounds", "_counts", "_sum", "_lock")
+
+    def __init__(self, bounds: Tuple[float, ...]):
+        self._bounds = bounds
+        # Non-cumulative per-bucket counts; the last slot is +Inf
+        self._counts = [0] * (len(bounds) + 1)
+        self._sum = 0.0
+        self._lock = threading.Lock()
+
+    def observe(self, value: float) -> None:
+        i = bisect_left(self._bounds, value)
+        with self._lock:
+            self._counts[i] += 1
+            self._sum += value
+
+    def snapshot(self) -> Tuple[List[int], float]:
+        with self._lock:
+            return list(self._counts), self._sum
+
+
+class Histogram(_Metric):
+    kind = "histogram"
+
+    def __init__(self, name: str, documentation: str, labelnames: Iterable[str] = (), buckets: Sequence[float] = DEFAULT_BUCKETS, registry: Optional["Registry"] = None):
+        self.buckets = tuple(sorted(float(b) for b in buckets if not math.isinf(b)))
+        super().__init__(name, documentation, labelnames, registry)
+
+    def _new_child(self):
+        return _HistogramChild(self.buckets)
+
+    def observe(self, value: float) -> None:
+        self._unlabelled().observe(value)
+
+    def _render_child(self, values, child) -> List[str]:
+        counts, total = child.snapshot()
+        lines = []
+        cumulative = 0
+        for bound, count in zip(self.buckets + (math.inf,), counts):
+            cumulative += count
+            le = _labels_text(self.labelnames, values, f'le="{_num(bound)}"')
+            lines.append(f"{self.name}_bucket{le} {cumulative}")
+        labels = _labels_text(self.labelnames, values)
+        lines.append(f"{self.name}_sum{labels} {_num(total)}")
+        lines.append(f"{self.name}_count{labels} {cumulative}")
+        return lines
+
+
+class Gauge(_Metric):
+    """Value read from a callback at scrape time (queue depths, cache sizes)."""
+
+    kind = "gauge"
+
+    def set_function(self, fn: Callable[[], float], *values: str) -> None:
+        self._children[tuple(str(v) for v in values)] = fn
+
+    def _render_child(self, values, child) -> List[str]:
+        try:
+            value = float(child())
+        except Exception:
+            return []
+        return [f"{self.name}{_labels_text(self.labelnames, values)} {_num(value)}"]
+
+
+class Registry:
+    def __init__(self):
+        self._metrics: Dict[str, _Metric] = {}
+
+    def register(self, metric: _Metric) -> None:
+        if metric.name in self._metrics:
+            raise ValueError(f"metric {metric.name} already registered")
+        self._metrics[metric.name] = metric
+
+    def render(self) -> str:
+        lines: List[str] = []
+        for metric in self._metrics.values():
+            lines.extend(metric.render())
+        return "\n".join(lines) + "\n"
+
+
+REGISTRY = Registry()
+
+
+def timed(child: _HistogramChild):
+    """Decorator recording a function's wall time (sync or async) into a bound histogram child."""
+
+    def decorate(func):
+        if asyncio.iscoroutinefunction(func):
+            @functools.wraps(func)
+            async def async_wrapper(*args, **kwargs):
+                start = time.perf_counter()
+                try:
+                    return await func(*args, **kwargs)
+                finally:
+                    child.observe(time.perf_counter() - start)
+            return async_wrapper
+
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            start = time.perf_counter()
+            try:
+                return func(*args, **kwargs)
+            finally:
+                child.observe(time.perf_counter() - start)
+        return wrapper
+
+    return decorate
+
+
+# ---------- Pipeline metrics shared across modules ----------
+
+STAGE_SECONDS = Histogram(
+    "clinix_stage_seconds",
+    "Wall time of one orchestrator stage (loaders, planners, fallbacks, executors).",
+    ["stage"],
+)
+REQUEST_SECONDS = Histogram(
+    "clinix_request_seconds",
+    "Wall time of one orchestrator handler call, including every stage.",
+    ["handler"],
+)
+LLM_SECONDS = Histogram(
+    "clinix_llm_seconds",
+    "Wall time of Gemini calls made for a planner, including retries.",
+    ["agent"],
+)
+LLM_CALLS = Counter(
+    "clinix_llm_calls",
+    "Gemini JSON calls by outcome: ok, error, invalid_json or skipped (budget spent).",
+    ["agent", "outcome"],
+)
+RETRY_ATTEMPTS = Counter(
+    "clinix_retry_attempts",
+    "Attempts made by retry()/retry_async(), by result.",
+    ["result"],
+)
+RETRY_SLEEP_SECONDS = Counter(
+    "clinix_retry_sleep_seconds",
+    "Seconds spent sleeping between retry attempts.",
+)
+QUEUE_DEPTH = Gauge(
+    "clinix_queue_depth",
+    "Items waiting in a background queue (escalations, outbox, in-flight Gemini calls).",
+    ["queue"],
+)
@@ -0,0 +1,242 @@
+import json
+import os
+import random
+import sqlite3
+import threading
+import time
+from typing import Any, Callable, Dict, Optional
+
+from backend.utils.logging import get_logger
+
+
+logger = get_logger(__name__)
+
+Handler = Callable[[Dict[str, Any]], None]
+
+
+class Outbox:
+    """Durable SQLite queue of side effects, run by a background worker with retries.
+
+    ``enqueue`` records a job under an idempotency key and returns; enqueueing
+    a key that is already known is a no-op, so a retried request never sends
+    a second email. The worker claims due jobs by pushing their
+    ``next_attempt_at`` forward by ``lease_seconds``, so several worker
+    processes can share one file and a job whose worker died is picked up
+    again once the lease lapses. Failures back off exponentially (with
+    jitter) and give up after ``max_attempts``.
+
+    A job enqueued with a ``hold`` is kept back (status ``held``) until
+    ``confirm_held`` releases it to the worker; ``cancel_held``, or reaching
+    ``hold_until`` unconfirmed, cancels it without running it.
+    """
+
+    # Finished jobs are deleted this long after completion; it is also the idempotency window
+    retention_seconds = 7 * 24 * 3600
+
+    def __init__(
+        self,
+        path: str,
+        max_attempts: int = 8,
+        base_delay: float = 1.0,
+        max_delay: float = 300.0,
+        lease_seconds: float = 60.0,
+        poll_interval: float = 0.5,
+        batch_size: int = 20,
+        clock: Callable[[], float] = time.time,
+    ):
+        self.path = path
+        self.max_attempts = max_attempts
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.lease_seconds = lease_seconds
+        self.poll_interval = poll_interval
+        self.batch_size = batch_size
+        self._clock = clock
+        self._handlers: Dict[str, Handler] = {}
+        self._local = threading.local()
+        self._wake = threading.Event()
+        self._stopping = threading.Event()
+        self._worker: Optional[threading.Thread] = None
+        # Pending jobs as of the worker's last poll; read by the metrics gauge
+        self._pending = 0
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        conn = self._conn()
+        conn.execute(
+            """CREATE TABLE IF NOT EXISTS outbox (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                key TEXT NOT NULL UNIQUE,
+                kind TEXT NOT NULL,
+                payload TEXT NOT NULL,
+                status TEXT NOT NULL DEFAULT 'pending',
+                hold_key TEXT,
+                attempts INTEGER NOT NULL DEFAULT 0,
+                next_attempt_at REAL NOT NULL,
+                last_error TEXT,
+                created_at REAL NOT NULL,
+                updated_at REAL NOT NULL
+            )"""
+        )
+        conn.execute("CREATE INDEX IF NOT EXISTS outbox_due ON outbox (status, next_attempt_at)")
+        conn.execute("CREATE INDEX IF NOT EXISTS outbox_hold ON outbox (hold_key)")
+
+    def _conn(self) -> sqlite3.Connection:
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=5, isolation_level=None)
+            # WAL lets request threads enqueue while the worker updates rows
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+        return conn
+
+    def register(self, kind: str, handler: Handler) -> None:
+        self._handlers[kind] = handler
+
+    def enqueue(
+        self, kind: str, payload: Dict[str, Any], key: str, hold: Optional[str] = None, hold_until: Optional[float] = None
+    ) -> bool:
+        """Record a job; False when ``key`` was already enqueued."""
+        now = self._clock()
+        status, due = "pending", now
+        if hold is not None:
+            # A held job's due time is when its hold lapses
+            status, due = "held", hold_until if hold_until is not None else now + self.retention_seconds
+        cur = self._conn().execute(
+            "INSERT OR IGNORE INTO outbox (key, kind, payload, status, hold_key, next_attempt_at, created_at, updated_at) "
+            "VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+            (key, kind, json.dumps(payload), status, hold, due, now, now),
+        )
+        if cur.rowcount and hold is None:
+            self._wake.set()
+        return bool(cur.rowcount)
+
+    def confirm_held(self, hold: str) -> int:
+        """Hand the jobs kept back for ``hold`` to the worker; returns how many."""
+        now = self._clock()
+        released = self._conn().execute(
+            "UPDATE outbox SET status = 'pending', next_attempt_at = ?, updated_at = ? "
+            "WHERE hold_key = ? AND status = 'held'",
+            (now, now, hold),
+        ).rowcount
+        if released:
+            self._wake.set()
+        return released
+
+    def cancel_held(self, hold: str) -> int:
+        """Drop the jobs kept back for ``hold`` without running them; returns how many."""
+        return self._conn().execute(
+            "UPDATE outbox SET status = 'cancelled', updated_at = ? WHERE hold_key = ? AND status = 'held'",
+            (self._clock(), hold),
+        ).rowcount
+
+    # ---------- worker ----------
+
+    def start(self) -> None:
+        if self._worker is not None and self._worker.is_alive():
+            return
+        self._stopping.clear()
+        self._worker = threading.Thread(target=self._run, name="clinix-outbox", daemon=True)
+        self._worker.start()
+
+    def stop(self, timeout: float = 5.0) -> None:
+        self._stopping.set()
+        self._wake.set()
+        if self._worker is not None:
+            self._worker.join(timeout)
+            self._worker = None
+
+    def _run(self) -> None:
+        while not self._stopping.is_set():
+            try:
+                processed = self.run_pending()
+                if processed == self.batch_size:
+                    continue
+                self._purge()
+                self._pending = self._count_pending()
+            except sqlite3.Error as exc:
+                logger.warning(f"Outbox poll failed: {exc}")
+            self._wake.wait(self.poll_interval)
+            self._wake.clear()
+
+    def run_pending(self) -> int:
+        """Run due jobs once; returns how many were attempted."""
+        now = self._clock()
+        conn = self._conn()
+        rows = conn.execute(
+            "SELECT id, key, kind, payload, attempts, next_attempt_at FROM outbox "
+            "WHERE status = 'pending' AND next_attempt_at <= ? ORDER BY next_attempt_at LIMIT ?",
+            (now, self.batch_size),
+        ).fetchall()
+        attempted = 0
+        for job_id, key, kind, payload, attempts, due in rows:
+            # Claim by moving the due time; another worker that read the same row loses
+            claimed = conn.execute(
+                "UPDATE outbox SET next_attempt_at = ?, attempts = attempts + 1, updated_at = ? "
+                "WHERE id = ? AND status = 'pending' AND next_attempt_at = ?",
+                (now + self.lease_seconds, now, job_id, due),
+            ).rowcount
+            if claimed:
+                attempted += 1
+                self._execute(job_id, key, kind, json.loads(payload), attempts + 1)
+        return attempted
+
+    def _execute(self, job_id: int, key: str, kind: str, payload: Dict[str, Any], attempt: int) -> None:
+        conn = self._conn()
+        handler = self._handlers.get(kind)
+        try:
+            if handler is None:
+                raise LookupError(f"no handler registered for {kind!r}")
+            handler(payload)
+        except Exception as exc:
+            now = self._clock()
+            if attempt >= self.max_attempts:
+                logger.error(f"Outbox job {key} failed permanently after {attempt} attempts: {exc}")
+                conn.execute(
+                    "UPDATE outbox SET status = 'dead', last_error = ?, updated_at = ? WHERE id = ?",
+                    (str(exc), now, job_id),
+                )
+            else:
+                delay = random.uniform(0, min(self.max_delay, self.base_delay * 2 ** (attempt - 1)))
+                logger.warning(f"Outbox job {key} failed (attempt {attempt}); retrying in {delay:.1f}s: {exc}")
+                conn.execute(
+                    "UPDATE outbox SET next_attempt_at = ?, last_error = ?, updated_at = ? WHERE id = ?",
+                    (now + delay, str(exc), now, job_id),
+                )
+            return
+        conn.execute(
+            "UPDATE outbox SET status = 'done', last_error = NULL, updated_at = ? WHERE id = ?",
+            (self._clock(), job_id),
+        )
+
+    def _purge(self) -> None:
+        now = self._clock()
+        conn = self._conn()
+        # A hold that lapsed unconfirmed never sends anything
+        conn.execute(
+            "UPDATE outbox SET status = 'cancelled', updated_at = ? WHERE status = 'held' AND next_attempt_at <= ?",
+            (now, now),
+        )
+        conn.execute(
+            "DELETE FROM outbox WHERE status IN ('done', 'cancelled') AND updated_at < ?",
+            (now - self.retention_seconds,),
+        )
+
+    # ---------- introspection ----------
+
+    def depth(self) -> int:
+        """Pending jobs as of the worker's last poll; no SQLite query, safe on the event loop."""
+        return self._pending
+
+    def _count_pending(self) -> int:
+        return self._conn().execute("SELECT COUNT(*) FROM outbox WHERE status = 'pending'").fetchone()[0]
+
+    def stats(self) -> Dict[str, Any]:
+        counts = dict(self._conn().execute("SELECT status, COUNT(*) FROM outbox GROUP BY status").fetchall())
+        return {
+            "held": counts.get("held", 0),
+            "pending": counts.get("pending", 0),
+            "done": counts.get("done", 0),
+            "dead": counts.get("dead", 0),
+            "cancelled": counts.get("cancelled", 0),
+            "running": self._worker is not None and self._worker.is_alive(),
+        }
@@ -0,0 +1,209 @@
+import csv
+import hashlib
+import io
+import mmap
+import os
+import struct
+import time
+from array import array
+from bisect import bisect_left
+from collections.abc import Sequence
+from pathlib import Path
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+
+from backend.utils.logging import get_logger
+from backend.utils.records import PATIENT_ID_KEYS, FileVersion, _file_version, normalize_patient_id, patient_id_of
+
+
+logger = get_logger(__name__)
+
+# Next to the other backend caches, whatever the working directory
+DEFAULT_INDEX_DIR = Path(__file__).resolve().parents[1] / ".cache" / "record_index"
+
+# magic, source st_mtime_ns, source st_size, row count, indexed ID count
+_HEADER = struct.Struct("<8sqqQQ")
+_MAGIC = b"CLXIDX1\0"
+
+
+class MappedRecords(Sequence):
+    """Rows of a CSV spreadsheet read on demand from a memory map.
+
+    A sidecar index file holds the byte offset of every row and a sorted
+    table of patient-ID hashes, so ``get`` is a binary search plus parsing
+    one row. Both files are mapped rather than read, so resident memory does
+    not grow with the sheet. The sidecar is rebuilt when the CSV's mtime or
+    size no longer matches the one it was built from.
+
+    Indexing by position and ``get`` return the same dicts as
+    ``csv.DictReader``; each call parses the row again.
+    """
+
+    def __init__(self, path: str, index_path: str, version: FileVersion):
+        self.path = path
+        self.index_path = index_path
+        self.version = version
+        with open(path, "rb") as handle:
+            # mmap rejects a zero-length file; an empty sheet simply has no rows
+            empty = os.fstat(handle.fileno()).st_size == 0
+            self._data = None if empty else mmap.mmap(handle.fileno(), 0, access=mmap.ACCESS_READ)
+        with open(index_path, "rb") as handle:
+            self._index = mmap.mmap(handle.fileno(), 0, access=mmap.ACCESS_READ)
+
+        _, _, _, rows, ids = _HEADER.unpack_from(self._index)
+        view = memoryview(self._index)
+        start = _HEADER.size
+        # Row i spans offsets[i]:offsets[i + 1]
+        self._offsets = view[start:start + 8 * (rows + 1)].cast("Q")
+        start += 8 * (rows + 1)
+        self._keys = view[start:start + 8 * ids].cast("Q")
+        start += 8 * ids
+        self._rows = view[start:start + 4 * ids].cast("I")
+        self.columns = [] if self._data is None else _parse(self._data[:self._offsets[0]].decode("utf-8"))
+
+    @classmethod
+    def open(cls, path: str, version: Optional[FileVersion] = None, index_dir: Optional[str] = None) -> "MappedRecords":
+        """Map ``path``, building or refreshing its sidecar index first when needed."""
+        if version is None:
+            version = _file_version(path)
+        index_path = sidecar_path(path, index_dir)
+        if _sidecar_version(index_path) != version:
+            build_index(path, index_path, version)
+        return cls(path, index_path, version)
+
+    def __len__(self) -> int:
+        return len(self._offsets) - 1
+
+    def __getitem__(self, item):
+        if isinstance(item, slice):
+            return [self._row(i) for i in range(*item.indices(len(self)))]
+        if item < 0:
+            item += len(self)
+        if not 0 <= item < len(self):
+            raise IndexError("row index out of range")
+        return self._row(item)
+
+    def get(self, patient_id: Any, default: Any = None) -> Optional[Dict[str, Any]]:
+        """Row of ``patient_id`` (first one on duplicates), like ``patient_index(rows).get``."""
+        key = normalize_patient_id(patient_id)
+        if key is None:
+            return default
+        digest = _key_hash(key)
+        i = bisect_left(self._keys, digest)
+        # Equal hashes are verified against the row, so a collision cannot return the wrong patient
+        while i < len(self._keys) and self._keys[i] == digest:
+            row = self._row(self._rows[i])
+            if patient_id_of(row) == key:
+                return row
+            i += 1
+        return default
+
+    @property
+    def patient_index(self) -> "MappedRecords":
+        # The sidecar is the ID index; see records.patient_index
+        return self
+
+    def close(self) -> None:
+        for view in (self._offsets, self._keys, self._rows):
+            view.release()
+        self._index.close()
+        if self._data is not None:
+            self._data.close()
+
+    def _row(self, i: int) -> Dict[str, Any]:
+        start, end = self._offsets[i], self._offsets[i + 1]
+        # Reading past the end of a file truncated in place would kill the process with SIGBUS
+        if self._data is None or self._data.size() < end:
+            raise OSError(f"Spreadsheet {self.path} shrank while mapped; replace it atomically instead")
+        values = _parse(self._data[start:end].decode("utf-8"))
+        row: Dict[Any, Any] = dict(zip(self.columns, values))
+        # Same shape as csv.DictReader for short and long rows
+        if len(values) > len(self.columns):
+            row[None] = values[len(self.columns):]
+        for column in self.columns[len(values):]:
+            row[column] = None
+        return row
+
+
+def sidecar_path(path: str, index_dir: Optional[str] = None) -> str:
+    """Sidecar file for ``path``: named after the sheet plus a hash of its full path."""
+    directory = Path(index_dir) if index_dir else DEFAULT_INDEX_DIR
+    tag = hashlib.sha1(str(Path(path).resolve()).encode("utf-8")).hexdigest()[:12]
+    return str(directory / f"{Path(path).stem}-{tag}.idx")
+
+
+def build_index(path: str, index_path: str, version: FileVersion) -> None:
+    """Scan ``path`` once and write its row offsets and sorted ID hashes to ``index_path``."""
+    started = time.perf_counter()
+    offsets = array("Q")
+    hashes = array("Q")
+    row_numbers = array("I")
+    with open(path, "rb") as handle:
+        records = _records(handle)
+        header_end, header = next(records, (0, b""))
+        columns = _parse(header.decode("utf-8"))
+        id_columns = [(key, columns.index(key)) for key in PATIENT_ID_KEYS if key in columns]
+        offsets.append(header_end)
+        for end, raw in records:
+            if not raw.strip(b"\r\n"):
+                # csv.DictReader skips blank lines; fold them into the previous row's span
+                offsets[-1] = end
+                continue
+            values = _parse(raw.decode("utf-8"))
+            pid = patient_id_of({key: values[i] for key, i in id_columns if i < len(values)})
+            if pid is not None:
+                hashes.append(_key_hash(pid))
+                row_numbers.append(len(offsets) - 1)
+            offsets.append(end)
+
+    # Stable sort: on duplicate IDs the first row stays first, as in build_patient_index
+    order = sorted(range(len(hashes)), key=hashes.__getitem__)
+    keys = array("Q", (hashes[i] for i in order))
+    rows = array("I", (row_numbers[i] for i in order))
+    del hashes, row_numbers, order
+
+    Path(index_path).parent.mkdir(parents=True, exist_ok=True)
+    # Per-process temp name: several workers may rebuild the same sidecar at once
+    tmp = f"{index_path}.{os.getpid()}.tmp"
+    with open(tmp, "wb") as handle:
+        handle.write(_HEADER.pack(_MAGIC, version[0], version[1], len(offsets) - 1, len(keys)))
+        handle.write(offsets.tobytes())
+        handle.write(keys.tobytes())
+        handle.write(rows.tobytes())
+    os.replace(tmp, index_path)
+    logger.info(
+        "Indexed %d rows of %s in %.2fs (%s)", len(offsets) - 1, path, time.perf_counter() - started, index_path
+    )
+
+
+def _sidecar_version(index_path: str) -> Optional[FileVersion]:
+    try:
+        with open(index_path, "rb") as handle:
+            magic, mtime_ns, size, _, _ = _HEADER.unpack(handle.read(_HEADER.size))
+    except (OSError, struct.error):
+        return None
+    return (mtime_ns, size) if magic == _MAGIC else None
+
+
+def _records(handle) -> Iterator[Tuple[int, bytes]]:
+    """Yield (end offset, raw bytes) per CSV record; quoted fields may span lines."""
+    end = 0
+    parts: List[bytes] = []
+    quotes = 0
+    for line in handle:
+        parts.append(line)
+        end += len(line)
+        # Escaped quotes ("") come in pairs, so an odd count means a field is still open
+        quotes += line.count(b'"')
+        if quotes % 2 == 0:
+            yield end, b"".join(parts)
+            parts, quotes = [], 0
+    if parts:
+        yield end, b"".join(parts)
+
+
+def _parse(text: str) -> List[str]:
+    return next((row for row in csv.reader(io.StringIO(text, newline="")) if row), [])
+
+
+def _key_hash(patient_id: str) -> int:
+    return int.from_bytes(hashlib.blake2b(patient_id.encode("utf-8"), digest_size=8).digest(), "little")
@@ -0,0 +1,194 @@
+import os
+import threading
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+from backend.utils.google import load_sheet_records, resolve_sheet_path
+from backend.utils.logging import get_logger
+
+
+logger = get_logger(__name__)
+
+# (st_mtime_ns, st_size) of the file a snapshot was parsed from
+FileVersion = Tuple[int, int]
+
+# Column names used for the patient identifier across our CSVs and JSON fallbacks
+PATIENT_ID_KEYS = ("ID", "Patient ID", "patient_id", "PatientID", "id")
+
+
+class RecordSnapshot(list):
+    """Immutable-by-convention rows of one spreadsheet version.
+
+    Behaves like the plain ``list[dict]`` returned by ``load_sheet_records``;
+    indexes built from it are memoized with ``derive`` so they are computed
+    once per snapshot instead of once per request.
+    """
+
+    def __init__(self, rows: List[Dict[str, Any]], path: Optional[str] = None, version: Optional[FileVersion] = None):
+        super().__init__(rows)
+        self.path = path
+        self.version = version
+        self._derived: Dict[str, Any] = {}
+        # Reentrant: one builder may derive another index (compact skeleton -> field index)
+        self._derived_lock = threading.RLock()
+
+    def derive(self, key: str, builder: Callable[[List[Dict[str, Any]]], Any]) -> Any:
+        value = self._derived.get(key)
+        if value is None:
+            with self._derived_lock:
+                value = self._derived.get(key)
+                if value is None:
+                    value = builder(self)
+                    self._derived[key] = value
+        return value
+
+
+def derived(rows: List[Dict[str, Any]], key: str, builder: Callable[[List[Dict[str, Any]]], Any]) -> Any:
+    """Memoize ``builder(rows)`` on a snapshot; plain lists are indexed on the fly."""
+    if isinstance(rows, RecordSnapshot):
+        return rows.derive(key, builder)
+    return builder(rows)
+
+
+class _Entry:
+    __slots__ = ("snapshot", "reloading", "failed_version")
+
+    def __init__(self, snapshot: RecordSnapshot):
+        self.snapshot = snapshot
+        self.reloading = False
+        # Version whose reload failed; not retried until the file changes again
+        self.failed_version: Optional[FileVersion] = None
+
+
+class RecordSnapshotCache:
+    """Parse each spreadsheet once and keep it in memory.
+
+    Every ``get`` only stats the file. When its mtime or size changes the
+    sheet is re-parsed on a background thread while callers keep receiving
+    the previous snapshot; the new one is swapped in once it is complete.
+
+    ``factory(path, version)`` replaces the parse step, e.g. with
+    ``MappedRecords.open``; what it returns needs a ``version`` attribute.
+    """
+
+    def __init__(
+        self,
+        loader: Callable[[str], List[Dict[str, Any]]] = load_sheet_records,
+        factory: Optional[Callable[[str, FileVersion], Any]] = None,
+    ):
+        self._loader = loader
+        self._factory = factory or self._parse
+        self._entries: Dict[str, _Entry] = {}
+        self._lock = threading.Lock()
+        self._load_locks: Dict[str, threading.Lock] = {}
+        self._resolved: Dict[str, str] = {}
+
+    def get(self, path: str) -> RecordSnapshot:
+        resolved = self._resolved.get(path)
+        if resolved is None:
+            resolved = str(resolve_sheet_path(path))
+            self._resolved[path] = resolved
+        entry = self._entries.get(resolved)
+        try:
+            version = _file_version(resolved)
+        except OSError:
+            if entry is not None:
+                logger.warning(f"Spreadsheet {resolved} is unavailable; serving cached snapshot")
+                return entry.snapshot
+            raise
+
+        if entry is None:
+            return self._load_first(resolved, version)
+
+        if entry.snapshot.version != version and entry.failed_version != version:
+            self._schedule_reload(resolved, entry)
+        return entry.snapshot
+
+    def invalidate(self, path: Optional[str] = None) -> None:
+        with self._lock:
+            if path is None:
+                self._entries.clear()
+            else:
+                self._entries.pop(self._resolved.get(path) or str(resolve_sheet_path(path)), None)
+
+    def _load_first(self, resolved: str, version: FileVersion) -> RecordSnapshot:
+        # Concurrent first requests share one parse instead of each reading the file
+        with self._lock:
+            load_lock = self._load_locks.setdefault(resolved, threading.Lock())
+        with load_lock:
+            entry = self._entries.get(resolved)
+            if entry is not None:
+                return entry.snapshot
+            snapshot = self._factory(resolved, version)
+            with self._lock:
+                self._entries[resolved] = _Entry(snapshot)
+            return snapshot
+
+    def _parse(self, resolved: str, version: FileVersion) -> RecordSnapshot:
+        return RecordSnapshot(self._loader(resolved), path=resolved, version=version)
+
+    def _schedule_reload(self, resolved: str, entry: _Entry) -> None:
+        with self._lock:
+            if entry.reloading:
+                return
+            entry.reloading = True
+        thread = threading.Thread(
+            target=self._reload,
+            args=(resolved, entry),
+            name="clinix-snapshot-reload",
+            daemon=True,
+        )
+        thread.start()
+
+    def _reload(self, resolved: str, entry: _Entry) -> None:
+        version = None
+        try:
+            # Stat before parsing so a write that races the read triggers another reload
+            version = _file_version(resolved)
+            snapshot = self._factory(resolved, version)
+            with self._lock:
+                self._entries[resolved] = _Entry(snapshot)
+        except Exception as exc:
+            entry.failed_version = version
+            logger.error(f"Failed to reload spreadsheet {resolved}: {exc}; keeping previous snapshot")
+        finally:
+            entry.reloading = False
+
+
+def _file_version(path: str) -> FileVersion:
+    st = os.stat(path)
+    return st.st_mtime_ns, st.st_size
+
+
+def normalize_patient_id(value: Any) -> Optional[str]:
+    if value is None:
+        return None
+    text = str(value).strip()
+    return text or None
+
+
+def patient_id_of(row: Dict[str, Any]) -> Optional[str]:
+    """Return the normalized patient ID of a row, whichever supported column holds it."""
+    for key in PATIENT_ID_KEYS:
+        pid = normalize_patient_id(row.get(key))
+        if pid is not None:
+            return pid
+    return None
+
+
+def build_patient_index(rows: List[Dict[str, Any]]) -> Dict[str, Dict[str, Any]]:
+    """Map normalized patient ID -> row. The first row wins on duplicate IDs."""
+    index: Dict[str, Dict[str, Any]] = {}
+    for row in rows:
+        pid = patient_id_of(row)
+        if pid is not None and pid not in index:
+            index[pid] = row
+    return index
+
+
+def patient_index(rows: List[Dict[str, Any]]) -> Dict[str, Dict[str, Any]]:
+    """Patient ID index for ``rows``, built once per snapshot."""
+    # Stores with their own on-disk index (record_store.MappedRecords) hand it out directly
+    index = getattr(rows, "patient_index", None)
+    if index is not None:
+        return index
+    return derived(rows, "patient_index", build_patient_index)
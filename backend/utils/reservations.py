@@ -0,0 +1,179 @@
+import threading
+import time
+import uuid
+from bisect import bisect_left
+from contextlib import contextmanager
+from datetime import date, datetime, timedelta, timezone
+from typing import Callable, Dict, Iterator, List, Optional
+
+
+class Hold:
+    """A provisional (or, once confirmed, permanent) claim on one time slot."""
+
+    __slots__ = ("hold_id", "start", "end", "holder", "expires_at", "confirmed")
+
+    def __init__(self, hold_id: str, start: datetime, end: datetime, holder: str, expires_at: float):
+        self.hold_id = hold_id
+        self.start = start
+        self.end = end
+        self.holder = holder
+        self.expires_at = expires_at
+        self.confirmed = False
+
+    def to_dict(self) -> dict:
+        return {
+            "hold_id": self.hold_id,
+            "holder": self.holder,
+            "start": self.start.isoformat(),
+            "end": self.end.isoformat(),
+            "confirmed": self.confirmed,
+            "expires_at": None if self.confirmed else datetime.fromtimestamp(self.expires_at, timezone.utc).isoformat(),
+        }
+
+
+class _DayBook:
+    __slots__ = ("lock", "starts", "holds", "retired")
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        # Non-overlapping holds of one day, sorted by start; ``starts`` mirrors them for bisect
+        self.starts: List[datetime] = []
+        self.holds: List[Hold] = []
+        # Set under ``lock`` when the empty book is dropped from the ledger
+        self.retired = False
+
+
+class ReservationLedger:
+    """In-process ledger of slot holds with TTL expiry.
+
+    Each calendar day has its own lock, so concurrent requests for different
+    days never contend, and check-and-reserve on one day is atomic. Whenever
+    a new day is added, expired provisional holds on the other days are
+    purged and day books left empty are dropped; confirmed holds are kept.
+    """
+
+    def __init__(self, ttl_seconds: float = 600, padding: timedelta = timedelta(), clock: Callable[[], float] = time.time):
+        self.ttl_seconds = ttl_seconds
+        self.padding = padding
+        self._clock = clock
+        self._days: Dict[date, _DayBook] = {}
+        self._index: Dict[str, Hold] = {}
+        self._lock = threading.Lock()
+
+    def try_reserve(self, start: datetime, end: datetime, holder: str, ttl_seconds: Optional[float] = None) -> Optional[Hold]:
+        """Atomically hold [start, end) unless it collides with a live hold. Returns None on conflict."""
+        now = self._clock()
+        with self._locked_book(start.date()) as book:
+            self._purge(book, now)
+            i = bisect_left(book.starts, start)
+            if i > 0 and book.holds[i - 1].end + self.padding > start:
+                return None
+            if i < len(book.holds) and book.holds[i].start < end + self.padding:
+                return None
+            hold = Hold(uuid.uuid4().hex, start, end, holder, now + (ttl_seconds or self.ttl_seconds))
+            book.starts.insert(i, start)
+            book.holds.insert(i, hold)
+            # Indexed before the day lock is released, so get()/confirm() see it at once
+            with self._lock:
+                self._index[hold.hold_id] = hold
+        return hold
+
+    def is_free(self, start: datetime, end: datetime) -> bool:
+        book = self._days.get(start.date())
+        if book is None:
+            return True
+        with book.lock:
+            self._purge(book, self._clock())
+            i = bisect_left(book.starts, start)
+            if i > 0 and book.holds[i - 1].end + self.padding > start:
+                return False
+            return not (i < len(book.holds) and book.holds[i].start < end + self.padding)
+
+    def confirm(self, hold_id: str) -> Optional[Hold]:
+        """Turn a live provisional hold into a permanent booking."""
+        hold = self._index.get(hold_id)
+        if hold is None:
+            return None
+        book = self._book(hold.start.date())
+        with book.lock:
+            self._purge(book, self._clock())
+            if hold_id not in self._index:
+                return None
+            hold.confirmed = True
+        return hold
+
+    def release(self, hold_id: str) -> bool:
+        hold = self._index.get(hold_id)
+        if hold is None:
+            return False
+        book = self._book(hold.start.date())
+        with book.lock:
+            self._remove(book, hold)
+        return True
+
+    def get(self, hold_id: str) -> Optional[Hold]:
+        hold = self._index.get(hold_id)
+        if hold is not None and not hold.confirmed and hold.expires_at <= self._clock():
+            return None
+        return hold
+
+    def holds_on(self, day: date) -> List[Hold]:
+        book = self._days.get(day)
+        if book is None:
+            return []
+        with book.lock:
+            self._purge(book, self._clock())
+            return list(book.holds)
+
+    def _book(self, day: date) -> _DayBook:
+        book = self._days.get(day)
+        if book is None:
+            with self._lock:
+                book = self._days.get(day)
+                added = book is None
+                if added:
+                    book = self._days[day] = _DayBook()
+            if added:
+                self._prune(keep=day)
+        return book
+
+    @contextmanager
+    def _locked_book(self, day: date) -> Iterator[_DayBook]:
+        # A book retired between lookup and locking is empty and unlisted; use the current one
+        while True:
+            book = self._book(day)
+            with book.lock:
+                if not book.retired:
+                    yield book
+                    return
+
+    def _prune(self, keep: date) -> None:
+        now = self._clock()
+        with self._lock:
+            books = [(day, book) for day, book in self._days.items() if day != keep]
+        for day, book in books:
+            with book.lock:
+                self._purge(book, now)
+                if book.holds or book.retired:
+                    continue
+                book.retired = True
+                with self._lock:
+                    if self._days.get(day) is book:
+                        del self._days[day]
+
+    def _purge(self, book: _DayBook, now: float) -> None:
+        # Caller holds book.lock
+        expired = [h for h in book.holds if not h.confirmed and h.expires_at <= now]
+        for hold in expired:
+            self._remove(book, hold)
+
+    def _remove(self, book: _DayBook, hold: Hold) -> None:
+        # Caller holds book.lock
+        try:
+            i = book.holds.index(hold)
+        except ValueError:
+            return
+        del book.holds[i]
+        del book.starts[i]
+        with self._lock:
+            self._index.pop(hold.hold_id, None)
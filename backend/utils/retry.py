@@ -1,5 +1,84 @@
+import asyncio
+import random
 import time
-from typing import Callable, Type, Tuple, Any
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Awaitable, Callable, Iterator, Optional, Type, Tuple, Any
+
+from backend.utils.metrics import RETRY_ATTEMPTS, RETRY_SLEEP_SECONDS
+
+_ATTEMPT_OK = RETRY_ATTEMPTS.labels("ok")
+_ATTEMPT_FAILED = RETRY_ATTEMPTS.labels("error")
+_RETRY_SLEEP = RETRY_SLEEP_SECONDS.labels()
+
+
+class DeadlineExceeded(TimeoutError):
+    """Raised when the per-request time budget is spent before a call could finish."""
+
+
+class Deadline:
+    """Absolute point in (monotonic) time by which a request must be done."""
+
+    def __init__(self, seconds: float):
+        self.expires_at = time.monotonic() + seconds
+
+    def remaining(self) -> float:
+        return max(0.0, self.expires_at - time.monotonic())
+
+    @property
+    def expired(self) -> bool:
+        return time.monotonic() >= self.expires_at
+
+
+_current_deadline: ContextVar[Optional[Deadline]] = ContextVar("clinix_deadline", default=None)
+
+
+def current_deadline() -> Optional[Deadline]:
+    return _current_deadline.get()
+
+
+def remaining_budget() -> Optional[float]:
+    """Seconds left in the current deadline scope, or None when unbounded."""
+    deadline = _current_deadline.get()
+    return None if deadline is None else deadline.remaining()
+
+
+def deadline_expired() -> bool:
+    deadline = _current_deadline.get()
+    return deadline is not None and deadline.expired
+
+
+@contextmanager
+def deadline_scope(seconds: Optional[float]) -> Iterator[Optional[Deadline]]:
+    """Share one deadline with every retry/LLM call made inside the block.
+
+    Nested scopes never extend an outer deadline. ``None`` leaves the current
+    deadline (if any) untouched.
+    """
+    outer = _current_deadline.get()
+    if seconds is None:
+        yield outer
+        return
+    deadline = Deadline(seconds)
+    if outer is not None and outer.expires_at < deadline.expires_at:
+        deadline = outer
+    token = _current_deadline.set(deadline)
+    try:
+        yield deadline
+    finally:
+        try:
+            _current_deadline.reset(token)
+        except ValueError:
+            # An async generator holding the scope was finalized from another context
+            pass
+
+
+def _next_sleep(delay: float, jitter: bool, deadline: Optional[Deadline]) -> Optional[float]:
+    # Full jitter: sleep anywhere in [0, delay] so synchronized clients spread out
+    sleep = random.uniform(0, delay) if jitter else delay
+    if deadline is not None and sleep >= deadline.remaining():
+        return None
+    return sleep
 
 
 def retry(
@@ -8,18 +87,78 @@ def retry(
     delay: float = 0.5,
     backoff: float = 2.0,
     retry_on: Tuple[Type[BaseException], ...] = (Exception,),
+    jitter: bool = True,
+    deadline: Optional[Deadline] = None,
 ):
+    deadline = deadline or current_deadline()
     last_exc = None
     for i in range(attempts):
+        if deadline is not None and deadline.expired:
+            raise last_exc or DeadlineExceeded("Request time budget exhausted")
         try:
-            return func()
+            result = func()
+            _ATTEMPT_OK.inc()
+            return result
         except retry_on as exc:
+            _ATTEMPT_FAILED.inc()
             last_exc = exc
             if i == attempts - 1:
                 break
-            time.sleep(delay)
+            sleep = _next_sleep(delay, jitter, deadline)
+            if sleep is None:
+                break
+            _RETRY_SLEEP.inc(sleep)
+            time.sleep(sleep)
             delay *= backoff
     if last_exc:
         raise last_exc
     return None
 
+
+async def retry_async(
+    func: Callable[[], Awaitable[Any]],
+    attempts: int = 3,
+    delay: float = 0.5,
+    backoff: float = 2.0,
+    retry_on: Tuple[Type[BaseException], ...] = (Exception,),
+    jitter: bool = True,
+    deadline: Optional[Deadline] = None,
+):
+    """Same contract as ``retry`` but awaits ``func`` and sleeps without blocking the loop.
+
+    Each attempt is also cut off once the deadline passes.
+    """
+    deadline = deadline or current_deadline()
+    last_exc = None
+    for i in range(attempts):
+        if deadline is not None and deadline.expired:
+            raise last_exc or DeadlineExceeded("Request time budget exhausted")
+        try:
+            if deadline is None:
+                result = await func()
+            else:
+                try:
+                    result = await asyncio.wait_for(func(), timeout=deadline.remaining())
+                except asyncio.TimeoutError:
+                    if not deadline.expired:
+                        raise
+                    raise DeadlineExceeded("Request time budget exhausted") from None
+            _ATTEMPT_OK.inc()
+            return result
+        except DeadlineExceeded:
+            _ATTEMPT_FAILED.inc()
+            raise
+        except retry_on as exc:
+            _ATTEMPT_FAILED.inc()
+            last_exc = exc
+            if i == attempts - 1:
+                break
+            sleep = _next_sleep(delay, jitter, deadline)
+            if sleep is None:
+                break
+            _RETRY_SLEEP.inc(sleep)
+            await asyncio.sleep(sleep)
+            delay *= backoff
+    if last_exc:
+        raise last_exc
+    return None
@@ -0,0 +1,154 @@
+from bisect import bisect_left, bisect_right
+from datetime import date, datetime, time as dtime, timedelta, tzinfo
+from typing import Iterator, List, NamedTuple, Optional, Sequence, Tuple
+
+
+Interval = Tuple[datetime, datetime]
+
+
+class SchedulingRules(NamedTuple):
+    """Clinic constraints applied when turning a calendar into free time."""
+
+    work_start: dtime = dtime(hour=8)
+    work_end: dtime = dtime(hour=17)
+    lunch: Optional[Tuple[dtime, dtime]] = (dtime(hour=12), dtime(hour=13))
+    # Minimum gap kept between an existing event and a new booking
+    padding: timedelta = timedelta(minutes=15)
+    weekends: bool = False
+    horizon_days: int = 14
+
+
+def localize(tz: tzinfo, naive: datetime) -> datetime:
+    # pytz zones need localize() to pick the right UTC offset; zoneinfo zones do not
+    loc = getattr(tz, "localize", None)
+    return loc(naive) if loc is not None else naive.replace(tzinfo=tz)
+
+
+def format_slot(start: datetime, end: datetime) -> dict:
+    return {
+        "date": start.strftime("%Y-%m-%d"),
+        "start_time": start.strftime("%H:%M"),
+        "end_time": end.strftime("%H:%M"),
+    }
+
+
+def format_slot_key(plan: dict) -> Tuple[str, str, str]:
+    return plan.get("date"), plan.get("start_time"), plan.get("end_time")
+
+
+def parse_slot(plan: dict, tz: tzinfo) -> Optional[Interval]:
+    """Inverse of ``format_slot``; None when the plan is not a well-formed slot."""
+    try:
+        day = datetime.strptime(str(plan["date"]), "%Y-%m-%d").date()
+        start = datetime.strptime(str(plan["start_time"]), "%H:%M").time()
+        end = datetime.strptime(str(plan["end_time"]), "%H:%M").time()
+    except (KeyError, TypeError, ValueError):
+        return None
+    return localize(tz, datetime.combine(day, start)), localize(tz, datetime.combine(day, end))
+
+
+def merge_intervals(intervals: Sequence[Interval]) -> List[Interval]:
+    merged: List[Interval] = []
+    for s, e in sorted(intervals, key=lambda x: x[0]):
+        if not merged or s > merged[-1][1]:
+            merged.append((s, e))
+        else:
+            merged[-1] = (merged[-1][0], max(merged[-1][1], e))
+    return merged
+
+
+class FreeBusyIndex:
+    """Sorted free intervals over ``rules.horizon_days`` days starting at ``start_day``.
+
+    Built once per calendar version; queries bisect to the first free
+    interval after the requested time and walk forward from there.
+    """
+
+    def __init__(self, events: Sequence[Interval], tz: tzinfo, start_day: date, rules: SchedulingRules = SchedulingRules()):
+        self.tz = tz
+        self.rules = rules
+        self.start_day = start_day
+        pad = rules.padding
+        busy = merge_intervals([(s - pad, e + pad) for s, e in events])
+        busy_starts = [s for s, _ in busy]
+
+        starts: List[datetime] = []
+        ends: List[datetime] = []
+        for offset in range(max(1, rules.horizon_days)):
+            day = start_day + timedelta(days=offset)
+            if not rules.weekends and day.weekday() >= 5:
+                continue
+            work_start = localize(tz, datetime.combine(day, rules.work_start))
+            work_end = localize(tz, datetime.combine(day, rules.work_end))
+
+            # Busy intervals overlapping this working day (they are merged, so sorted by both ends)
+            blocked: List[Interval] = []
+            i = max(0, bisect_left(busy_starts, work_start) - 1)
+            while i < len(busy) and busy[i][0] < work_end:
+                s, e = busy[i]
+                if e > work_start:
+                    blocked.append((max(work_start, s), min(work_end, e)))
+                i += 1
+            if rules.lunch is not None:
+                blocked.append((
+                    localize(tz, datetime.combine(day, rules.lunch[0])),
+                    localize(tz, datetime.combine(day, rules.lunch[1])),
+                ))
+
+            cursor = work_start
+            for s, e in merge_intervals(blocked):
+                if cursor < s:
+                    starts.append(cursor)
+                    ends.append(s)
+                cursor = max(cursor, e)
+            if cursor < work_end:
+                starts.append(cursor)
+                ends.append(work_end)
+
+        self._starts = starts
+        self._ends = ends
+
+    @property
+    def horizon_end(self) -> datetime:
+        day = self.start_day + timedelta(days=max(1, self.rules.horizon_days))
+        return localize(self.tz, datetime.combine(day, dtime()))
+
+    def free_intervals(self) -> List[Interval]:
+        return list(zip(self._starts, self._ends))
+
+    def iter_slots(
+        self,
+        duration: timedelta,
+        after: Optional[datetime] = None,
+        step: Optional[timedelta] = None,
+    ) -> Iterator[Interval]:
+        """Yield slots of ``duration`` in time order, starting no earlier than ``after``.
+
+        Consecutive slots inside one free interval are ``step`` apart
+        (default: duration plus padding, so yielded slots never collide).
+        """
+        step = step or duration + self.rules.padding
+        i = 0 if after is None else bisect_right(self._ends, after)
+        while i < len(self._starts):
+            start = self._starts[i] if after is None else max(self._starts[i], after)
+            end = self._ends[i]
+            while start + duration <= end:
+                yield start, start + duration
+                start += step
+            i += 1
+
+    def next_slots(self, duration: timedelta, after: Optional[datetime] = None, count: int = 1) -> List[Interval]:
+        """The ``count`` earliest slots of ``duration`` at or after ``after``."""
+        slots: List[Interval] = []
+        if count <= 0:
+            return slots
+        for slot in self.iter_slots(duration, after):
+            slots.append(slot)
+            if len(slots) >= count:
+                break
+        return slots
+
+    def is_free(self, start: datetime, end: datetime) -> bool:
+        """True when [start, end) lies inside a single free interval."""
+        i = bisect_right(self._starts, start) - 1
+        return i >= 0 and self._ends[i] >= end
@@ -0,0 +1,18 @@
+import sys
+from pathlib import Path
+
+import pytest
+
+# Tests import the app as ``backend.*`` from the repository root
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+
+
+@pytest.fixture
+def app_env(tmp_path, monkeypatch):
+    """Keep the app's SQLite files and journals out of backend/.cache and Gemini offline."""
+    monkeypatch.setenv("APPOINTMENT_OUTBOX_PATH", "")
+    monkeypatch.setenv("INSURANCE_CACHE_PATH", "")
+    monkeypatch.setenv("ESCALATION_JOURNAL_PATH", str(tmp_path / "escalations.jsonl"))
+    for name in ("GEMINI_API_KEY", "GOOGLE_API_KEY", "GENAI_API_KEY", "GOOGLE_GENAI_API_KEY", "GOOGLEAI_API_KEY"):
+        monkeypatch.delenv(name, raising=False)
+    return tmp_path
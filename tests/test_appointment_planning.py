@@ -0,0 +1,48 @@
+import json
+import re
+
+import pytest
+
+from backend.agents.appointment_planning_agent import AppointmentPlannerAgent
+
+ARGS = ("AppointmentSkeletonCalendar.ics", 1.5, "America/New_York", ["12:00", "13:00"])
+
+
+class Response:
+    def __init__(self, text):
+        self.text = text
+
+
+class Model:
+    def __init__(self, reply):
+        self.reply = reply
+
+    def generate_content(self, prompt, **kwargs):
+        return Response(json.dumps(self.reply(prompt)))
+
+
+def offered(prompt):
+    return json.loads(re.search(r"available: (\[.*?\])\n", prompt, re.S).group(1))
+
+
+@pytest.fixture
+def planner():
+    return AppointmentPlannerAgent(api_key="")
+
+
+def test_default_mode_is_deterministic(planner):
+    assert planner.mode == "deterministic"
+
+
+def test_preferences_can_pick_another_offered_slot(planner):
+    base = planner.plan_slot(*ARGS)
+    planner.model = Model(lambda prompt: offered(prompt)[1])
+    refined = planner.plan_slot(*ARGS, preferences="later please")
+    assert (refined["date"], refined["start_time"]) != (base["date"], base["start_time"])
+
+
+def test_slot_that_was_not_offered_is_rejected(planner):
+    base = planner.plan_slot(*ARGS)
+    # Free and within the rules, but weeks past anything offered
+    planner.model = Model(lambda prompt: {"date": "2025-03-04", "start_time": "09:00", "end_time": "10:30"})
+    assert planner.plan_slot(*ARGS, preferences="March") == base
@@ -0,0 +1,39 @@
+import threading
+
+from backend.utils.cache import SqliteCache
+
+
+class Clock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self) -> float:
+        return self.now
+
+
+def test_expired_rows_are_swept_every_n_writes(tmp_path):
+    clock = Clock()
+    cache = SqliteCache(str(tmp_path / "cache.db"), max_age=60, clock=clock)
+    cache.sweep_every = 3
+    cache.set("old", 1)
+    clock.now += 120
+    cache.set("a", 2)
+    assert cache._conn().execute("SELECT COUNT(*) FROM cache").fetchone()[0] == 2
+    cache.set("b", 3)
+    keys = {row[0] for row in cache._conn().execute("SELECT key FROM cache")}
+    assert keys == {"a", "b"}
+
+
+def test_concurrent_writes_are_all_counted(tmp_path):
+    cache = SqliteCache(str(tmp_path / "cache.db"))
+
+    def write(n):
+        for i in range(50):
+            cache.set(f"{n}-{i}", i)
+
+    workers = [threading.Thread(target=write, args=(n,)) for n in range(8)]
+    for worker in workers:
+        worker.start()
+    for worker in workers:
+        worker.join()
+    assert cache._writes == 400
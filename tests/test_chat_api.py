@@ -0,0 +1,36 @@
+from fastapi.testclient import TestClient
+
+
+class Chunk:
+    def __init__(self, text):
+        self.text = text
+
+
+class CutOffModel:
+    """Streams one chunk, then fails like a dropped Gemini connection."""
+
+    def generate_content(self, prompt, stream=False, **kwargs):
+        if not stream:
+            return Chunk("Drink water and rest.")
+        return self._stream()
+
+    def _stream(self):
+        yield Chunk("Drink plenty of water and rest because dehydration ")
+        raise ConnectionResetError("connection reset")
+
+
+def test_cut_off_stream_sends_error_and_is_not_served_from_cache(app_env, monkeypatch):
+    from backend.api import main
+
+    with TestClient(main.app) as client:
+        wrapper = main.app.state.orchestrator.knowledge.llm_model
+        # Stands in for the model the registry would pick
+        monkeypatch.setattr(type(wrapper), "model", CutOffModel())
+
+        body = client.post("/chat/stream", json={"message": "How much water should I drink?"}).text
+        assert "event: error" in body
+        assert "event: done" not in body
+
+        reply = client.post("/chat", json={"message": "How much water should I drink?"}).json()
+        assert reply["message"] == "Drink water and rest."
+        assert main.app.state.orchestrator.knowledge.cache.stats()["hits"] == 0
@@ -0,0 +1,101 @@
+import asyncio
+
+import pytest
+
+from backend.agents.knowledge_agent import KnowledgeAgent, question_key
+from backend.utils.cache import AnswerCache
+from backend.utils.llm import StreamInterrupted
+
+
+class StreamingModel:
+    def __init__(self, chunks, error=None):
+        self.chunks = chunks
+        self.error = error
+
+    async def generate_response_stream(self, query, instruction):
+        for chunk in self.chunks:
+            yield chunk
+        if self.error is not None:
+            raise self.error
+
+
+def make_agent(model):
+    escalations = []
+    agent = KnowledgeAgent(
+        model,
+        lambda query, reason: escalations.append(reason),
+        cache=AnswerCache(maxsize=10, ttl=60),
+    )
+    return agent, escalations
+
+
+def collect(agent, query):
+    async def run():
+        return [event async for event in agent.stream_general_advice(query)]
+
+    return asyncio.run(run())
+
+
+def streamed_text(events):
+    return "".join(data["text"] for name, data in events if name == "token")
+
+
+def test_complete_answer_is_streamed_and_cached():
+    agent, _ = make_agent(StreamingModel(["Drink water ", "and rest."]))
+    events = collect(agent, "How much water?")
+    assert events[-1] == ("done", {"message": "Drink water and rest."})
+    assert streamed_text(events) == "Drink water and rest."
+    assert agent.cache.get(question_key("How much water?")) == "Drink water and rest."
+
+
+def test_uncertainty_mid_stream_stops_with_escalation():
+    agent, escalations = make_agent(StreamingModel(["Well, ", "I don't know", " what to say about that"]))
+    events = collect(agent, "What is this rash?")
+    assert events[-1][0] == "escalation"
+    assert "done" not in [name for name, _ in events]
+    # The held-back text means the uncertain phrase itself never reaches the client
+    assert "I don't know" not in streamed_text(events)
+    assert escalations == ["LLM uncertainty"]
+    assert agent.cache.stats()["stores"] == 0
+
+
+def test_emergency_question_never_calls_the_model():
+    agent, escalations = make_agent(StreamingModel(["unused"], error=AssertionError("called")))
+    events = collect(agent, "I have chest pain")
+    assert events == [("escalation", {"reason": "Emergency keyword detected", "message": KnowledgeAgent.URGENT_MESSAGE})]
+    assert escalations == ["Emergency keyword detected"]
+
+
+@pytest.mark.parametrize("question", [
+    "How do I lower my risk of stroke?",
+    "What are the symptoms of appendicitis?",
+    "What are the warning signs of a heart attack?",
+    "How long do concussion symptoms last?",
+    "How is sepsis treated?",
+    "How do blood clots form?",
+])
+def test_questions_about_conditions_reach_the_model(question):
+    agent, escalations = make_agent(StreamingModel(["General information."]))
+    events = collect(agent, question)
+    assert events[-1] == ("done", {"message": "General information."})
+    assert escalations == []
+
+
+@pytest.mark.parametrize("question", [
+    "I think I'm having a stroke",
+    "My face is drooping and my arm is weak",
+    "I think I have appendicitis, the pain is terrible",
+    "I think I have a blood clot in my leg",
+])
+def test_first_person_emergencies_are_screened(question):
+    agent, escalations = make_agent(StreamingModel(["unused"], error=AssertionError("called")))
+    assert collect(agent, question)[-1][0] == "escalation"
+    assert escalations == ["Emergency keyword detected"]
+
+
+def test_interrupted_stream_ends_with_error_and_is_not_cached():
+    agent, _ = make_agent(StreamingModel(["Drink plenty of water and rest because dehydration "], error=StreamInterrupted("boom")))
+    events = collect(agent, "How much water?")
+    assert events[-1] == ("error", {"detail": KnowledgeAgent.INTERRUPTED_MESSAGE})
+    assert "done" not in [name for name, _ in events]
+    assert agent.cache.stats()["stores"] == 0
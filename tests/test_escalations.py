@@ -0,0 +1,69 @@
+import json
+import os
+import subprocess
+import sys
+import time
+
+import pytest
+
+from backend.utils.escalations import EscalationQueue
+
+
+def add(escalation_id: str) -> str:
+    return json.dumps({"op": "add", "escalation_id": escalation_id, "query": escalation_id, "reason": "r", "created_at": 1}) + "\n"
+
+
+def wait_for(predicate, seconds: float = 5.0) -> None:
+    deadline = time.monotonic() + seconds
+    while not predicate() and time.monotonic() < deadline:
+        time.sleep(0.01)
+
+
+def test_submit_does_not_touch_the_journal(tmp_path):
+    queue = EscalationQueue(sink=lambda batch: None, journal_path=str(tmp_path / "esc.jsonl"))
+    size = os.path.getsize(queue.journal_path)
+    assert queue.submit("help", "r")
+    assert os.path.getsize(queue.journal_path) == size
+    queue.stop()
+    assert "help" in open(queue.journal_path, encoding="utf-8").read()
+
+
+def test_journals_of_exited_processes_are_replayed_once(tmp_path):
+    base = tmp_path / "esc.jsonl"
+    (tmp_path / "esc.999999.jsonl").write_text(add("a") + add("b") + json.dumps({"op": "done", "ids": ["a"]}) + "\n")
+    base.write_text(add("legacy"))
+    delivered = []
+    queue = EscalationQueue(sink=lambda batch: delivered.extend(i.escalation_id for i in batch), journal_path=str(base), flush_interval=0.01)
+    assert queue.depth() == 2
+    assert sorted(os.listdir(tmp_path)) == [os.path.basename(queue.journal_path)]
+
+    queue.start()
+    wait_for(lambda: len(delivered) == 2)
+    queue.stop()
+    assert sorted(delivered) == ["b", "legacy"]
+
+
+@pytest.mark.skipif(sys.platform == "win32", reason="journal ownership uses flock")
+def test_journal_of_a_running_process_is_left_alone(tmp_path):
+    live = tmp_path / "esc.1.jsonl"
+    live.write_text(add("theirs"))
+    owner = subprocess.Popen(
+        [sys.executable, "-c", f"import fcntl, sys, time; f = open({str(live)!r}); fcntl.flock(f, fcntl.LOCK_EX); print(flush=True); time.sleep(30)"],
+        stdout=subprocess.PIPE,
+    )
+    try:
+        owner.stdout.readline()
+        queue = EscalationQueue(sink=lambda batch: None, journal_path=str(tmp_path / "esc.jsonl"))
+        assert queue.depth() == 0
+        assert live.exists()
+        queue.stop()
+    finally:
+        owner.kill()
+        owner.wait()
+
+
+def test_duplicates_within_window_are_dropped(tmp_path):
+    queue = EscalationQueue(sink=lambda batch: None)
+    assert queue.submit("Chest pain!", "r")
+    assert not queue.submit("chest pain", "r")
+    assert queue.submit("chest pain", "other reason")
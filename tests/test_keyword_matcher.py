@@ -0,0 +1,19 @@
+from backend.utils.keyword_matcher import KeywordMatcher
+
+
+def test_matches_whole_words_ignoring_case_and_punctuation():
+    matcher = KeywordMatcher(["chest pain", "OD", "can't breathe"])
+    assert matcher.search("I have CHEST-pain!") == "chest pain"
+    assert matcher.search("I cant breathe") == "can't breathe"
+    assert matcher.search("feeling good today") is None
+    assert "took an OD" in matcher
+
+
+def test_overlapping_terms_are_all_found_in_order():
+    matcher = KeywordMatcher(["heart", "heart attack", "attack", "stroke"])
+    assert matcher.find_all("stroke or heart attack") == ["stroke", "heart", "heart attack", "attack"]
+
+
+def test_duplicates_and_blank_terms_are_ignored():
+    matcher = KeywordMatcher(["Seizure", "seizure", "  ", ""])
+    assert len(matcher) == 1
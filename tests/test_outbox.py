@@ -0,0 +1,126 @@
+import time
+
+import pytest
+
+from backend.agents.appointment_executer_agent import AppointmentExecutorAgent
+from backend.utils.outbox import Outbox
+
+
+class Clock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self) -> float:
+        return self.now
+
+
+@pytest.fixture
+def clock():
+    return Clock()
+
+
+@pytest.fixture
+def path(tmp_path):
+    return str(tmp_path / "outbox.sqlite3")
+
+
+def test_enqueue_is_idempotent_per_key(path, clock):
+    outbox = Outbox(path, clock=clock)
+    assert outbox.enqueue("email", {"to": "a"}, key="k1")
+    assert not outbox.enqueue("email", {"to": "a"}, key="k1")
+    assert outbox.stats()["pending"] == 1
+
+
+def test_claimed_job_is_leased_to_one_worker(path, clock):
+    seen = []
+    first = Outbox(path, clock=clock, lease_seconds=30)
+    second = Outbox(path, clock=clock, lease_seconds=30)
+    # A handler that dies mid-job leaves the lease in place, as a crashed worker would
+    first.register("email", lambda payload: (_ for _ in ()).throw(KeyboardInterrupt()))
+    second.register("email", lambda payload: seen.append(payload))
+    first.enqueue("email", {"to": "a"}, key="k1")
+
+    with pytest.raises(KeyboardInterrupt):
+        first.run_pending()
+    assert second.run_pending() == 0
+    clock.now += 31
+    assert second.run_pending() == 1
+    assert seen == [{"to": "a"}]
+    assert second.stats()["done"] == 1
+
+
+def test_failures_back_off_then_go_dead(path, clock):
+    outbox = Outbox(path, clock=clock, max_attempts=2, base_delay=1, max_delay=1)
+    outbox.register("email", lambda payload: (_ for _ in ()).throw(RuntimeError("smtp down")))
+    outbox.enqueue("email", {}, key="k1")
+    assert outbox.run_pending() == 1
+    assert outbox.stats()["pending"] == 1
+    clock.now += 2
+    assert outbox.run_pending() == 1
+    assert outbox.stats()["dead"] == 1
+
+
+def test_held_jobs_wait_for_confirmation(path, clock):
+    seen = []
+    outbox = Outbox(path, clock=clock)
+    outbox.register("email", seen.append)
+    outbox.enqueue("email", {"to": "a"}, key="k1", hold="h1", hold_until=clock.now + 60)
+    assert outbox.run_pending() == 0
+    assert outbox.stats()["held"] == 1
+    assert outbox.confirm_held("h1") == 1
+    assert outbox.run_pending() == 1
+    assert seen == [{"to": "a"}]
+
+
+def test_released_or_lapsed_holds_never_send(path, clock):
+    outbox = Outbox(path, clock=clock)
+    outbox.register("email", lambda payload: pytest.fail("sent for a dead hold"))
+    outbox.enqueue("email", {"to": "a"}, key="k1", hold="released", hold_until=clock.now + 60)
+    outbox.enqueue("email", {"to": "b"}, key="k2", hold="lapsed", hold_until=clock.now + 60)
+    assert outbox.cancel_held("released") == 1
+    clock.now += 61
+    outbox._purge()
+    assert outbox.confirm_held("lapsed") == 0
+    assert outbox.run_pending() == 0
+    assert outbox.stats()["cancelled"] == 2
+
+
+class Email:
+    def __init__(self):
+        self.sent = []
+
+    def send_email(self, to, subject, body):
+        self.sent.append(to)
+
+
+def test_executor_queues_only_held_successful_plans(path, clock):
+    outbox = Outbox(path, clock=clock)
+    email = Email()
+    executor = AppointmentExecutorAgent(email_client=email, outbox=outbox)
+    hold = {"hold_id": "h1", "confirmed": False, "expires_at": "2100-01-01T00:00:00+00:00"}
+    plan = {"date": "2025-01-10", "start_time": "09:00", "end_time": "10:00"}
+
+    executor.book_appointment("A", "a@example.com", plan)
+    executor.book_appointment("B", "b@example.com", {"error": "No available slot found"})
+    assert outbox.stats()["held"] == outbox.stats()["pending"] == 0
+
+    executor.book_appointment("C", "c@example.com", {**plan, "hold": hold})
+    assert outbox.run_pending() == 0
+    executor.confirm_booking("h1")
+    assert outbox.run_pending() == 1
+    assert email.sent == ["c@example.com"]
+
+
+def test_depth_is_refreshed_by_the_worker(path, clock):
+    outbox = Outbox(path, clock=clock, poll_interval=0.01)
+    outbox.enqueue("unhandled", {}, key="k1")
+    assert outbox.depth() == 0
+    outbox.start()
+    try:
+        for _ in range(100):
+            if outbox.depth() == 1:
+                break
+            time.sleep(0.01)
+    finally:
+        outbox.stop()
+    assert outbox.depth() == 1
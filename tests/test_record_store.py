@@ -0,0 +1,86 @@
+import os
+
+import pytest
+
+from backend.agents.medical_record_executer_agent import MedicalExecutorAgent
+from backend.utils.google import load_sheet_records
+from backend.utils.record_store import MappedRecords
+from backend.utils.records import build_patient_index
+
+EDGE_CSV = (
+    'ID,Fields,Info\r\n'
+    '1,Lab,"a ""quoted""\nsecond line"\r\n'
+    '\r\n'
+    '2,Exam\r\n'
+    '1,Duplicate,x\r\n'
+    ',NoId,y\r\n'
+    '3,Lab,x,extra\r\n'
+    '4,"multi\r\nline",z'
+)
+
+
+@pytest.fixture
+def sheet(tmp_path):
+    path = tmp_path / "records.csv"
+    path.write_text(EDGE_CSV, encoding="utf-8", newline="")
+    return str(path)
+
+
+def test_rows_match_dict_reader(sheet, tmp_path):
+    store = MappedRecords.open(sheet, index_dir=str(tmp_path / "index"))
+    expected = load_sheet_records(sheet)
+    assert len(store) == len(expected)
+    assert list(store) == expected
+    assert store[-1] == expected[-1]
+    assert store[1:3] == expected[1:3]
+
+
+def test_get_matches_patient_index(sheet, tmp_path):
+    store = MappedRecords.open(sheet, index_dir=str(tmp_path / "index"))
+    index = build_patient_index(load_sheet_records(sheet))
+    for pid in ("1", "2", "3", "4", " 4 "):
+        assert store.get(pid) == index[pid.strip()]
+    assert store.get("1")["Fields"] == "Lab"
+    assert store.get("missing") is None
+    assert store.get(None) is None
+
+
+def test_executor_accepts_store(sheet, tmp_path):
+    store = MappedRecords.open(sheet, index_dir=str(tmp_path / "index"))
+    rows = load_sheet_records(sheet)
+    executor = MedicalExecutorAgent()
+    plan = {"patient_id": "2", "field": "Fields"}
+    assert executor.fetch_record(plan, store) == executor.fetch_record(plan, rows)
+    assert executor.fetch_plans([{"patient_ids": ["1", "9"]}], store) == executor.fetch_plans([{"patient_ids": ["1", "9"]}], rows)
+
+
+def test_sidecar_is_reused_then_rebuilt_on_change(sheet, tmp_path):
+    index_dir = str(tmp_path / "index")
+    first = MappedRecords.open(sheet, index_dir=index_dir)
+    built = os.stat(first.index_path).st_mtime_ns
+    assert os.stat(MappedRecords.open(sheet, index_dir=index_dir).index_path).st_mtime_ns == built
+
+    replacement = tmp_path / "new.csv"
+    replacement.write_text("ID,Fields\r\n9,Lab\r\n", encoding="utf-8", newline="")
+    os.replace(replacement, sheet)
+    fresh = MappedRecords.open(sheet, index_dir=index_dir)
+    assert fresh.get("9") == {"ID": "9", "Fields": "Lab"}
+    # The old mapping still serves the file version it was opened on
+    assert first.get("1")["Fields"] == "Lab"
+
+
+def test_truncated_in_place_raises_instead_of_crashing(sheet, tmp_path):
+    store = MappedRecords.open(sheet, index_dir=str(tmp_path / "index"))
+    with open(sheet, "r+b") as handle:
+        handle.truncate(20)
+    with pytest.raises(OSError):
+        store[-1]
+
+
+def test_empty_sheet_has_no_rows(tmp_path):
+    path = tmp_path / "empty.csv"
+    path.write_bytes(b"")
+    store = MappedRecords.open(str(path), index_dir=str(tmp_path / "index"))
+    assert list(store) == load_sheet_records(str(path)) == []
+    assert store.get("1") is None
+    store.close()
@@ -0,0 +1,52 @@
+import threading
+
+from backend.agents.medical_record_planner_agent import compact_skeleton
+from backend.utils.records import RecordSnapshot, RecordSnapshotCache, patient_index
+
+ROWS = [{"ID": str(i), "Fields": "Lab" if i % 2 else "Vaccine"} for i in range(1, 21)]
+
+
+def test_compact_skeleton_on_fresh_snapshot_does_not_deadlock():
+    # The skeleton builder derives the field index while the snapshot lock is held
+    snapshot = RecordSnapshot(ROWS)
+    result = []
+    worker = threading.Thread(target=lambda: result.append(compact_skeleton(snapshot, "Who needs labs?", 500)), daemon=True)
+    worker.start()
+    worker.join(5)
+    assert not worker.is_alive(), "compact_skeleton deadlocked"
+    assert "1" in result[0]
+
+
+def test_derive_builds_once_per_snapshot():
+    snapshot = RecordSnapshot(ROWS)
+    calls = []
+
+    def build(rows):
+        calls.append(1)
+        return len(rows)
+
+    assert snapshot.derive("n", build) == 20
+    assert snapshot.derive("n", build) == 20
+    assert len(calls) == 1
+
+
+def test_unchanged_sheet_is_parsed_once(tmp_path):
+    sheet = tmp_path / "records.csv"
+    sheet.write_text("ID\n1\n")
+    loads = []
+
+    def loader(path):
+        loads.append(path)
+        return [{"ID": "1"}]
+
+    cache = RecordSnapshotCache(loader=loader)
+    first = cache.get(str(sheet))
+    assert cache.get(str(sheet)) is first
+    assert len(loads) == 1
+
+
+def test_patient_index_normalizes_ids_and_keeps_first_duplicate():
+    rows = [{"ID": " 7 ", "Name": "first"}, {"ID": "7", "Name": "second"}, {"Patient ID": "8"}]
+    index = patient_index(rows)
+    assert index["7"]["Name"] == "first"
+    assert "8" in index
@@ -0,0 +1,79 @@
+from datetime import date, datetime, timedelta
+
+from backend.utils.reservations import ReservationLedger
+
+
+class Clock:
+    def __init__(self, now: datetime):
+        self.now = now.timestamp()
+
+    def __call__(self) -> float:
+        return self.now
+
+
+def slot(day: int, hour: int, minutes: int = 60):
+    start = datetime(2025, 1, day, hour)
+    return start, start + timedelta(minutes=minutes)
+
+
+def make_ledger(**kwargs):
+    clock = Clock(datetime(2025, 1, 10, 8))
+    return ReservationLedger(ttl_seconds=60, clock=clock, **kwargs), clock
+
+
+def test_overlapping_and_padded_slots_conflict():
+    ledger, _ = make_ledger(padding=timedelta(minutes=15))
+    assert ledger.try_reserve(*slot(10, 9), "a") is not None
+    assert ledger.try_reserve(*slot(10, 9, 30), "b") is None
+    # Starts 10 minutes after the first ends: inside the padding
+    assert ledger.try_reserve(datetime(2025, 1, 10, 10, 10), datetime(2025, 1, 10, 11), "b") is None
+    assert ledger.try_reserve(datetime(2025, 1, 10, 10, 15), datetime(2025, 1, 10, 11), "b") is not None
+
+
+def test_new_hold_is_visible_and_confirmable():
+    ledger, _ = make_ledger()
+    hold = ledger.try_reserve(*slot(10, 9), "a")
+    assert ledger.get(hold.hold_id) is hold
+    assert ledger.confirm(hold.hold_id) is hold and hold.confirmed
+
+
+def test_expired_holds_free_the_slot_and_confirmed_ones_do_not():
+    ledger, clock = make_ledger()
+    lapsed = ledger.try_reserve(*slot(10, 9), "a")
+    kept = ledger.try_reserve(*slot(10, 12), "b")
+    ledger.confirm(kept.hold_id)
+    clock.now += 61
+    assert ledger.get(lapsed.hold_id) is None
+    assert ledger.confirm(lapsed.hold_id) is None
+    assert ledger.try_reserve(*slot(10, 9), "c") is not None
+    assert ledger.try_reserve(*slot(10, 12), "c") is None
+
+
+def test_release_frees_the_slot():
+    ledger, _ = make_ledger()
+    hold = ledger.try_reserve(*slot(10, 9), "a")
+    assert ledger.release(hold.hold_id)
+    assert ledger.is_free(*slot(10, 9))
+    assert ledger.get(hold.hold_id) is None
+
+
+def test_adding_a_day_prunes_expired_holds_but_keeps_confirmed_ones():
+    ledger, clock = make_ledger()
+    booked = ledger.try_reserve(*slot(11, 9), "a")
+    ledger.confirm(booked.hold_id)
+    lapsed = ledger.try_reserve(*slot(12, 9), "b")
+    clock.now += 5 * 86400
+    ledger.try_reserve(*slot(16, 9), "c")
+    assert ledger.get(booked.hold_id) is booked
+    assert ledger.holds_on(date(2025, 1, 11)) == [booked]
+    assert ledger.try_reserve(*slot(11, 9), "d") is None
+    assert ledger.get(lapsed.hold_id) is None
+    assert ledger.holds_on(date(2025, 1, 12)) == []
+    assert ledger.try_reserve(*slot(12, 9), "d") is not None
+
+
+def test_expiry_is_utc_iso():
+    ledger, _ = make_ledger()
+    expires_at = ledger.try_reserve(*slot(10, 9), "a").to_dict()["expires_at"]
+    assert expires_at.endswith("+00:00")
+    assert datetime.fromisoformat(expires_at).timestamp() == datetime(2025, 1, 10, 8).timestamp() + 60
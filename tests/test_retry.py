@@ -0,0 +1,38 @@
+import pytest
+
+from backend.utils.retry import DeadlineExceeded, current_deadline, deadline_expired, deadline_scope, retry
+
+
+def test_no_scope_is_unbounded():
+    assert current_deadline() is None
+    assert not deadline_expired()
+
+
+def test_nested_scope_never_extends_outer_deadline():
+    with deadline_scope(0.5) as outer:
+        with deadline_scope(60) as inner:
+            assert inner is outer
+            assert current_deadline().remaining() <= 0.5
+        with deadline_scope(0.1):
+            assert current_deadline().remaining() <= 0.1
+        assert current_deadline().remaining() > 0.1
+    assert current_deadline() is None
+
+
+def test_none_keeps_current_deadline():
+    with deadline_scope(1) as outer:
+        with deadline_scope(None) as same:
+            assert same is outer
+
+
+def test_retry_stops_once_budget_is_spent():
+    attempts = []
+
+    def fail():
+        attempts.append(1)
+        raise RuntimeError("down")
+
+    with deadline_scope(0.05):
+        with pytest.raises((RuntimeError, DeadlineExceeded)):
+            retry(fail, attempts=50, delay=0.02)
+    assert len(attempts) < 50
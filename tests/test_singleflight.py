@@ -0,0 +1,67 @@
+import asyncio
+import threading
+import time
+
+from backend.utils.singleflight import SingleFlight
+
+
+def test_followers_share_one_call_and_get_private_copies():
+    flight = SingleFlight()
+    started = threading.Event()
+    release = threading.Event()
+    calls = []
+
+    def work():
+        calls.append(1)
+        started.set()
+        release.wait(5)
+        return {"items": [1]}
+
+    results = []
+    leader = threading.Thread(target=lambda: results.append(flight.do("k", work)))
+    leader.start()
+    started.wait(5)
+    followers = [threading.Thread(target=lambda: results.append(flight.do("k", work))) for _ in range(3)]
+    for thread in followers:
+        thread.start()
+    # Let the followers reach the shared call before the leader finishes
+    time.sleep(0.1)
+    release.set()
+    for thread in [leader, *followers]:
+        thread.join(5)
+
+    assert len(calls) == 1
+    assert len(results) == 4 and all(r == {"items": [1]} for r in results)
+    # A follower mutating its result must not affect anyone else's
+    results[0]["items"].append(2)
+    assert all(r["items"] == [1] for r in results[1:])
+
+
+def test_async_followers_get_deep_copies():
+    flight = SingleFlight()
+    calls = []
+
+    async def work():
+        calls.append(1)
+        await asyncio.sleep(0.05)
+        return {"items": [1]}
+
+    async def main():
+        return await asyncio.gather(*(flight.do_async("k", work) for _ in range(3)))
+
+    results = asyncio.run(main())
+    assert len(calls) == 1
+    results[1]["items"].append(2)
+    assert results[0] == {"items": [1]} and results[2] == {"items": [1]}
+
+
+def test_follower_timeout_returns_default():
+    flight = SingleFlight()
+    release = threading.Event()
+    leader = threading.Thread(target=lambda: flight.do("k", lambda: release.wait(5)))
+    leader.start()
+    while flight.in_flight() == 0:
+        pass
+    assert flight.do("k", lambda: "unused", timeout=0.01, default="fallback") == "fallback"
+    release.set()
+    leader.join(5)